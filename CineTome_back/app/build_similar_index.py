@@ -0,0 +1,25 @@
+"""
+Сборка индекса похожих книг (обычно выполняется фоновой задачей similar_index_build):
+    python -m app.build_similar_index          # дособрать новыми книгами
+    python -m app.build_similar_index --full   # пересобрать целиком, например после импорта дампа
+"""
+import argparse
+import asyncio
+import logging
+
+from app.database import engine
+from app.services.similar_books import IndexBuilder
+
+
+async def main(full: bool):
+    try:
+        await IndexBuilder().build(full=full)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Пересобрать индекс целиком с актуальными idf")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().full))
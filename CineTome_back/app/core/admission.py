@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+import jwt
+from fastapi.responses import ORJSONResponse
+
+from app.core import settings as token_settings
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "admission_in_flight",
+    "Запросы, выполняющиеся в классе эндпоинтов",
+    ["endpoint_class"],
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "admission_queue_depth",
+    "Запросы, ожидающие допуска",
+    ["endpoint_class"],
+)
+ADMISSION_LIMIT = registry.gauge(
+    "admission_limit",
+    "Лимит одновременных запросов класса эндпоинтов",
+    ["endpoint_class"],
+)
+ADMISSION_WAIT = registry.histogram(
+    "admission_wait_seconds",
+    "Время ожидания допуска",
+    ["endpoint_class", "priority"],
+)
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total",
+    "Запросы, отклонённые с 503 контролем допуска",
+    ["endpoint_class", "priority", "reason"],
+)
+
+
+class AdmissionPriority(IntEnum):
+    """Меньшее значение допускается раньше"""
+    AUTHENTICATED = 0
+    ANONYMOUS = 1
+
+
+class AdmissionLimiter:
+    """
+    Лимит одновременных запросов с ограниченной приоритетной очередью ожидания.
+    Переполнение очереди и истечение max_wait приводят к отказу; при полной
+    очереди запрос авторизованного пользователя вытесняет последнего анонимного.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        ADMISSION_LIMIT.set(limit, endpoint_class=name)
+        ADMISSION_IN_FLIGHT.set_function(lambda: self._active, endpoint_class=name)
+        ADMISSION_QUEUE_DEPTH.set_function(lambda: len(self._waiters), endpoint_class=name)
+
+    def _reject(self, priority: AdmissionPriority, reason: str) -> bool:
+        ADMISSION_REJECTED.inc(endpoint_class=self.name, priority=priority.name.lower(), reason=reason)
+        return False
+
+    def _displace_anonymous(self) -> bool:
+        anonymous = [w for w in self._waiters if w[0] == AdmissionPriority.ANONYMOUS]
+        if not anonymous:
+            return False
+        victim = max(anonymous)
+        self._waiters.remove(victim)
+        heapq.heapify(self._waiters)
+        if not victim[2].done():
+            victim[2].set_result(False)
+            self._reject(AdmissionPriority.ANONYMOUS, "displaced")
+        return True
+
+    async def acquire(self, priority: AdmissionPriority) -> bool:
+        """True — запрос допущен и должен вызвать release(); False — отказ"""
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            ADMISSION_WAIT.observe(0.0, endpoint_class=self.name, priority=priority.name.lower())
+            return True
+
+        if len(self._waiters) >= self.queue_size:
+            if priority != AdmissionPriority.AUTHENTICATED or not self._displace_anonymous():
+                return self._reject(priority, "queue_full")
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        waiter = (int(priority), next(self._seq), future)
+        heapq.heappush(self._waiters, waiter)
+        try:
+            done, _ = await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Клиент отключился: ожидающий уходит из очереди, уже переданный ему слот возвращается
+            self._remove_waiter(waiter)
+            if future.done() and not future.cancelled() and future.result():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        if not done:
+            self._remove_waiter(waiter)
+            future.cancel()
+            return self._reject(priority, "timeout")
+        if future.result():
+            ADMISSION_WAIT.observe(time.monotonic() - started, endpoint_class=self.name,
+                                   priority=priority.name.lower())
+        return future.result()
+
+    def _remove_waiter(self, waiter: Tuple[int, int, asyncio.Future]):
+        """Ушедший ожидающий не должен занимать место в очереди и получать слот"""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+
+    def release(self):
+        # Слот передаётся первому ожидающему, счётчик активных не меняется
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self._active -= 1
+
+
+# Первое совпадение по префиксу пути; None — без ограничений
+ENDPOINT_CLASSES: List[Tuple[str, Optional[str]]] = [
+    ("/health", None),
+    ("/metrics", None),
+    ("/ai/generate-summary/jobs", "db"),
+    ("/ai", "llm"),
+    ("/api/kp", "upstream"),
+    ("/books", "upstream"),
+    ("/images", "upstream"),
+    ("/uploads", "static"),
+    ("/docs", "static"),
+    ("/redoc", "static"),
+    ("/openapi.json", "static"),
+]
+# Параметры, при которых эндпоинт обращается к GigaChat
+LLM_QUERY_FLAGS = (b"with_summary=true", b"translate=true")
+
+
+def classify(path: str, query_string: bytes) -> Optional[str]:
+    for prefix, endpoint_class in ENDPOINT_CLASSES:
+        if path.startswith(prefix):
+            if endpoint_class == "upstream" and any(flag in query_string.lower() for flag in LLM_QUERY_FLAGS):
+                return "llm"
+            return endpoint_class
+    return "db"
+
+
+def request_priority(headers: List[Tuple[bytes, bytes]]) -> AdmissionPriority:
+    """Приоритет получают запросы с действительным JWT (только проверка подписи, без БД)"""
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                break
+            try:
+                jwt.decode(token, token_settings.SECRET_KEY, algorithms=[token_settings.ALGORITHM])
+                return AdmissionPriority.AUTHENTICATED
+            except jwt.PyJWTError:
+                break
+    return AdmissionPriority.ANONYMOUS
+
+
+def create_limiters() -> Dict[str, AdmissionLimiter]:
+    return {
+        "llm": AdmissionLimiter("llm", settings.ADMISSION_LLM_LIMIT,
+                                settings.ADMISSION_LLM_QUEUE, settings.ADMISSION_LLM_MAX_WAIT),
+        "upstream": AdmissionLimiter("upstream", settings.ADMISSION_UPSTREAM_LIMIT,
+                                     settings.ADMISSION_UPSTREAM_QUEUE, settings.ADMISSION_UPSTREAM_MAX_WAIT),
+        "db": AdmissionLimiter("db", settings.ADMISSION_DB_LIMIT,
+                               settings.ADMISSION_DB_QUEUE, settings.ADMISSION_DB_MAX_WAIT),
+        "static": AdmissionLimiter("static", settings.ADMISSION_STATIC_LIMIT,
+                                   settings.ADMISSION_STATIC_QUEUE, settings.ADMISSION_STATIC_MAX_WAIT),
+    }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI-middleware контроля допуска. Слот удерживается до конца отправки
+    ответа; отказ — быстрый 503 с Retry-After без вызова приложения.
+    """
+
+    def __init__(self, app, limiters: Optional[Dict[str, AdmissionLimiter]] = None):
+        self.app = app
+        self.limiters = limiters if limiters is not None else create_limiters()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint_class = classify(scope["path"], scope.get("query_string", b""))
+        limiter = self.limiters.get(endpoint_class)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire(request_priority(scope["headers"])):
+            response = ORJSONResponse(
+                {"detail": "Сервер перегружен, повторите запрос позже"},
+                status_code=503,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -17,11 +17,225 @@ class Settings(BaseSettings):
     DB_PASS: str = os.getenv("DB_PASS", "postgres")
     DB_NAME: str = os.getenv("DB_NAME", "cinetome")
 
+    # Профиль движка БД. Итоговое число соединений на инстанс:
+    # число uvicorn-воркеров * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_ECHO: bool = os.getenv("DB_ECHO", "False") == "True"
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True") == "True"
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+    # Реплика для читающих запросов. Если не задана, чтение идёт в основную БД.
+    # После записи пользователь (sub из JWT) на DB_READ_YOUR_WRITES_SECONDS закрепляется за основной БД.
+    DB_REPLICA_URL: Optional[str] = os.getenv("DB_REPLICA_URL") or None
+    DB_READ_YOUR_WRITES_SECONDS: int = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+
+    # Ожидание БД при старте воркера (экспоненциальная задержка) и прогрев пула
+    DB_WAIT_TIMEOUT: float = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+    DB_WAIT_INITIAL_DELAY: float = float(os.getenv("DB_WAIT_INITIAL_DELAY", "0.2"))
+    DB_WAIT_MAX_DELAY: float = float(os.getenv("DB_WAIT_MAX_DELAY", "5"))
+    DB_POOL_WARM_SIZE: int = int(os.getenv("DB_POOL_WARM_SIZE", "2"))
+
+    # Общие HTTP-клиенты внешних API
+    UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+    UPSTREAM_WARMUP_TIMEOUT: float = float(os.getenv("UPSTREAM_WARMUP_TIMEOUT", "3"))
+    UPSTREAM_MAX_CONNECTIONS: int = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "20"))
+
+    # Устойчивость к деградации внешних API: повторы, предохранители, hedged-запросы
+    UPSTREAM_RETRIES: int = int(os.getenv("UPSTREAM_RETRIES", "2"))
+    UPSTREAM_RETRY_BASE_DELAY: float = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.1"))
+    UPSTREAM_RETRY_MAX_DELAY: float = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "2"))
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "30"))
+    UPSTREAM_HEDGE_ENABLED: bool = os.getenv("UPSTREAM_HEDGE_ENABLED", "False") == "True"
+    UPSTREAM_HEDGE_MIN_DELAY: float = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+
     UPLOADS_DIR: str = os.getenv("UPLOADS_DIR", "uploads")
 
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+    # HTTP-кеширование детальных страниц (ETag + Cache-Control)
+    HTTP_CACHE_MAX_AGE: int = int(os.getenv("HTTP_CACHE_MAX_AGE", "300"))
+    HTTP_CACHE_STALE_WHILE_REVALIDATE: int = int(os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE", "86400"))
+
+    # Сжатие ответов: brotli (если установлен brotli-asgi) с откатом на gzip
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    BROTLI_QUALITY: int = int(os.getenv("BROTLI_QUALITY", "4"))
+
+    # Клиентский ограничитель запросов к Кинопоиску. С общим CACHE_BACKEND (postgres, redis) скорость
+    # и суточная квота общие для всех воркеров; с memory они действуют на каждый воркер отдельно,
+    # и значения нужно делить на число воркеров
+    KP_RATE_LIMIT_PER_SECOND: float = float(os.getenv("KP_RATE_LIMIT_PER_SECOND", "5"))
+    KP_RATE_LIMIT_BURST: int = int(os.getenv("KP_RATE_LIMIT_BURST", "10"))
+    KP_DAILY_QUOTA: int = int(os.getenv("KP_DAILY_QUOTA", "0"))
+    KP_BACKGROUND_QUOTA_SHARE: float = float(os.getenv("KP_BACKGROUND_QUOTA_SHARE", "0.8"))
+    KP_INTERACTIVE_MAX_WAIT: float = float(os.getenv("KP_INTERACTIVE_MAX_WAIT", "2"))
+    KP_BACKGROUND_MAX_WAIT: float = float(os.getenv("KP_BACKGROUND_MAX_WAIT", "30"))
+
+    # Кеш ответов Кинопоиска
+    KP_COLLECTION_CACHE_TTL: int = int(os.getenv("KP_COLLECTION_CACHE_TTL", "3600"))
+    KP_FILM_CACHE_TTL: int = int(os.getenv("KP_FILM_CACHE_TTL", "21600"))
+    KP_SEASONS_CACHE_TTL: int = int(os.getenv("KP_SEASONS_CACHE_TTL", "3600"))
+    KP_SEARCH_CACHE_TTL: int = int(os.getenv("KP_SEARCH_CACHE_TTL", "600"))
+    KP_BATCH_CONCURRENCY: int = int(os.getenv("KP_BATCH_CONCURRENCY", "8"))
+    # Закешированные id батча отдаются всегда; незакешированные сверх бюджета ограничителя
+    # (около KP_RATE_LIMIT_BURST + KP_RATE_LIMIT_PER_SECOND * KP_INTERACTIVE_MAX_WAIT) получают 429 в errors
+    KP_BATCH_MAX_IDS: int = int(os.getenv("KP_BATCH_MAX_IDS", "100"))
+
+    # Кеш и пакетные запросы OpenLibrary
+    OL_BOOK_CACHE_TTL: int = int(os.getenv("OL_BOOK_CACHE_TTL", "86400"))
+    OL_SEARCH_CACHE_TTL: int = int(os.getenv("OL_SEARCH_CACHE_TTL", "600"))
+    OL_BATCH_CONCURRENCY: int = int(os.getenv("OL_BATCH_CONCURRENCY", "8"))
+    OL_BATCH_MAX_IDS: int = int(os.getenv("OL_BATCH_MAX_IDS", "100"))
+    # Импорт дампов OpenLibrary в таблицу books (python -m app.ingest_openlibrary);
+    # с OL_LOCAL_BOOKS детали книги и поиск по названию/автору сначала идут в неё, а не в openlibrary.org
+    OL_DUMP_BATCH_SIZE: int = int(os.getenv("OL_DUMP_BATCH_SIZE", "20000"))
+    OL_LOCAL_BOOKS: bool = os.getenv("OL_LOCAL_BOOKS", "False") == "True"
+
+    # Перевод данных книг через GigaChat
+    TRANSLATION_CACHE_TTL: int = int(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+    TRANSLATION_BATCH_SIZE: int = int(os.getenv("TRANSLATION_BATCH_SIZE", "50"))
+    TRANSLATION_BATCH_CHARS: int = int(os.getenv("TRANSLATION_BATCH_CHARS", "6000"))
+    TRANSLATION_CONCURRENCY: int = int(os.getenv("TRANSLATION_CONCURRENCY", "2"))
+
+    # Упреждающая загрузка следующей страницы поиска/подборок (по умолчанию выключена)
+    PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "False") == "True"
+    PREFETCH_BUDGET_PER_SECOND: float = float(os.getenv("PREFETCH_BUDGET_PER_SECOND", "2"))
+    PREFETCH_BUDGET_BURST: int = int(os.getenv("PREFETCH_BUDGET_BURST", "5"))
+    PREFETCH_MAX_INFLIGHT: int = int(os.getenv("PREFETCH_MAX_INFLIGHT", "4"))
+    PREFETCH_HIT_WINDOW: float = float(os.getenv("PREFETCH_HIT_WINDOW", "300"))
+    PREFETCH_TRACKED_KEYS: int = int(os.getenv("PREFETCH_TRACKED_KEYS", "5000"))
+
+    # Общий кеш для всех воркеров: memory (только кеш процесса), postgres, redis
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_KEY_PREFIX: str = os.getenv("CACHE_KEY_PREFIX", "cinetome:")
+    # Сколько запись живёт в кеше процесса поверх общего кеша
+    CACHE_LOCAL_TTL: float = float(os.getenv("CACHE_LOCAL_TTL", "30"))
+    CACHE_COMPRESS_MIN_SIZE: int = int(os.getenv("CACHE_COMPRESS_MIN_SIZE", "1024"))
+    CACHE_PG_PURGE_INTERVAL: float = float(os.getenv("CACHE_PG_PURGE_INTERVAL", "300"))
+
+    # Фоновые задачи в Postgres (таблица jobs)
+    JOB_WORKER_EMBEDDED: bool = os.getenv("JOB_WORKER_EMBEDDED", "True") == "True"
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+    JOB_RETRY_BASE_DELAY: float = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+    JOB_RETRY_MAX_DELAY: float = float(os.getenv("JOB_RETRY_MAX_DELAY", "600"))
+    JOB_TIMEOUT: float = float(os.getenv("JOB_TIMEOUT", "300"))
+    # Задача в статусе running дольше этого срока считается брошенной упавшим воркером
+    JOB_LOCK_TIMEOUT: float = float(os.getenv("JOB_LOCK_TIMEOUT", "900"))
+    JOB_RETENTION_SECONDS: float = float(os.getenv("JOB_RETENTION_SECONDS", "604800"))
+    JOB_MAINTENANCE_INTERVAL: float = float(os.getenv("JOB_MAINTENANCE_INTERVAL", "60"))
+    JOB_SHUTDOWN_TIMEOUT: float = float(os.getenv("JOB_SHUTDOWN_TIMEOUT", "10"))
+
+    # Прокси постеров и обложек с дисковым кешем в UPLOADS_DIR/image_cache.
+    # Ссылки в ответах переписываются на прокси, только если задан IMAGE_PROXY_PUBLIC_URL
+    IMAGE_PROXY_PUBLIC_URL: str = os.getenv("IMAGE_PROXY_PUBLIC_URL", "")
+    IMAGE_PROXY_ALLOWED_HOSTS: list[str] = os.getenv(
+        "IMAGE_PROXY_ALLOWED_HOSTS",
+        "kinopoiskapiunofficial.tech,avatars.mds.yandex.net,st.kp.yandex.net,covers.openlibrary.org"
+    ).split(",")
+    IMAGE_PROXY_WIDTHS: list[int] = [int(w) for w in os.getenv("IMAGE_PROXY_WIDTHS", "160,320,480,640,960").split(",")]
+    IMAGE_PROXY_PREVIEW_WIDTH: int = int(os.getenv("IMAGE_PROXY_PREVIEW_WIDTH", "320"))
+    IMAGE_PROXY_MAX_BYTES: int = int(os.getenv("IMAGE_PROXY_MAX_BYTES", str(10 * 1024 * 1024)))
+    # Редиректы проходятся вручную, каждый адрес сверяется с IMAGE_PROXY_ALLOWED_HOSTS
+    IMAGE_PROXY_MAX_REDIRECTS: int = int(os.getenv("IMAGE_PROXY_MAX_REDIRECTS", "3"))
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+    IMAGE_RESIZE_WORKERS: int = int(os.getenv("IMAGE_RESIZE_WORKERS", "2"))
+    IMAGE_JPEG_QUALITY: int = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+    # Префикс internal-location nginx: файл отдаёт nginx через sendfile по X-Accel-Redirect
+    IMAGE_PROXY_ACCEL_REDIRECT: str = os.getenv("IMAGE_PROXY_ACCEL_REDIRECT", "")
+
+    # Контроль допуска: лимит одновременных запросов и очередь ожидания по классам эндпоинтов
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "True") == "True"
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+    ADMISSION_LLM_LIMIT: int = int(os.getenv("ADMISSION_LLM_LIMIT", "8"))
+    ADMISSION_LLM_QUEUE: int = int(os.getenv("ADMISSION_LLM_QUEUE", "16"))
+    ADMISSION_LLM_MAX_WAIT: float = float(os.getenv("ADMISSION_LLM_MAX_WAIT", "10"))
+    ADMISSION_UPSTREAM_LIMIT: int = int(os.getenv("ADMISSION_UPSTREAM_LIMIT", "64"))
+    ADMISSION_UPSTREAM_QUEUE: int = int(os.getenv("ADMISSION_UPSTREAM_QUEUE", "128"))
+    ADMISSION_UPSTREAM_MAX_WAIT: float = float(os.getenv("ADMISSION_UPSTREAM_MAX_WAIT", "5"))
+    ADMISSION_DB_LIMIT: int = int(os.getenv("ADMISSION_DB_LIMIT", "64"))
+    ADMISSION_DB_QUEUE: int = int(os.getenv("ADMISSION_DB_QUEUE", "256"))
+    ADMISSION_DB_MAX_WAIT: float = float(os.getenv("ADMISSION_DB_MAX_WAIT", "3"))
+    ADMISSION_STATIC_LIMIT: int = int(os.getenv("ADMISSION_STATIC_LIMIT", "128"))
+    ADMISSION_STATIC_QUEUE: int = int(os.getenv("ADMISSION_STATIC_QUEUE", "256"))
+    ADMISSION_STATIC_MAX_WAIT: float = float(os.getenv("ADMISSION_STATIC_MAX_WAIT", "2"))
+
+    # Диагностика: задержка цикла событий и профилирование отдельных запросов
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "True") == "True"
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    LOOP_LAG_THRESHOLD: float = float(os.getenv("LOOP_LAG_THRESHOLD", "0.3"))
+    # Без ADMIN_TOKEN профилирование по запросу выключено
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+    PROFILER_DIR: str = os.getenv("PROFILER_DIR", "profiles")
+
+    # Запись/воспроизведение ответов Кинопоиска, OpenLibrary и GigaChat: live, record, replay
+    UPSTREAM_TRANSPORT_MODE: str = os.getenv("UPSTREAM_TRANSPORT_MODE", "live")
+    UPSTREAM_RECORDINGS_DIR: str = os.getenv("UPSTREAM_RECORDINGS_DIR", "recordings")
+    UPSTREAM_REPLAY_LATENCY_MS: float = float(os.getenv("UPSTREAM_REPLAY_LATENCY_MS", "0"))
+    UPSTREAM_REPLAY_JITTER_MS: float = float(os.getenv("UPSTREAM_REPLAY_JITTER_MS", "0"))
+    UPSTREAM_REPLAY_ERROR_RATE: float = float(os.getenv("UPSTREAM_REPLAY_ERROR_RATE", "0"))
+    UPSTREAM_REPLAY_TIMEOUT_RATE: float = float(os.getenv("UPSTREAM_REPLAY_TIMEOUT_RATE", "0"))
+    UPSTREAM_REPLAY_SEED: int = int(os.getenv("UPSTREAM_REPLAY_SEED", "42"))
+    UPSTREAM_REPLAY_MISS_STATUS: int = int(os.getenv("UPSTREAM_REPLAY_MISS_STATUS", "404"))
+
+    # Похожие книги: индекс TF-IDF по описаниям и темам книг из таблицы books
+    SIMILAR_INDEX_DIR: str = os.getenv("SIMILAR_INDEX_DIR", "similar_index")
+    SIMILAR_RELOAD_INTERVAL: float = float(os.getenv("SIMILAR_RELOAD_INTERVAL", "30"))
+    # Сохранять книги из ответов OpenLibrary и дособирать индекс через SIMILAR_BUILD_DELAY секунд
+    SIMILAR_RECORD_BOOKS: bool = os.getenv("SIMILAR_RECORD_BOOKS", "True") == "True"
+    SIMILAR_RECORD_FLUSH_DELAY: float = float(os.getenv("SIMILAR_RECORD_FLUSH_DELAY", "2"))
+    SIMILAR_BUILD_DELAY: float = float(os.getenv("SIMILAR_BUILD_DELAY", "300"))
+    SIMILAR_MAX_SEGMENTS: int = int(os.getenv("SIMILAR_MAX_SEGMENTS", "8"))
+    SIMILAR_SEGMENT_DOCS: int = int(os.getenv("SIMILAR_SEGMENT_DOCS", "200000"))
+
+    # Справочник жанров и авторов: как часто воркер сверяет версию и срок кеша ответов
+    TAXONOMY_CHECK_INTERVAL: float = float(os.getenv("TAXONOMY_CHECK_INTERVAL", "5"))
+    TAXONOMY_PREFIX_LIMIT: int = int(os.getenv("TAXONOMY_PREFIX_LIMIT", "50"))
+    TAXONOMY_CACHE_MAX_AGE: int = int(os.getenv("TAXONOMY_CACHE_MAX_AGE", "60"))
+
+    # Подсказки по названиям (/suggest): индекс в памяти по фильмам и книгам из БД
+    SUGGEST_ENABLED: bool = os.getenv("SUGGEST_ENABLED", "True") == "True"
+    # Сохранять фильмы из ответов Кинопоиска в таблицы movies/series
+    SUGGEST_RECORD_FILMS: bool = os.getenv("SUGGEST_RECORD_FILMS", "True") == "True"
+    SUGGEST_RECORD_FLUSH_DELAY: float = float(os.getenv("SUGGEST_RECORD_FLUSH_DELAY", "2"))
+    SUGGEST_REFRESH_INTERVAL: float = float(os.getenv("SUGGEST_REFRESH_INTERVAL", "30"))
+    # Новые названия копятся в малом индексе; при превышении порога индекс пересобирается целиком
+    SUGGEST_DELTA_MAX: int = int(os.getenv("SUGGEST_DELTA_MAX", "20000"))
+    SUGGEST_LOAD_BATCH: int = int(os.getenv("SUGGEST_LOAD_BATCH", "50000"))
+    # Книги из дампов OpenLibrary (их миллионы) попадают в индекс только в этом количестве; 0 — не попадают
+    SUGGEST_DUMP_BOOKS: int = int(os.getenv("SUGGEST_DUMP_BOOKS", "0"))
+    # Ключ — название с начала одного из первых SUGGEST_WORDS слов, обрезанное до SUGGEST_KEY_LENGTH символов
+    SUGGEST_KEY_LENGTH: int = int(os.getenv("SUGGEST_KEY_LENGTH", "24"))
+    SUGGEST_WORDS: int = int(os.getenv("SUGGEST_WORDS", "4"))
+    # Сколько лучших по рангу совпадений префикса просматривается при выдаче;
+    # для префиксов до SUGGEST_SHORT_PREFIX символов они выбираются при построении индекса
+    SUGGEST_SCAN_LIMIT: int = int(os.getenv("SUGGEST_SCAN_LIMIT", "512"))
+    SUGGEST_SHORT_PREFIX: int = int(os.getenv("SUGGEST_SHORT_PREFIX", "3"))
+    SUGGEST_CACHE_MAX_AGE: int = int(os.getenv("SUGGEST_CACHE_MAX_AGE", "60"))
+
+    # Персональная лента (/feed/me): размер, карточек от одного сигнала, последних высоких оценок
+    FEED_SIZE: int = int(os.getenv("FEED_SIZE", "200"))
+    FEED_PAGE_SIZE: int = int(os.getenv("FEED_PAGE_SIZE", "20"))
+    FEED_SOURCE_ITEMS: int = int(os.getenv("FEED_SOURCE_ITEMS", "20"))
+    FEED_LIKED_SIGNALS: int = int(os.getenv("FEED_LIKED_SIGNALS", "10"))
+    FEED_COLLECTIONS: str = os.getenv("FEED_COLLECTIONS", "TOP_100_POPULAR_FILMS,TOP_250_BEST_FILMS")
+    # Лента старше этого срока пересобирается целиком в фоне при открытии (подборки меняются)
+    FEED_REBUILD_AFTER: int = int(os.getenv("FEED_REBUILD_AFTER", "86400"))
+    # Задержка фонового обновления: частые правки настроек сливаются в одну задачу
+    FEED_UPDATE_DELAY: float = float(os.getenv("FEED_UPDATE_DELAY", "2"))
+
+    # Адреса внешних API; в бенчмарках указывают на локальные заглушки.
+    # GigaChat настраивается переменными SDK: GIGACHAT_BASE_URL и GIGACHAT_AUTH_URL
+    KINOPOISK_API_BASE: str = os.getenv("KINOPOISK_API_BASE", "https://kinopoiskapiunofficial.tech/api/v2.2/")
+    OPENLIBRARY_BASE_URL: str = os.getenv("OPENLIBRARY_BASE_URL", "https://openlibrary.org")
+
     CORS_ALLOWED_ORIGINS: list[str] = os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",")
 
 
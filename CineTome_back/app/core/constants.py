@@ -1,45 +0,0 @@
-AVAILABLE_GENRES = [
-    "Фантастика",
-    "Фэнтези",
-    "Детектив",
-    "Роман",
-    "Триллер",
-    "Ужасы",
-    "Научная литература",
-    "Биография",
-    "Исторический",
-    "Поэзия",
-    "Драма",
-    "Комедия",
-    "Приключения",
-    "Детская литература",
-    "Классика",
-    "Психология",
-    "Философия",
-    "Бизнес",
-    "Саморазвитие"
-]
-
-AVAILABLE_AUTHORS = [
-    "Фёдор Достоевский",
-    "Лев Толстой",
-    "Антон Чехов",
-    "Александр Пушкин",
-    "Михаил Булгаков",
-    "Джоан Роулинг",
-    "Джордж Оруэлл",
-    "Рэй Брэдбери",
-    "Стивен Кинг",
-    "Агата Кристи",
-    "Артур Конан Дойл",
-    "Эрнест Хемингуэй",
-    "Фрэнсис Скотт Фицджеральд",
-    "Джон Толкин",
-    "Айзек Азимов"
-]
-
-def get_available_genres():
-    return AVAILABLE_GENRES
-
-def get_available_authors():
-    return AVAILABLE_AUTHORS
\ No newline at end of file
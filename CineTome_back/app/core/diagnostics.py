@@ -0,0 +1,189 @@
+import asyncio
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+EVENT_LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds",
+    "Задержка срабатывания таймера цикла событий",
+)
+EVENT_LOOP_BLOCKED = registry.counter(
+    "event_loop_blocked_total",
+    "Случаи блокировки цикла событий дольше порога",
+)
+PROFILES_WRITTEN = registry.counter(
+    "request_profiles_written_total",
+    "Сохранённые профили запросов",
+)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Стек в формате collapsed (корень первым, через ';') для flamegraph.pl и speedscope"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class LoopLagMonitor:
+    """
+    Измеряет задержку цикла событий и ловит блокирующие вызовы. Корутина
+    обновляет heartbeat каждые interval секунд; отдельный поток, заметив, что
+    heartbeat не обновлялся дольше threshold, логирует текущий стек потока
+    цикла — то есть код, который блокирует его прямо сейчас.
+    """
+
+    def __init__(self, interval: float = settings.LOOP_MONITOR_INTERVAL,
+                 threshold: float = settings.LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            EVENT_LOOP_LAG.observe(max(0.0, now - expected))
+            self._heartbeat = now
+
+    def _watch(self):
+        reported_for = None
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat
+            if blocked_for < self.threshold or reported_for == heartbeat:
+                continue
+            # Один отчёт на эпизод блокировки
+            reported_for = heartbeat
+            EVENT_LOOP_BLOCKED.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            logger.warning(f"Event loop blocked for {blocked_for:.3f}s, current stack:\n{stack}")
+
+
+class StackSampler(threading.Thread):
+    """Периодически снимает стек указанного потока и считает одинаковые стеки"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._finished = threading.Event()
+
+    def run(self):
+        while not self._finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame)] += 1
+
+    def stop(self):
+        self._finished.set()
+        self.join(timeout=1)
+
+
+def _profile_requested(scope) -> bool:
+    if not settings.ADMIN_TOKEN:
+        return False
+    headers = dict(scope["headers"])
+    token = headers.get(b"x-admin-token", b"").decode("latin-1")
+    if not token or not hmac.compare_digest(token, settings.ADMIN_TOKEN):
+        return False
+    if headers.get(b"x-profile") in (b"1", b"true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("__profile", [""])[0] in ("1", "true")
+
+
+class ProfilerMiddleware:
+    """
+    Профилирование отдельного запроса по заголовку X-Profile: 1 (или ?__profile=1)
+    вместе с X-Admin-Token. Стеки потока цикла событий снимаются раз в
+    PROFILER_INTERVAL секунд и сохраняются в PROFILER_DIR в формате collapsed;
+    имя файла возвращается в заголовке X-Profile-File. В профиль попадают и
+    корутины других запросов, выполнявшиеся в это же время.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid4().hex[:8]}-{scope['method']}-{slug}.collapsed"
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-file", filename.encode())]
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), settings.PROFILER_INTERVAL)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            sampler.stop()
+            await asyncio.to_thread(_write_profile, Path(settings.PROFILER_DIR) / filename, sampler.samples)
+
+
+def _write_profile(path: Path, samples: Counter):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    PROFILES_WRITTEN.inc()
+    logger.info(f"Request profile written to {path} ({sum(samples.values())} samples)")
@@ -1,30 +1,202 @@
+import asyncio
 import os
+import time
+from typing import Dict, Optional
+import jwt
+from fastapi import Request
+from sqlalchemy import exc, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core import settings as token_settings
+from app.core.config import settings
+from app.core.metrics import registry
 
 
-DB_HOST = os.getenv("DB_HOST", "db")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASS = os.getenv("DB_PASS", "postgres")
-DB_NAME = os.getenv("DB_NAME", "cinetome")
+DATABASE_URL = os.getenv("DATABASE_URL", settings.ASYNC_DATABASE_URL)
 
 
-DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DB_POOL_CHECKOUT_SECONDS = registry.histogram(
+    "db_pool_checkout_seconds",
+    "Время ожидания соединения из пула",
+    ["pool"],
 )
+DB_POOL_TIMEOUTS = registry.counter(
+    "db_pool_timeouts_total",
+    "Количество таймаутов ожидания соединения из пула",
+    ["pool"],
+)
+DB_POOL_CHECKED_OUT = registry.gauge(
+    "db_pool_checked_out",
+    "Количество выданных соединений",
+    ["pool"],
+)
+DB_POOL_CAPACITY = registry.gauge(
+    "db_pool_capacity",
+    "Максимальное число соединений в пуле (pool_size + max_overflow)",
+    ["pool"],
+)
+DB_POOL_SATURATION = registry.gauge(
+    "db_pool_saturation",
+    "Доля занятых соединений от максимального размера пула",
+    ["pool"],
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание выдачи соединения"""
+    pool_name = "primary"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc(pool=self.pool_name)
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started, pool=self.pool_name)
+
+
+def create_engine_from_settings(url: str, pool_name: str = "primary") -> AsyncEngine:
+    """Создание движка по профилю из настроек"""
+    pool_class = type(f"InstrumentedQueuePool_{pool_name}", (InstrumentedQueuePool,), {"pool_name": pool_name})
 
-engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=True)
+    new_engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=pool_class,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+    )
+
+    pool = new_engine.sync_engine.pool
+    capacity = settings.DB_POOL_SIZE + max(settings.DB_MAX_OVERFLOW, 0)
+    DB_POOL_CAPACITY.set(capacity, pool=pool_name)
+    DB_POOL_CHECKED_OUT.set_function(pool.checkedout, pool=pool_name)
+    DB_POOL_SATURATION.set_function(lambda: pool.checkedout() / capacity if capacity else 0.0, pool=pool_name)
+    return new_engine
+
+
+engine: AsyncEngine = create_engine_from_settings(DATABASE_URL)
+
+replica_engine: AsyncEngine = (
+    create_engine_from_settings(settings.DB_REPLICA_URL, "replica") if settings.DB_REPLICA_URL else engine
+)
 
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False
 )
 
+async_read_session = sessionmaker(
+    replica_engine, class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False
+)
+
+# Пользователь (sub из JWT) -> время, до которого его чтения идут в основную БД.
+# Между воркерами отметка передаётся через общий backend кеша
+_primary_until: Dict[str, float] = {}
+_PRIMARY_UNTIL_MAX = 10000
+
+DB_SESSIONS = registry.counter(
+    "db_sessions_total",
+    "Количество открытых сессий по типу маршрутизации",
+    ["route"],
+)
+
 
 Base = declarative_base()
 
-async def get_db():
+
+async def ping(target_engine: AsyncEngine = engine):
+    """Проверка доступности БД"""
+    async with target_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def warm_up_pool(target_engine: AsyncEngine = engine, size: int = settings.DB_POOL_WARM_SIZE):
+    """Заранее открывает size соединений, чтобы первые запросы не платили за подключение"""
+    size = min(size, settings.DB_POOL_SIZE)
+    if size <= 0:
+        return
+    connections = await asyncio.gather(*(target_engine.connect() for _ in range(size)))
+    try:
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in connections))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in connections))
+
+
+def _token_subject(request: Request) -> Optional[str]:
+    """sub из bearer-токена запроса; без токена или с невалидным токеном — None"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, token_settings.SECRET_KEY, algorithms=[token_settings.ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    subject = payload.get("sub")
+    return str(subject) if subject is not None else None
+
+
+async def _mark_primary_sticky(subject: str, ttl: int):
+    # Импорт здесь: cache_backends сам зависит от этого модуля
+    from app.services.cache_backends import get_shared_backend
+
+    now = time.time()
+    _primary_until[subject] = now + ttl
+    if len(_primary_until) > _PRIMARY_UNTIL_MAX:
+        for expired in [key for key, until in _primary_until.items() if until <= now]:
+            del _primary_until[expired]
+    backend = get_shared_backend()
+    if backend is not None:
+        await backend.set(f"primary_sticky:{subject}", b"1", ttl)
+
+
+async def _is_primary_sticky(subject: str) -> bool:
+    """Пользователь недавно писал в БД и должен читать свои изменения из основной БД"""
+    from app.services.cache_backends import get_shared_backend
+
+    until = _primary_until.get(subject)
+    if until is not None:
+        if until > time.time():
+            return True
+        del _primary_until[subject]
+    backend = get_shared_backend()
+    return backend is not None and await backend.get(f"primary_sticky:{subject}") is not None
+
+
+async def get_write_db(request: Request):
+    """
+    Сессия основной БД для пишущих эндпоинтов. Автор запроса (sub из токена)
+    на DB_READ_YOUR_WRITES_SECONDS закрепляется за основной БД.
+    """
+    ttl = settings.DB_READ_YOUR_WRITES_SECONDS
+    if replica_engine is not engine and ttl > 0:
+        subject = _token_subject(request)
+        if subject is not None:
+            await _mark_primary_sticky(subject, ttl)
+    DB_SESSIONS.inc(route="primary")
     async with async_session() as db:
-        yield db
\ No newline at end of file
+        yield db
+
+
+async def get_read_db(request: Request):
+    """Сессия для читающих эндпоинтов: реплика, если пользователь не закреплён за основной БД"""
+    subject = _token_subject(request) if replica_engine is not engine else None
+    if replica_engine is engine or (subject is not None and await _is_primary_sticky(subject)):
+        DB_SESSIONS.inc(route="primary")
+        session_factory = async_session
+    else:
+        DB_SESSIONS.inc(route="replica")
+        session_factory = async_read_session
+    async with session_factory() as db:
+        yield db
+
+
+# Совместимость со старым кодом: по умолчанию сессия основной БД
+get_db = get_write_db
@@ -0,0 +1,37 @@
+"""
+Импорт дампов OpenLibrary (https://openlibrary.org/developers/dumps) в таблицу books:
+    python -m app.ingest_openlibrary authors ol_dump_authors_2024-01-31.txt.gz
+    python -m app.ingest_openlibrary works ol_dump_works_2024-01-31.txt.gz
+
+Авторы загружаются первыми: по ним работы получают имена авторов. Прерванный
+импорт продолжается с последней зафиксированной пачки; --incremental загружает
+из нового дампа только записи, изменённые после предыдущего завершённого импорта.
+"""
+import argparse
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.database import engine
+from app.services.ol_dump import AUTHORS, WORKS, DumpIngestion
+
+
+async def main(args):
+    try:
+        for path in args.paths:
+            await DumpIngestion(engine, path, args.kind, batch_size=args.batch_size,
+                                incremental=args.incremental, restart=args.restart).run()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=[AUTHORS, WORKS])
+    parser.add_argument("paths", nargs="+", help="Файлы дампа (.txt.gz или распакованные)")
+    parser.add_argument("--batch-size", type=int, default=settings.OL_DUMP_BATCH_SIZE)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Только записи новее предыдущего завершённого импорта")
+    parser.add_argument("--restart", action="store_true", help="Загрузить файл заново, игнорируя отметку прогресса")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
@@ -1,19 +1,55 @@
 from fastapi import FastAPI, Request
-from app.database import Base, engine
+from app.database import engine, replica_engine, ping, warm_up_pool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, books, movies, ai, preferences, users
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from app.routers import auth, books, movies, ai, preferences, users, metrics, health, jobs, images, suggest, feed
+from app.services.http_clients import warm_up_clients, close_clients
+from app.services.cache_backends import close_shared_backend
+from app.services import job_handlers  # noqa: F401 (регистрация обработчиков фоновых задач)
+from app.services.jobs import job_worker
+from app.services.similar_books import flush_recorded_books
+from app.services.suggest import suggest_index, flush_recorded_films
+from app.services.image_proxy import close_image_pool
+from app.wait_for_db import wait_with_backoff
 from fastapi.staticfiles import StaticFiles
 from app.core.config import settings
+from app.core.admission import AdmissionMiddleware
+from app.core.diagnostics import LoopLagMonitor, ProfilerMiddleware
 from fastapi.openapi.utils import get_openapi
 
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # brotli-asgi не установлен — только gzip
+    BrotliMiddleware = None
 
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Сжатие подключается первым, чтобы оказаться внутри log_requests: BaseHTTPMiddleware
+# отдаёт тело потоком, и порог minimum_size перестал бы работать
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware,
+        quality=settings.BROTLI_QUALITY,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_fallback=True,
+        excluded_handlers=[r"^/uploads", r"^/images"],
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+loop_monitor = LoopLagMonitor()
+
+# Заголовки с учётными данными не попадают в лог
+REDACTED_HEADERS = {"authorization", "x-admin-token", "cookie"}
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     print(f"Request URL: {request.url}")
-    print(f"Request Headers: {dict(request.headers)}")  # Логируем все заголовки
+    headers = {name: "***" if name in REDACTED_HEADERS else value for name, value in request.headers.items()}
+    print(f"Request Headers: {headers}")
     response = await call_next(request)
     return response
 
@@ -42,9 +78,14 @@ def custom_openapi():
 app.openapi = custom_openapi
 
 
-async def init_models():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+# Профилировщик снаружи log_requests: BaseHTTPMiddleware отменяет вложенное приложение
+# после отправки ответа, и профиль не успел бы записаться
+app.add_middleware(ProfilerMiddleware)
+
+# Контроль допуска снаружи логирования и сжатия, но внутри CORS, чтобы ответы 503
+# тоже получали CORS-заголовки
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -54,8 +95,32 @@ app.add_middleware(
 )
 @app.on_event("startup")
 async def startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    # Схема БД создаётся миграциями (alembic upgrade head) до запуска воркеров,
+    # здесь только ждём БД и прогреваем пулы соединений
+    if await wait_with_backoff(lambda: ping(engine)):
+        await warm_up_pool(engine)
+    await warm_up_clients()
+    if settings.JOB_WORKER_EMBEDDED:
+        job_worker.start()
+    if settings.SUGGEST_ENABLED:
+        suggest_index.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await loop_monitor.stop()
+    await suggest_index.stop()
+    await flush_recorded_books()
+    await flush_recorded_films()
+    await job_worker.stop()
+    await close_clients()
+    close_image_pool()
+    await close_shared_backend()
+    await engine.dispose()
+    if replica_engine is not engine:
+        await replica_engine.dispose()
 
 app.include_router(ai.router)
 app.include_router(auth.router)
@@ -63,6 +128,12 @@ app.include_router(books.router)
 app.include_router(movies.router)
 app.include_router(users.router)
 app.include_router(preferences.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
+app.include_router(jobs.router)
+app.include_router(images.router)
+app.include_router(suggest.router)
+app.include_router(feed.router)
 app.mount("/uploads", StaticFiles(directory=settings.UPLOADS_DIR), name="uploads")
 
 @app.get("/")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, JSON
 from app.database import Base
 
 class Book(Base):
@@ -9,4 +9,19 @@ class Book(Base):
     title = Column(String, index=True)
     author = Column(String)
     year = Column(Integer, nullable=True)
-    description = Column(String, nullable=True)
\ No newline at end of file
+    description = Column(String, nullable=True)
+    # Заполняются импортом дампов OpenLibrary (python -m app.ingest_openlibrary)
+    authors = Column(JSON, nullable=True)
+    subjects = Column(JSON, nullable=True)
+    cover_id = Column(Integer, nullable=True)
+    revision = Column(Integer, nullable=True)
+    last_modified = Column(String(32), nullable=True)
+
+
+class BookAuthor(Base):
+    """Авторы из дампа OpenLibrary: ключ /authors/OL...A -> имя"""
+    __tablename__ = "ol_authors"
+
+    key = Column(String, primary_key=True)
+    name = Column(String, nullable=False)
+    revision = Column(Integer, nullable=True)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, LargeBinary, DateTime, Index, BigInteger
+from app.database import Base
+
+class CacheEntry(Base):
+    """Общий кеш ответов внешних API; UNLOGGED — содержимое не переживает сбой БД, и это допустимо"""
+    __tablename__ = "cache_entries"
+    __table_args__ = (
+        Index("ix_cache_entries_expires_at", "expires_at"),
+        {"prefixes": ["UNLOGGED"]},
+    )
+
+    key = Column(String(512), primary_key=True)
+    value = Column(LargeBinary, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class RateCounter(Base):
+    """Общие для воркеров счётчики ограничителей запросов (окно в секунду, сутки)"""
+    __tablename__ = "rate_counters"
+    __table_args__ = ({"prefixes": ["UNLOGGED"]},)
+
+    key = Column(String(255), primary_key=True)
+    value = Column(BigInteger, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
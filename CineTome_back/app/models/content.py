@@ -8,6 +8,7 @@ class Movie(Base):
     kp_id = Column(Integer, unique=True, index=True)
     imdb_id = Column(String, nullable=True)
     title = Column(String, index=True)
+    title_en = Column(String, nullable=True)
     year = Column(Integer)
     poster = Column(String, nullable=True)
     genres = Column(JSON)
@@ -24,6 +25,7 @@ class Series(Base):
     kp_id = Column(Integer, unique=True, index=True)
     imdb_id = Column(String, nullable=True)
     title = Column(String, index=True)
+    title_en = Column(String, nullable=True)
     year = Column(Integer)
     poster = Column(String, nullable=True)
     genres = Column(JSON)
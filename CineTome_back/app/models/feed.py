@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, ForeignKey, Index, func
+from app.database import Base
+
+class UserFeed(Base):
+    """Состояние ленты пользователя: есть ли она и когда пересобрана целиком"""
+    __tablename__ = "user_feeds"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    built_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class FeedItem(Base):
+    """Карточка ленты; страница — чтение по индексу (user_id, score, item_key)"""
+    __tablename__ = "user_feed_items"
+    __table_args__ = (
+        # ORDER BY score DESC, item_key DESC читает индекс в обратном порядке
+        Index("ix_user_feed_items_page", "user_id", "score", "item_key"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # "movie:<kp_id>" или "book:<work_id>"
+    item_key = Column(String(64), primary_key=True)
+    score = Column(Float, nullable=False)
+    # Сигнал, из которого пришла карточка: genre:<жанр>, author:<автор>, liked:<тип>:<id>, collection:<подборка>
+    source = Column(String(255), nullable=False)
+    card = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, BigInteger, Boolean, DateTime, func
+from app.database import Base
+
+class IngestCheckpoint(Base):
+    """Прогресс импорта файла дампа: после перезапуска импорт продолжается с lines_done"""
+    __tablename__ = "ingest_checkpoints"
+
+    source = Column(String, primary_key=True)
+    kind = Column(String(16), nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    lines_done = Column(BigInteger, nullable=False, default=0)
+    rows_loaded = Column(BigInteger, nullable=False, default=0)
+    # Наибольшее last_modified среди загруженных строк — граница следующего инкрементального импорта
+    max_last_modified = Column(String(32), nullable=True)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
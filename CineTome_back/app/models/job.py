@@ -0,0 +1,37 @@
+import uuid
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index, func, text
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+ACTIVE_JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        # Ключ дедупликации уникален только среди незавершённых задач
+        Index("uq_jobs_dedup_key_active", "dedup_key", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(16), nullable=False, default=JOB_QUEUED)
+    dedup_key = Column(String(255), nullable=True)
+    # Пользователь, поставивший задачу; статус виден только ему. У служебных задач пусто
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    locked_by = Column(String(128), nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, UniqueConstraint, func
+from app.database import Base
+
+TAXONOMY_GENRE = "genre"
+TAXONOMY_AUTHOR = "author"
+
+
+class TaxonomyTerm(Base):
+    """Жанры и авторы для предпочтений пользователя; порядок выдачи — position, затем name"""
+    __tablename__ = "taxonomy_terms"
+    __table_args__ = (
+        UniqueConstraint("kind", "name", name="uq_taxonomy_terms_kind_name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16), nullable=False)
+    name = Column(String(255), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TaxonomyVersion(Base):
+    """Единственная строка; version увеличивается триггером при любом изменении taxonomy_terms"""
+    __tablename__ = "taxonomy_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint, func
+from app.database import Base
+
+class Translation(Base):
+    __tablename__ = "translations"
+    __table_args__ = (
+        UniqueConstraint("source_hash", "target_lang", name="uq_translations_source_hash_target_lang"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    source_hash = Column(String(64), nullable=False)
+    target_lang = Column(String(8), nullable=False)
+    source_text = Column(Text, nullable=False)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
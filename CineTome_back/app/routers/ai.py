@@ -1,5 +1,9 @@
-from fastapi import APIRouter, HTTPException
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException
+from app.models.user import User
+from app.services.auth import get_current_user
 from app.services.gigachat_client import get_gigachat_client
+from app.services.jobs import enqueue
 from app.schemas.ai import ContentSummaryRequest, ContentSummaryResponse
 from pydantic import BaseModel
 from typing import Optional
@@ -56,4 +60,23 @@ async def generate_content_summary(request: ContentSummaryRequest):
         raise HTTPException(
             status_code=500,
             detail=f"Ошибка при генерации описания: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/generate-summary/jobs", status_code=202)
+async def enqueue_content_summary(request: ContentSummaryRequest, user: User = Depends(get_current_user)):
+    """
+    Генерация описания в фоновой задаче. Возвращает job_id, результат
+    доступен автору запроса через GET /jobs/{job_id}. Одинаковые запросы
+    пользователя, пока задача не завершена, получают один и тот же job_id.
+    """
+    payload = request.dict()
+    fingerprint = "|".join(str(payload.get(field) or "").strip().lower()
+                           for field in ("title", "content_type", "author", "year"))
+    job = await enqueue(
+        "content_summary",
+        payload,
+        dedup_key=f"content_summary:{user.id}:{hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()}",
+        user_id=user.id,
+    )
+    return {"job_id": str(job.id), "status": job.status}
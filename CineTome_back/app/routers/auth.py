@@ -4,10 +4,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_write_db
 from app.schemas.user import UserCreate, UserResponse, UserLogin
 from app.services.auth import  login_user
 from app.services.user_service import create_user
+from app.services.feed import schedule_feed_build
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -16,9 +17,13 @@ class EmailPasswordRequestForm(BaseModel):
     password: str
 
 @router.post("/register")
-async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
-    return await create_user(db, user_data)
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_write_db)):
+    user = await create_user(db, user_data)
+    # Лента (пока только подборки) готова к первому открытию приложения
+    await schedule_feed_build(user.id)
+    return user
 
 @router.post("/login")
-async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_write_db)):
+    # Основная БД: вход сразу после регистрации не должен зависеть от отставания реплики
     return await login_user(db, user.email, user.password)
\ No newline at end of file
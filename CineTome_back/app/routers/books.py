@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Query, HTTPException, Path
+from fastapi import APIRouter, Query, HTTPException, Path, Request
 from typing import List, Optional
-from app.services.open_library import search_books, get_book_details
-from app.schemas.book import BookSearchResult, BookDetails
+from fastapi.responses import ORJSONResponse
+from app.services.open_library import (
+    search_books, prefetch_search, get_book_details, get_books_batch, get_similar_books,
+)
+from app.schemas.book import BookSearchResult, BookDetails, BookBatchRequest, SimilarBook, WORK_ID_PATTERN
 from app.services.gigachat_client import get_gigachat_client
+from app.utils.http_cache import conditional_json_response, json_etag, not_modified_response
 import logging
 
 router = APIRouter(prefix="/books", tags=["Books"])
@@ -23,12 +27,36 @@ async def book_search(
     Поиск книг по названию, автору, ISBN или жанру через OpenLibrary.
     Возвращает список книг с work_id для получения деталей.
     """
-    return await search_books(query, limit, page, search_type, sort_by_popularity, sort_by_new, translate)
+    books = await search_books(query, limit, page, search_type, sort_by_popularity, sort_by_new, translate)
+    if len(books) >= limit:
+        prefetch_search(query, limit, page + 1, search_type, sort_by_popularity, sort_by_new)
+    return books
+
+
+@router.post("/batch")
+async def books_batch(request: BookBatchRequest):
+    """
+    Детали нескольких книг за один запрос.
+    Возвращает books (work_id -> книга) и errors (work_id -> ошибка), в том числе
+    для id, не прошедших проверку формата OL...W.
+    """
+    return ORJSONResponse(await get_books_batch(request.work_ids, request.translate))
+
+
+@router.get("/{work_id}/similar", response_model=List[SimilarBook])
+async def similar_books(
+        request: Request,
+        work_id: str = Path(..., regex=WORK_ID_PATTERN),
+        limit: int = Query(10, ge=1, le=50, description="Количество похожих книг")
+):
+    """Похожие книги по описаниям и темам (локальный индекс, без запросов к OpenLibrary)"""
+    return conditional_json_response(request, await get_similar_books(work_id, limit))
 
 
 @router.get("/{work_id}")
 async def book_details(
-        work_id: str = Path(..., regex=r"^OL\d+W$"),
+        request: Request,
+        work_id: str = Path(..., regex=WORK_ID_PATTERN),
         translate: bool = Query(False),
         with_summary: bool = Query(False, description="Генерировать краткое описание с помощью AI")
 ):
@@ -36,7 +64,12 @@ async def book_details(
     try:
         book = await get_book_details(work_id, translate)
 
+        # ETag без AI-описания: при совпадении If-None-Match модель не вызывается
+        etag = json_etag(book, weak=True) if with_summary else None
         if with_summary:
+            not_modified = not_modified_response(request, etag)
+            if not_modified is not None:
+                return not_modified
             try:
                 gigachat = get_gigachat_client()
                 book["summary"] = gigachat.generate_content_summary(
@@ -49,7 +82,7 @@ async def book_details(
                 logger.error(f"Failed to generate book summary: {str(e)}")
                 book["summary"] = None
 
-        return book
+        return conditional_json_response(request, book, etag=etag)
     except HTTPException as e:
         raise e
     except Exception as e:
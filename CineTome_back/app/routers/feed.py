@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.database import get_read_db
+from app.models.user import User
+from app.schemas.feed import FeedPage
+from app.services.auth import get_current_user
+from app.services.feed import get_feed_page
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+
+@router.get("/me", response_model=FeedPage)
+async def read_feed(
+        cursor: Optional[str] = Query(None, max_length=512, description="next_cursor предыдущей страницы"),
+        limit: int = Query(settings.FEED_PAGE_SIZE, ge=1, le=50),
+        db: AsyncSession = Depends(get_read_db),
+        user: User = Depends(get_current_user),
+):
+    """
+    Персональная лента: фильмы и книги по жанрам, авторам и высоким оценкам
+    пользователя вперемешку с подборками. Лента хранится готовой и
+    обновляется в фоне при изменении настроек и оценок; status=building —
+    лента ещё строится.
+    """
+    return await get_feed_page(db, user.id, cursor, limit)
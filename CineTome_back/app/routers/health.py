@@ -0,0 +1,44 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.database import engine, replica_engine, ping
+from app.services.http_clients import upstream_status
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+READY_CHECK_TIMEOUT = 2.0
+
+
+async def _check_database(target_engine) -> bool:
+    try:
+        await asyncio.wait_for(ping(target_engine), timeout=READY_CHECK_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+
+@router.get("/live")
+async def liveness():
+    """Процесс запущен и обрабатывает запросы"""
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    Готовность принимать трафик: доступность БД (и реплики) обязательна,
+    состояние прогрева внешних API носит информационный характер.
+    """
+    checks = {"database": await _check_database(engine)}
+    if replica_engine is not engine:
+        checks["database_replica"] = await _check_database(replica_engine)
+
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "upstreams": upstream_status(),
+        },
+    )
@@ -0,0 +1,29 @@
+from typing import Optional
+from fastapi import APIRouter, Query, Response
+from fastapi.responses import FileResponse
+from app.core.config import settings
+from app.services.image_proxy import get_image, cache_root
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+# Содержимое по ссылке не меняется: ключ кеша — исходный URL и ширина
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("")
+async def proxy_image(
+    url: str = Query(..., description="Исходная ссылка на постер или обложку"),
+    w: Optional[int] = Query(None, ge=16, le=4096, description="Ширина, округляется вверх до разрешённой")
+):
+    """
+    Постер или обложка из дискового кеша; при промахе изображение загружается
+    с исходного хоста и при необходимости уменьшается до ширины w.
+    """
+    path, media_type = await get_image(url, w)
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if settings.IMAGE_PROXY_ACCEL_REDIRECT:
+        # Файл отдаёт nginx (sendfile), приложение только указывает путь
+        relative = path.relative_to(cache_root()).as_posix()
+        headers["X-Accel-Redirect"] = f"{settings.IMAGE_PROXY_ACCEL_REDIRECT.rstrip('/')}/{relative}"
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,22 @@
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException
+from app.models.user import User
+from app.schemas.job import JobStatusResponse
+from app.services.auth import get_current_user
+from app.services.jobs import get_job
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def job_status(job_id: UUID, user: User = Depends(get_current_user)):
+    """
+    Статус фоновой задачи: queued, running, succeeded (result заполнен)
+    или failed (error заполнен). Клиент опрашивает эндпоинт, пока задача не завершится.
+    Доступна только задача, поставленная текущим пользователем.
+    """
+    job = await get_job(job_id)
+    # Чужая задача неотличима от несуществующей
+    if job is None or job.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
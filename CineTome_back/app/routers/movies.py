@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Query, HTTPException, Path
-from app.services.kinopoisk_client import KinopoiskAPI, TopFilmType
+from fastapi import APIRouter, Query, HTTPException, Path, Request
+from fastapi.responses import ORJSONResponse
+from app.services.kinopoisk_client import KinopoiskAPI, TopFilmType, UPSTREAM_PAGE_SIZE
 from app.services.gigachat_client import get_gigachat_client
+from app.utils.http_cache import conditional_json_response, json_etag, not_modified_response
+from app.schemas.movie import FilmBatchRequest
 from typing import Optional, Dict
+import asyncio
 import logging
 
 router = APIRouter(prefix="/api/kp", tags=["Kinopoisk"])
@@ -28,7 +32,12 @@ async def search_content(
     - page: номер страницы
     - content_type: тип контента (FILM, TV_SERIES, TV_SHOW, MINI_SERIES, ALL)
     """
-    return await kp_api.search_films(query, page)
+    films = await kp_api.search_films(query, page)
+    if len(films) >= UPSTREAM_PAGE_SIZE:
+        kp_api.prefetch_search(query, page + 1)
+    # Списки уже состоят из JSON-совместимых dict, поэтому отдаём их напрямую,
+    # минуя jsonable_encoder
+    return ORJSONResponse(films)
 
 @router.get("/collections")
 async def get_collection(
@@ -37,18 +46,47 @@ async def get_collection(
         description="Тип подборки. Доступные значения: " +
         ", ".join([f"{t.value} ({t.name})" for t in TopFilmType])
     ),
-    page: int = Query(1, ge=1, description="Номер страницы")
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    limit: int = Query(20, ge=1, le=20, description="Количество элементов на странице (макс. 20)")
 ):
     """
     Получение фильмов из различных подборок Кинопоиска.
     Поддерживает все типы топов и тематических подборок.
     """
-    return await kp_api.get_collection(
+    items = await kp_api.get_collection(
         collection_type=type,
-        page=page
+        page=page,
+        limit=limit
     )
+    await kp_api.prefetch_collection(type, page + 1)
+    return ORJSONResponse(items)
+
+@router.get("/collections/items")
+async def get_collection_items(
+    type: TopFilmType = Query(TopFilmType.TOP_250_BEST_FILMS, description="Тип подборки"),
+    offset: int = Query(0, ge=0, description="Смещение от начала подборки"),
+    limit: Optional[int] = Query(None, ge=1, le=400, description="Количество элементов (без ограничения — вся подборка)")
+):
+    """
+    Произвольный срез подборки по offset/limit. Страницы Кинопоиска
+    запрашиваются параллельно, поэтому весь топ-250 собирается за один запрос.
+    """
+    return ORJSONResponse(await kp_api.get_collection_range(
+        collection_type=type,
+        offset=offset,
+        limit=limit
+    ))
+@router.post("/films/batch")
+async def get_films_batch(request: FilmBatchRequest):
+    """
+    Детали нескольких фильмов за один запрос.
+    Возвращает films (id -> фильм) и errors (id -> ошибка) для id, которые получить не удалось.
+    """
+    return ORJSONResponse(await kp_api.get_films_batch(request.ids))
+
 @router.get("/films/{film_id}")
 async def get_film_details(
+    request: Request,
     film_id: int = Path(..., description="Kinopoisk ID фильма"),
     with_sequels: bool = Query(False, description="Включить информацию о сиквелах и приквелах"),
     with_similars: bool = Query(False, description="Включить похожие фильмы"),
@@ -71,8 +109,13 @@ async def get_film_details(
     if with_videos:
         film["videos"] = await kp_api.get_film_videos(film_id)
 
-    # AI-описание
+    # AI-описание недетерминировано: ETag считается по данным Кинопоиска до него,
+    # и при совпадении If-None-Match модель не вызывается
+    etag = json_etag(film, weak=True) if with_summary else None
     if with_summary:
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
         try:
             gigachat = get_gigachat_client()
             film["ai_summary"] = gigachat.generate_content_summary(
@@ -84,23 +127,47 @@ async def get_film_details(
             logger.error(f"Failed to generate summary: {str(e)}")
             film["ai_summary"] = None
 
-    return film
+    return conditional_json_response(request, film, etag=etag)
 
 @router.get("/series/{series_id}")
 async def get_series_details(
+    request: Request,
     series_id: int = Path(..., description="Kinopoisk ID сериала"),
     with_seasons: bool = Query(True, description="Включить информацию о сезонах"),
     with_summary: bool = Query(False, description="Генерировать краткое описание с помощью AI")
 ):
-    """Информация о сериале (специализированный endpoint)"""
-    series = await kp_api.get_film_details(series_id)
+    """
+    Информация о сериале (специализированный endpoint).
+    Сезоны запрашиваются параллельно с карточкой сериала и содержат только
+    число эпизодов; сами эпизоды отдаёт /series/{series_id}/seasons/{season_number}.
+    """
+    if with_seasons:
+        series, seasons = await asyncio.gather(
+            kp_api.get_film_details(series_id),
+            kp_api.get_seasons_summary(series_id),
+            return_exceptions=True
+        )
+        if isinstance(series, BaseException):
+            raise series
+    else:
+        series, seasons = await kp_api.get_film_details(series_id), None
+
     if not series or not series.get("is_series"):
         raise HTTPException(status_code=404, detail="Series not found")
 
-    if not with_seasons and "seasons_info" in series:
-        del series["seasons_info"]
+    series.pop("seasons_info", None)
+    if with_seasons:
+        if isinstance(seasons, BaseException):
+            logger.error(f"Failed to load seasons for {series_id}: {str(seasons)}")
+            series["seasons_info"] = None
+        else:
+            series["seasons_info"] = seasons
 
+    etag = json_etag(series, weak=True) if with_summary else None
     if with_summary:
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
         try:
             gigachat = get_gigachat_client()
             series["ai_summary"] = gigachat.generate_content_summary(
@@ -113,4 +180,18 @@ async def get_series_details(
             logger.error(f"Failed to generate series summary: {str(e)}")
             series["ai_summary"] = None
 
-    return series
\ No newline at end of file
+    return conditional_json_response(request, series, etag=etag)
+
+@router.get("/series/{series_id}/seasons/{season_number}")
+async def get_season_episodes(
+    request: Request,
+    series_id: int = Path(..., description="Kinopoisk ID сериала"),
+    season_number: int = Path(..., ge=0, description="Номер сезона"),
+    offset: int = Query(0, ge=0, description="Смещение в списке эпизодов"),
+    limit: int = Query(50, ge=1, le=200, description="Количество эпизодов")
+):
+    """Эпизоды одного сезона с пагинацией"""
+    season = await kp_api.get_season_episodes(series_id, season_number, offset, limit)
+    if season is None:
+        raise HTTPException(status_code=404, detail="Season not found")
+    return conditional_json_response(request, season)
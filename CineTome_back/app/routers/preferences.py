@@ -1,7 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
 from app.schemas.user import UserPreferences, UserRating
-from app.services.auth import get_current_user
-from app.database import get_db
+from app.services.auth import get_current_user_for_write
+from app.services.feed import (
+    preference_sources, liked_source, item_key, remove_sources, remove_item, schedule_feed_update,
+)
+from app.database import get_write_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.user import User
 
@@ -11,23 +15,34 @@ router = APIRouter(prefix="/preferences", tags=["preferences"])
 @router.post("/update")
 async def update_preferences(
         prefs: UserPreferences,
-        db: AsyncSession = Depends(get_db),
-        user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_write_db),
+        user: User = Depends(get_current_user_for_write)
 ):
+    old_sources = preference_sources(user.preferences)
+    new_sources = preference_sources(prefs.dict())
     user.preferences = prefs.dict()
+    # Снятые жанры и авторы уходят из ленты сразу, новые добавляются в фоне
+    await remove_sources(db, user.id, old_sources - new_sources)
     await db.commit()
+    await schedule_feed_update(user.id, new_sources - old_sources)
     return {"message": "Preferences updated"}
 
 
 @router.post("/add-rating")
 async def add_rating(
         rating: UserRating,
-        db: AsyncSession = Depends(get_db),
-        user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_write_db),
+        user: User = Depends(get_current_user_for_write)
 ):
-    if not user.ratings_history:
-        user.ratings_history = []
+    # Новый список, а не append: изменение JSON-поля на месте SQLAlchemy не отслеживает
+    user.ratings_history = [*(user.ratings_history or []), jsonable_encoder(rating)]
 
-    user.ratings_history.append(rating.dict())
+    # Оценённое убирается из ленты; высокая оценка добавляет похожее, низкая снимает ранее добавленное
+    await remove_item(db, user.id, item_key(rating.item_type, rating.item_id))
+    source = liked_source(rating.item_type, rating.item_id)
+    if rating.rating <= 3:
+        await remove_sources(db, user.id, [source])
     await db.commit()
-    return {"message": "Rating added"}
\ No newline at end of file
+    if rating.rating >= 4:
+        await schedule_feed_update(user.id, [source])
+    return {"message": "Rating added"}
@@ -0,0 +1,34 @@
+from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from app.core.config import settings
+from app.schemas.suggest import Suggestion
+from app.services.suggest import suggest_index, to_response, FILM, SERIES, BOOK
+from app.utils.http_cache import conditional_json_response
+
+router = APIRouter(prefix="/suggest", tags=["Suggest"])
+
+SUGGEST_TYPES = {
+    "all": None,
+    "film": (FILM, SERIES),
+    "book": (BOOK,),
+}
+
+
+@router.get("", response_model=List[Suggestion])
+async def suggest(
+        request: Request,
+        q: str = Query(..., min_length=1, max_length=100, example="Гарри"),
+        limit: int = Query(10, ge=1, le=20),
+        type: str = Query("all", regex="^(all|film|book)$"),
+):
+    """
+    Подсказки по началу названия фильма, сериала или книги. Отвечает из
+    индекса в памяти по уже известным сервису названиям, без запросов к
+    внешним API; полный поиск — /api/kp/search и /books/search/
+    """
+    if not suggest_index.ready:
+        raise HTTPException(status_code=503, detail="Suggest index is not loaded yet")
+    entries = suggest_index.search(q, limit, SUGGEST_TYPES[type])
+    return conditional_json_response(
+        request, [to_response(entry) for entry in entries], max_age=settings.SUGGEST_CACHE_MAX_AGE,
+    )
@@ -1,29 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form, Security, Body
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Security, Body, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import Optional, List
 from fastapi.security import  HTTPAuthorizationCredentials
-from app.database import get_db
+from app.database import get_write_db
 from app.models.user import User
-from app.schemas.user import UserResponse, UserUpdate
-from app.services.auth import get_current_user
+from app.schemas.user import UserResponse, UserUpdate, TaxonomyUpdate, TaxonomyUpdateResponse
+from app.services.auth import get_current_user, get_current_user_for_write, verify_admin_token
 from app.services.user_service import get_user_by_email, get_user_by_id
-from app.core.constants import get_available_genres, get_available_authors
+from app.services.taxonomy import taxonomy, TAXONOMY_GENRE, TAXONOMY_AUTHOR
+from app.services.feed import preference_sources, remove_sources, schedule_feed_update
+from app.core.config import settings
+from app.utils.http_cache import conditional_json_response
 from sqlalchemy.orm.attributes import flag_modified
 
 
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+async def _taxonomy_response(request: Request, kind: str, prefix: Optional[str], limit: Optional[int]):
+    # Узел префиксного дерева хранит не больше TAXONOMY_PREFIX_LIMIT имён
+    if prefix and limit is not None and limit > settings.TAXONOMY_PREFIX_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"limit with prefix must not exceed {settings.TAXONOMY_PREFIX_LIMIT}",
+        )
+    snapshot = await taxonomy.snapshot(kind)
+    # Ответ зависит только от версии справочника и параметров: 304 без сериализации
+    query = hashlib.sha256(f"{prefix or ''}|{limit or 0}".encode()).hexdigest()[:16]
+    etag = f'"{kind}-{taxonomy.version}-{query}"'
+    return conditional_json_response(
+        request, snapshot.search(prefix, limit), max_age=settings.TAXONOMY_CACHE_MAX_AGE, etag=etag,
+    )
+
 @router.get("/genres", response_model=List[str])
-async def get_genres():
-    """Получить список доступных жанров"""
-    return get_available_genres()
+async def get_genres(
+    request: Request,
+    prefix: Optional[str] = Query(None, max_length=100),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """
+    Получить список доступных жанров; prefix — поиск по началу любого слова.
+    С prefix limit не больше TAXONOMY_PREFIX_LIMIT (по умолчанию 50)
+    """
+    return await _taxonomy_response(request, TAXONOMY_GENRE, prefix, limit)
 
 @router.get("/authors", response_model=List[str])
-async def get_authors():
-    """Получить список доступных авторов"""
-    return get_available_authors()
+async def get_authors(
+    request: Request,
+    prefix: Optional[str] = Query(None, max_length=100),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """
+    Получить список доступных авторов; prefix — поиск по началу любого слова.
+    С prefix limit не больше TAXONOMY_PREFIX_LIMIT (по умолчанию 50)
+    """
+    return await _taxonomy_response(request, TAXONOMY_AUTHOR, prefix, limit)
+
+@router.post("/genres", response_model=TaxonomyUpdateResponse, dependencies=[Depends(verify_admin_token)])
+async def update_genres(update: TaxonomyUpdate):
+    """Добавить или удалить жанры (только с X-Admin-Token)"""
+    return {"version": await taxonomy.update(TAXONOMY_GENRE, update.add, update.remove)}
+
+@router.post("/authors", response_model=TaxonomyUpdateResponse, dependencies=[Depends(verify_admin_token)])
+async def update_authors(update: TaxonomyUpdate):
+    """Добавить или удалить авторов (только с X-Admin-Token)"""
+    return {"version": await taxonomy.update(TAXONOMY_AUTHOR, update.add, update.remove)}
 
 
 @router.get("/me", response_model=UserResponse)
@@ -36,8 +79,8 @@ async def read_current_user(
 @router.patch("/me", response_model=UserResponse)
 async def update_current_user(
     update_data: UserUpdate = Body(None),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_write_db),
+    current_user: User = Depends(get_current_user_for_write)
 ):
     """Обновить данные текущего пользователя"""
     print(f"Received update data: {update_data.dict()}")
@@ -78,28 +121,26 @@ async def update_current_user(
         "favorite_authors": []
     }
     print(f"Initial preferences: {preferences}")
-
-    available_genres = get_available_genres()
-    available_authors = get_available_authors()
+    old_sources = preference_sources(preferences)
 
 
     has_preference_changes = False
     if update_data.favorite_genres is not None:
-        invalid_genres = [genre for genre in update_data.favorite_genres if genre not in available_genres]
+        invalid_genres = await taxonomy.invalid(TAXONOMY_GENRE, update_data.favorite_genres)
         if invalid_genres:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid genres: {invalid_genres}. Available genres: {available_genres}"
+                detail=f"Invalid genres: {invalid_genres}. See GET /users/genres"
             )
         preferences["favorite_genres"] = update_data.favorite_genres
         has_preference_changes = True
 
     if update_data.favorite_authors is not None:
-        invalid_authors = [author for author in update_data.favorite_authors if author not in available_authors]
+        invalid_authors = await taxonomy.invalid(TAXONOMY_AUTHOR, update_data.favorite_authors)
         if invalid_authors:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid authors: {invalid_authors}. Available authors: {available_authors}"
+                detail=f"Invalid authors: {invalid_authors}. See GET /users/authors"
             )
         preferences["favorite_authors"] = update_data.favorite_authors
         has_preference_changes = True
@@ -109,16 +150,20 @@ async def update_current_user(
         has_preference_changes = True
 
 
+    new_sources = old_sources
     if has_preference_changes:
         current_user.preferences = dict(preferences)
         flag_modified(current_user, "preferences")
         print(f"Updated preferences: {current_user.preferences}")
+        new_sources = preference_sources(preferences)
+        await remove_sources(db, current_user.id, old_sources - new_sources)
 
     for key, value in update_dict.items():
         setattr(current_user, key, value)
 
     await db.commit()
     await db.refresh(current_user)
+    await schedule_feed_update(current_user.id, new_sources - old_sources)
 
     print(f"Final user data: {current_user.__dict__}")
     return current_user
\ No newline at end of file
@@ -1,12 +1,20 @@
-from pydantic import BaseModel, HttpUrl
+import re
+from pydantic import BaseModel, HttpUrl, Field
 from typing import List, Optional
 
+from app.core.config import settings
+
+WORK_ID_PATTERN = r"^OL\d+W$"
+WORK_ID_RE = re.compile(WORK_ID_PATTERN)
+
 class BookSearchResult(BaseModel):
     title: str
     authors: List[str]
     year: Optional[int] = None
     cover_url: Optional[HttpUrl] = None
     work_id: str
+    description: Optional[str] = None
+    subjects: List[str] = []
 
 class BookDetails(BaseModel):
     title: str
@@ -14,4 +22,16 @@ class BookDetails(BaseModel):
     publish_year: Optional[int] = None
     description: str
     cover_url: Optional[HttpUrl] = None
-    openlibrary_url: HttpUrl
\ No newline at end of file
+    openlibrary_url: HttpUrl
+
+class SimilarBook(BaseModel):
+    work_id: str
+    title: str
+    authors: List[str]
+    year: Optional[int] = None
+    cover_url: Optional[HttpUrl] = None
+    score: float
+
+class BookBatchRequest(BaseModel):
+    work_ids: List[str] = Field(..., min_length=1, max_length=settings.OL_BATCH_MAX_IDS)
+    translate: bool = False
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class FeedCard(BaseModel):
+    type: str
+    id: str
+    title: str
+    subtitle: Optional[str] = None
+    year: Optional[int] = None
+    image_url: Optional[str] = None
+    reason: str
+    score: float
+
+class FeedPage(BaseModel):
+    status: str
+    built_at: Optional[datetime] = None
+    items: List[FeedCard]
+    next_cursor: Optional[str] = None
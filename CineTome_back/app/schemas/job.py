@@ -0,0 +1,18 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Any, Optional
+from uuid import UUID
+
+class JobStatusResponse(BaseModel):
+    id: UUID
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
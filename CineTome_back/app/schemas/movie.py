@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+from app.core.config import settings
+
+
+class FilmBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.KP_BATCH_MAX_IDS)
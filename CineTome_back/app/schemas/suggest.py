@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class Suggestion(BaseModel):
+    type: str
+    id: str
+    title: str
+    subtitle: Optional[str] = None
+    year: Optional[int] = None
+    image_url: Optional[str] = None
@@ -26,6 +26,13 @@ class UserUpdate(BaseModel):
     favorite_authors: Optional[List[str]] = None
     reading_goals: Optional[str] = None
 
+class TaxonomyUpdate(BaseModel):
+    add: List[str] = Field(default_factory=list)
+    remove: List[str] = Field(default_factory=list)
+
+class TaxonomyUpdateResponse(BaseModel):
+    version: int
+
 class UserPreferences(BaseModel):
     favorite_genres: List[str] = Field(default_factory=list)
     reading_goals: Optional[str] = None
@@ -1,10 +1,13 @@
+import hmac
 from datetime import datetime, timedelta
+from typing import Optional
 import jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Header
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_read_db, get_write_db
 from app.core import settings
+from app.core.config import settings as app_settings
 from app.models.user import User
 from app.services.user_service import pwd_context, get_user_by_email, get_user_by_id
 from app.schemas.token import Token
@@ -21,8 +24,18 @@ def create_access_token(user_id: int) -> str:
 
 async def verify_token(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> User:
+    return await _authenticate(token, db)
+
+async def verify_token_for_write(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_write_db)
+) -> User:
+    """Пользователь загружается в сессию основной БД, чтобы его можно было изменять"""
+    return await _authenticate(token, db)
+
+async def _authenticate(token: str, db: AsyncSession) -> User:
     print(">>> verify_token вызвана")
     print("Проверка токена началась...")
     if not token:
@@ -98,4 +111,16 @@ async def login_user(db: AsyncSession, email: str, password: str) -> Token:
     return token_response
 
 async def get_current_user(user: User = Depends(verify_token)) -> User:
-    return user
\ No newline at end of file
+    return user
+
+async def get_current_user_for_write(user: User = Depends(verify_token_for_write)) -> User:
+    return user
+
+async def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Служебные ручки доступны только с заголовком X-Admin-Token; без ADMIN_TOKEN они выключены"""
+    if not app_settings.ADMIN_TOKEN or not x_admin_token \
+            or not hmac.compare_digest(x_admin_token, app_settings.ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.cache_backends import CacheBackend, get_shared_backend, dumps, loads
+
+
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total",
+    "Обращения к кешу по результату (hit - кеш процесса, shared_hit - общий кеш, miss)",
+    ["cache", "result"],
+)
+
+
+def make_key(*parts: Any) -> str:
+    """Ключ кеша из составных частей"""
+    return ":".join(str(part) for part in parts)
+
+
+class TTLCache:
+    """
+    LRU-кеш процесса с временем жизни записей поверх общего для воркеров
+    backend (CACHE_BACKEND). При общем backend запись живёт в кеше процесса
+    не дольше CACHE_LOCAL_TTL, а в общем кеше — полный ttl.
+    get_or_load объединяет одновременные промахи по одному ключу в один запрос к источнику;
+    интерактивный запрос не присоединяется к фоновой загрузке, а загружает сам.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, default_ttl: float = 300,
+                 backend: Optional[CacheBackend] = None, shared: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.shared = shared
+        self._backend = backend
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Ключ -> (задача загрузки, загрузка фоновая)
+        self._inflight: Dict[str, Tuple[asyncio.Future, bool]] = {}
+
+    @property
+    def backend(self) -> Optional[CacheBackend]:
+        if self._backend is None and self.shared:
+            return get_shared_backend()
+        return self._backend
+
+    def _local_ttl(self, ttl: float) -> float:
+        if self.backend is None:
+            return ttl
+        return min(ttl, settings.CACHE_LOCAL_TTL)
+
+    def _set_local(self, key: str, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._get_local(key)
+        if value is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return value
+
+        backend = self.backend
+        if backend is not None:
+            data = await backend.get(make_key(self.name, key))
+            if data is not None:
+                try:
+                    value = loads(data)
+                except ValueError:
+                    value = None
+                if value is not None:
+                    self._set_local(key, value, self._local_ttl(self.default_ttl))
+                    CACHE_REQUESTS.inc(cache=self.name, result="shared_hit")
+                    return value
+
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        self._set_local(key, value, self._local_ttl(ttl))
+        backend = self.backend
+        if backend is not None:
+            await backend.set(make_key(self.name, key), dumps(value), ttl)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+        backend = self.backend
+        if backend is not None:
+            await backend.delete(make_key(self.name, key))
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          ttl: Optional[float] = None, background: bool = False) -> Any:
+        """
+        background — загрузка с низким приоритетом (упреждающая, фоновая).
+        Интерактивный вызов не ждёт её в очереди ограничителя, а запускает свою.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and (background or not inflight[1]):
+            return await asyncio.shield(inflight[0])
+
+        # Загрузка идёт в собственной задаче: отмена одного из ожидающих не прерывает её для остальных
+        task = asyncio.ensure_future(self._load(key, loader, ttl))
+        self._inflight[key] = (task, background)
+        task.add_done_callback(lambda done: self._load_finished(key, done))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        value = await loader()
+        if value is not None:
+            await self.set(key, value, ttl)
+        return value
+
+    def _load_finished(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key, (None,))[0] is task:
+            del self._inflight[key]
+        # Если все ожидающие ушли, исключение не должно остаться «не полученным»
+        if not task.cancelled():
+            task.exception()
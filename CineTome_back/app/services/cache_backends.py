@@ -0,0 +1,267 @@
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+import orjson
+from sqlalchemy import case, delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import engine as primary_engine
+from app.models.cache_entry import CacheEntry, RateCounter
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # redis не установлен — доступны только memory и postgres
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_BACKEND_ERRORS = registry.counter(
+    "cache_backend_errors_total",
+    "Ошибки общего кеша (запрос считается промахом)",
+    ["backend", "operation"],
+)
+CACHE_BACKEND_SECONDS = registry.histogram(
+    "cache_backend_seconds",
+    "Время операции с общим кешем",
+    ["backend", "operation"],
+)
+
+# Первый байт записи: формат полезной нагрузки
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+def dumps(value: Any) -> bytes:
+    """orjson, для крупных записей дополнительно zlib"""
+    data = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    if len(data) >= settings.CACHE_COMPRESS_MIN_SIZE:
+        return _ZLIB + zlib.compress(data, 1)
+    return _RAW + data
+
+
+def loads(data: bytes) -> Any:
+    header, payload = data[:1], data[1:]
+    if header == _ZLIB:
+        try:
+            payload = zlib.decompress(payload)
+        except zlib.error as e:
+            raise ValueError(f"Corrupted cache payload: {str(e)}")
+    elif header != _RAW:
+        raise ValueError(f"Unknown cache payload format: {header!r}")
+    return orjson.loads(payload)
+
+
+class CacheBackend:
+    """Хранилище сериализованных записей, общее для воркеров"""
+    name = "base"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int, ttl: float) -> Optional[int]:
+        """Атомарно увеличить счётчик и вернуть новое значение; счётчик живёт ttl секунд с создания"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Байтовое хранилище в памяти процесса (для бенчмарка и тестов; между воркерами не делится)"""
+    name = "memory"
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> Optional[int]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            entry = (time.monotonic() + ttl, b"0")
+        value = int(entry[1]) + amount
+        self._data[key] = (entry[0], str(value).encode())
+        return value
+
+
+class PostgresBackend(CacheBackend):
+    """
+    UNLOGGED-таблица cache_entries через основной engine. Просроченные записи
+    не отдаются и удаляются не чаще раза в CACHE_PG_PURGE_INTERVAL секунд.
+    """
+    name = "postgres"
+
+    def __init__(self, engine=primary_engine):
+        self.engine = engine
+        self._last_purge = time.monotonic()
+        self._last_counter_purge = time.monotonic()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(CacheEntry.value)
+                .where(CacheEntry.key == key, CacheEntry.expires_at > datetime.now(timezone.utc))
+            )
+            return result.scalar_one_or_none()
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        now = datetime.now(timezone.utc)
+        statement = insert(CacheEntry).values(key=key, value=value, expires_at=now + timedelta(seconds=ttl))
+        async with self.engine.begin() as conn:
+            await conn.execute(statement.on_conflict_do_update(
+                index_elements=["key"],
+                set_={"value": statement.excluded.value, "expires_at": statement.excluded.expires_at},
+            ))
+            if time.monotonic() - self._last_purge >= settings.CACHE_PG_PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                await conn.execute(delete(CacheEntry).where(CacheEntry.expires_at <= now))
+
+    async def delete(self, key: str):
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(CacheEntry).where(CacheEntry.key == key))
+
+    async def incr(self, key: str, amount: int, ttl: float) -> Optional[int]:
+        now = datetime.now(timezone.utc)
+        statement = insert(RateCounter).values(key=key, value=amount, expires_at=now + timedelta(seconds=ttl))
+        # Просроченный счётчик начинается заново, а не продолжает старое окно
+        expired = RateCounter.expires_at <= now
+        statement = statement.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                "value": case((expired, statement.excluded.value), else_=RateCounter.value + statement.excluded.value),
+                "expires_at": case((expired, statement.excluded.expires_at), else_=RateCounter.expires_at),
+            },
+        ).returning(RateCounter.value)
+        async with self.engine.begin() as conn:
+            value = (await conn.execute(statement)).scalar_one()
+            if time.monotonic() - self._last_counter_purge >= settings.CACHE_PG_PURGE_INTERVAL:
+                self._last_counter_purge = time.monotonic()
+                await conn.execute(delete(RateCounter).where(RateCounter.expires_at <= now))
+        return value
+
+
+class RedisBackend(CacheBackend):
+    """Redis (или совместимый сервер: Valkey, KeyDB, Dragonfly), TTL через PX"""
+    name = "redis"
+
+    def __init__(self, url: str = settings.CACHE_REDIS_URL):
+        if aioredis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        self.client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(settings.CACHE_KEY_PREFIX + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(settings.CACHE_KEY_PREFIX + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self.client.delete(settings.CACHE_KEY_PREFIX + key)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> Optional[int]:
+        key = settings.CACHE_KEY_PREFIX + key
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incrby(key, amount)
+            # Срок ставится только новому счётчику, чтобы окно не продлевалось (NX — Redis 7+)
+            pipe.pexpire(key, max(1, int(ttl * 1000)), nx=True)
+            value, _ = await pipe.execute()
+        return int(value)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class InstrumentedBackend(CacheBackend):
+    """Метрики и перехват ошибок: недоступный общий кеш не должен ломать запросы"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.name = backend.name
+
+    async def _call(self, operation: str, *args):
+        started = time.perf_counter()
+        try:
+            return await getattr(self.backend, operation)(*args)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.inc(backend=self.name, operation=operation)
+            logger.warning(f"Cache backend {self.name} {operation} failed: {str(e)}")
+            return None
+        finally:
+            CACHE_BACKEND_SECONDS.observe(time.perf_counter() - started, backend=self.name, operation=operation)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._call("set", key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._call("delete", key)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> Optional[int]:
+        """None — backend недоступен, вызывающий код решает сам"""
+        return await self._call("incr", key, amount, ttl)
+
+    async def close(self):
+        await self.backend.close()
+
+
+_BACKENDS = {
+    "postgres": PostgresBackend,
+    "redis": RedisBackend,
+}
+_shared_backend: Optional[CacheBackend] = None
+_configured = False
+
+
+def create_backend(name: str) -> Optional[CacheBackend]:
+    """Backend по имени; для memory общий кеш не нужен — хватает кеша процесса"""
+    if name == "memory":
+        return None
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown CACHE_BACKEND: {name}")
+    return InstrumentedBackend(_BACKENDS[name]())
+
+
+def get_shared_backend() -> Optional[CacheBackend]:
+    """Общий backend из настроек, создаётся при первом обращении"""
+    global _shared_backend, _configured
+    if not _configured:
+        _shared_backend = create_backend(settings.CACHE_BACKEND)
+        _configured = True
+    return _shared_backend
+
+
+async def close_shared_backend():
+    global _shared_backend, _configured
+    if _shared_backend is not None:
+        await _shared_backend.close()
+    _shared_backend = None
+    _configured = False
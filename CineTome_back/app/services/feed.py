@@ -0,0 +1,346 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select, true, tuple_
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import async_session
+from app.models.content import Movie, Series
+from app.models.feed import FeedItem, UserFeed
+from app.models.user import User
+from app.services.jobs import enqueue
+from app.services.kinopoisk_client import KinopoiskAPI, TopFilmType
+from app.services.open_library import search_books, get_similar_books, get_books_by_subjects
+from app.services.rate_limiter import Priority
+
+logger = logging.getLogger(__name__)
+
+
+FEED_BUILDS = registry.counter(
+    "feed_builds_total",
+    "Пересчёты персональной ленты: целиком или по отдельным сигналам",
+    ["mode"],
+)
+FEED_SOURCE_ERRORS = registry.counter(
+    "feed_source_errors_total",
+    "Сигналы, для которых не удалось получить карточки",
+    ["source"],
+)
+
+kp_api = KinopoiskAPI()
+
+MOVIE = "movie"
+BOOK = "book"
+
+# Вес сигнала: карточки из более сильного сигнала стоят в ленте выше
+SOURCE_WEIGHTS = {
+    "liked": 3.0,
+    "author": 2.5,
+    "genre": 2.0,
+    "collection": 1.0,
+}
+# Жанры справочника -> темы OpenLibrary и жанры Кинопоиска
+GENRE_SUBJECTS = {
+    "Фантастика": ["science fiction"],
+    "Фэнтези": ["fantasy"],
+    "Детектив": ["detective and mystery stories", "mystery"],
+    "Роман": ["fiction", "novel"],
+    "Триллер": ["thriller", "suspense"],
+    "Ужасы": ["horror"],
+    "Научная литература": ["science", "popular science"],
+    "Биография": ["biography"],
+    "Исторический": ["history", "historical fiction"],
+    "Поэзия": ["poetry"],
+    "Драма": ["drama"],
+    "Комедия": ["humor", "comedy"],
+    "Приключения": ["adventure", "adventure stories"],
+}
+GENRE_FILMS = {
+    "Роман": "мелодрама",
+    "Исторический": "история",
+    "Научная литература": "документальный",
+}
+
+Card = Dict
+Scored = Tuple[float, str, Card]
+
+
+def item_key(item_type: str, item_id) -> str:
+    return f"{item_type}:{item_id}"
+
+
+def preference_sources(preferences: Optional[Dict]) -> Set[str]:
+    preferences = preferences or {}
+    return {f"genre:{genre}" for genre in preferences.get("favorite_genres") or []} \
+        | {f"author:{author}" for author in preferences.get("favorite_authors") or []}
+
+
+def liked_source(item_type: str, item_id: str) -> str:
+    return f"liked:{item_type}:{item_id}"
+
+
+def user_sources(user: User) -> List[str]:
+    """Все сигналы пользователя: настройки, последние высокие оценки, подборки"""
+    liked: Dict[str, None] = {}
+    for rating in reversed(user.ratings_history or []):
+        if rating.get("rating", 0) >= 4:
+            liked[liked_source(rating["item_type"], rating["item_id"])] = None
+    collections = [f"collection:{name.strip()}" for name in settings.FEED_COLLECTIONS.split(",") if name.strip()]
+    return sorted(preference_sources(user.preferences)) \
+        + list(liked)[:settings.FEED_LIKED_SIGNALS] + collections
+
+
+def rated_keys(user: User) -> Set[str]:
+    """Оценённое пользователем в ленту не попадает"""
+    return {item_key(rating["item_type"], rating["item_id"]) for rating in user.ratings_history or []}
+
+
+def _film_card(film: Dict) -> Card:
+    return {
+        "type": MOVIE,
+        "id": str(film["kp_id"]),
+        "title": film.get("title_ru") or film.get("title_en") or film.get("title_original") or "",
+        "subtitle": film.get("title_en") or film.get("title_original"),
+        "year": film.get("year") or film.get("start_year"),
+        "image_url": film.get("poster_url_preview") or film.get("poster_url"),
+    }
+
+
+def _local_film_card(row) -> Card:
+    return {
+        "type": MOVIE,
+        "id": str(row.kp_id),
+        "title": row.title or row.title_en or "",
+        "subtitle": row.title_en,
+        "year": row.year,
+        "image_url": row.poster,
+    }
+
+
+def _book_card(book: Dict) -> Card:
+    return {
+        "type": BOOK,
+        "id": book["work_id"],
+        "title": book.get("title") or "",
+        "subtitle": ", ".join(book.get("authors") or []) or None,
+        "year": book.get("year"),
+        "image_url": book.get("cover_url"),
+    }
+
+
+async def _genre_films(genre: str, limit: int) -> List[Card]:
+    """Фильмы жанра из уже известных сервису (таблицы movies и series), по рейтингу"""
+    film_genre = GENRE_FILMS.get(genre, genre.lower())
+    cards: List[Card] = []
+    async with async_session() as db:
+        for model in (Movie, Series):
+            rows = (await db.execute(
+                select(model.kp_id, model.title, model.title_en, model.year, model.poster, model.kp_rating)
+                .where(model.genres.cast(JSONB).contains([film_genre]))
+                .order_by(model.kp_rating.desc().nulls_last())
+                .limit(limit)
+            )).all()
+            cards.extend((row.kp_rating or 0, _local_film_card(row)) for row in rows)
+    return [card for _, card in sorted(cards, key=lambda item: -item[0])[:limit]]
+
+
+async def _source_cards(source: str) -> List[Card]:
+    limit = settings.FEED_SOURCE_ITEMS
+    kind, _, value = source.partition(":")
+    if kind == "genre":
+        books, films = await asyncio.gather(
+            get_books_by_subjects(GENRE_SUBJECTS.get(value, [value.lower()]), limit),
+            _genre_films(value, limit),
+        )
+        # Книги и фильмы жанра вперемешку
+        mixed = [card for pair in zip(map(_book_card, books), films) for card in pair]
+        return mixed + [_book_card(b) for b in books[len(films):]] + films[len(books):]
+    if kind == "author":
+        books = await search_books(value, limit=limit, search_type="author", translate=False)
+        return [_book_card(book) for book in books if book.get("work_id")]
+    if kind == "liked":
+        item_type, _, item_id = value.partition(":")
+        if item_type == BOOK:
+            return [_book_card(book) for book in await get_similar_books(item_id, limit)]
+        if item_id.isdigit():
+            films = await kp_api.get_film_sequels_and_prequels(int(item_id), Priority.BACKGROUND)
+            return [_film_card(film) for film in films if film.get("kp_id")][:limit]
+        return []
+    if kind == "collection":
+        # Лента строится в фоне и не должна отнимать у интерактивных запросов квоту Кинопоиска
+        collection = await kp_api.get_collection_range(TopFilmType(value), 0, limit, Priority.BACKGROUND)
+        return [_film_card(film) for film in collection["items"] if film.get("kp_id")]
+    raise ValueError(f"Unknown feed source: {source}")
+
+
+async def _collect(sources: Iterable[str], exclude: Set[str]) -> Dict[str, Scored]:
+    """
+    Карточки по сигналам: лучшая оценка для каждого элемента. Оценка — вес
+    сигнала, убывающий к концу его списка, поэтому сигналы перемешиваются.
+    Сигнал, для которого внешний API не ответил, пропускается.
+    """
+    sources = list(sources)
+    results = await asyncio.gather(*(_source_cards(source) for source in sources), return_exceptions=True)
+    items: Dict[str, Scored] = {}
+    for source, cards in zip(sources, results):
+        if isinstance(cards, BaseException):
+            FEED_SOURCE_ERRORS.inc(source=source.split(":", 1)[0])
+            detail = cards.detail if isinstance(cards, HTTPException) else str(cards)
+            logger.warning(f"Feed source {source} failed: {detail}")
+            continue
+        weight = SOURCE_WEIGHTS[source.split(":", 1)[0]]
+        for position, card in enumerate(cards):
+            key = item_key(card["type"], card["id"])
+            score = round(weight * (1 - position / (2 * max(len(cards), 1))), 6)
+            if key not in exclude and (key not in items or score > items[key][0]):
+                items[key] = (score, source, card)
+    return items
+
+
+def _rows(user_id: int, items: Dict[str, Scored]) -> List[Dict]:
+    best = sorted(items.items(), key=lambda item: (-item[1][0], item[0]))[:settings.FEED_SIZE]
+    return [{"user_id": user_id, "item_key": key, "score": score, "source": source[:255], "card": card}
+            for key, (score, source, card) in best]
+
+
+async def build_feed(user_id: int) -> int:
+    """Пересчитать ленту целиком; возвращает число карточек"""
+    async with async_session() as db:
+        user = await db.get(User, user_id)
+        if user is None:
+            return 0
+        sources, exclude = user_sources(user), rated_keys(user)
+
+    rows = _rows(user_id, await _collect(sources, exclude))
+    async with async_session() as db:
+        await db.execute(delete(FeedItem).where(FeedItem.user_id == user_id))
+        if rows:
+            await db.execute(insert(FeedItem).values(rows))
+        statement = insert(UserFeed).values(user_id=user_id, built_at=func.now())
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id"], set_={"built_at": statement.excluded.built_at}
+        ))
+        await db.commit()
+    FEED_BUILDS.inc(mode="full")
+    return len(rows)
+
+
+async def update_feed(user_id: int, sources: List[str]) -> int:
+    """Добавить в ленту карточки новых сигналов; без построенной ленты она строится целиком"""
+    async with async_session() as db:
+        user = await db.get(User, user_id)
+        if user is None:
+            return 0
+        if await db.get(UserFeed, user_id) is None:
+            await db.rollback()
+            return await build_feed(user_id)
+        exclude = rated_keys(user)
+
+    rows = _rows(user_id, await _collect(sources, exclude))
+    if not rows:
+        return 0
+    async with async_session() as db:
+        statement = insert(FeedItem).values(rows)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "item_key"],
+            set_={"score": statement.excluded.score, "source": statement.excluded.source,
+                  "card": statement.excluded.card},
+            where=statement.excluded.score > FeedItem.score,
+        ))
+        # Лента не растёт больше FEED_SIZE: вытесняются карточки с наименьшей оценкой
+        overflow = (
+            select(FeedItem.item_key).where(FeedItem.user_id == user_id)
+            .order_by(FeedItem.score.desc(), FeedItem.item_key.desc())
+            .offset(settings.FEED_SIZE)
+        )
+        await db.execute(delete(FeedItem).where(FeedItem.user_id == user_id, FeedItem.item_key.in_(overflow)))
+        await db.commit()
+    FEED_BUILDS.inc(mode="incremental")
+    return len(rows)
+
+
+async def remove_sources(db: AsyncSession, user_id: int, sources: Iterable[str]):
+    """Убрать карточки снятых сигналов в транзакции вызывающего кода"""
+    sources = list(sources)
+    if sources:
+        await db.execute(delete(FeedItem).where(FeedItem.user_id == user_id, FeedItem.source.in_(sources)))
+
+
+async def remove_item(db: AsyncSession, user_id: int, key: str):
+    await db.execute(delete(FeedItem).where(FeedItem.user_id == user_id, FeedItem.item_key == key))
+
+
+async def schedule_feed_build(user_id: int):
+    try:
+        await enqueue("feed_build", {"user_id": user_id}, dedup_key=f"feed_build:{user_id}")
+    except Exception as e:
+        logger.warning(f"Failed to schedule feed build for user {user_id}: {str(e)}")
+
+
+async def schedule_feed_update(user_id: int, sources: Iterable[str]):
+    sources = sorted(set(sources))
+    if not sources:
+        return
+    digest = hashlib.sha256("\n".join(sources).encode()).hexdigest()[:16]
+    try:
+        await enqueue("feed_update", {"user_id": user_id, "sources": sources},
+                      dedup_key=f"feed_update:{user_id}:{digest}", delay=settings.FEED_UPDATE_DELAY)
+    except Exception as e:
+        logger.warning(f"Failed to schedule feed update for user {user_id}: {str(e)}")
+
+
+def encode_cursor(score: float, key: str) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([score, key])).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        score, key = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), str(key)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_feed_page(db: AsyncSession, user_id: int, cursor: Optional[str], limit: int) -> Dict:
+    """
+    Страница ленты одним запросом: строка состояния и LATERAL-выборка карточек
+    по индексу (user_id, score, item_key) после курсора. Нет строки
+    состояния — лента ещё не построена, её построение ставится в очередь.
+    """
+    items = select(FeedItem.score, FeedItem.item_key, FeedItem.source, FeedItem.card) \
+        .where(FeedItem.user_id == UserFeed.user_id)
+    if cursor:
+        items = items.where(tuple_(FeedItem.score, FeedItem.item_key) < tuple_(*decode_cursor(cursor)))
+    items = items.order_by(FeedItem.score.desc(), FeedItem.item_key.desc()).limit(limit + 1).lateral()
+    rows = (await db.execute(
+        select(UserFeed.built_at, items.c.score, items.c.item_key, items.c.source, items.c.card)
+        .select_from(UserFeed).outerjoin(items, true())
+        .where(UserFeed.user_id == user_id)
+        .order_by(items.c.score.desc(), items.c.item_key.desc())
+    )).all()
+
+    if not rows:
+        await schedule_feed_build(user_id)
+        return {"status": "building", "built_at": None, "items": [], "next_cursor": None}
+
+    built_at = rows[0].built_at
+    if datetime.now(timezone.utc) - built_at > timedelta(seconds=settings.FEED_REBUILD_AFTER):
+        await schedule_feed_build(user_id)
+    page = [row for row in rows if row.item_key is not None]
+    next_cursor = encode_cursor(page[limit - 1].score, page[limit - 1].item_key) if len(page) > limit else None
+    return {
+        "status": "ready",
+        "built_at": built_at,
+        "items": [{**row.card, "reason": row.source, "score": row.score} for row in page[:limit]],
+        "next_cursor": next_cursor,
+    }
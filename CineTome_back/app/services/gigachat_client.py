@@ -2,50 +2,61 @@ import os
 import base64
 from gigachat import GigaChat
 from fastapi import HTTPException
-from typing import Optional
+from typing import Optional, List, Tuple
 import httpx
 import json
 import ssl
+import threading
 from datetime import datetime, timedelta
 import logging
+from app.services.resilience import get_breaker
+from app.services.recording import recorded_call, request_key, transport_mode, REPLAY
 
 logger = logging.getLogger(__name__)
 
+# Токен обновляется заранее, чтобы не истёк посреди запроса
+TOKEN_REFRESH_MARGIN = timedelta(minutes=1)
+
 
 class GigaChatClient:
     def __init__(self):
         self.ssl_context = ssl._create_unverified_context()
         self._access_token = None
         self._token_expires = None
+        self._lock = threading.Lock()
         self.client = None
-        self._initialize_client()
+        # При воспроизведении записей сеть (и авторизация) не используется
+        if transport_mode() != REPLAY:
+            self._initialize_client()
 
     def _initialize_client(self):
         """Инициализация клиента с актуальным токеном"""
-        self.access_token = self._get_access_token()
+        self._access_token, self._token_expires = self._get_access_token()
         self.client = GigaChat(
-            access_token=self.access_token,
+            access_token=self._access_token,
             verify_ssl_certs=False,
             ssl_context=self.ssl_context
         )
 
+    def _ensure_client(self):
+        """Клиент пересоздаётся с новым токеном, только когда прежний истекает"""
+        if transport_mode() == REPLAY or not self._is_token_expired():
+            return
+        with self._lock:
+            if self._is_token_expired():
+                self._initialize_client()
+
     @property
     def access_token(self):
         """Получение токена с проверкой срока действия"""
-        if self._access_token is None or self._is_token_expired():
-            self._access_token = self._get_access_token()
-            self._token_expires = datetime.now() + timedelta(minutes=30)
+        self._ensure_client()
         return self._access_token
 
-    @access_token.setter
-    def access_token(self, value):
-        self._access_token = value
-
     def _is_token_expired(self):
         """Проверка истечения срока действия токена"""
-        return self._token_expires is None or datetime.now() >= self._token_expires
+        return self._token_expires is None or datetime.now() >= self._token_expires - TOKEN_REFRESH_MARGIN
 
-    def _get_access_token(self) -> str:
+    def _get_access_token(self) -> Tuple[str, datetime]:
         """Получение access token с отключенной SSL проверкой"""
         if os.getenv("GIGACHAT_AUTH_KEY") is None:
             raise HTTPException(
@@ -66,6 +77,14 @@ class GigaChatClient:
 
         data = {"scope": scope}
 
+        breaker = get_breaker("gigachat")
+        if not breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail="GigaChat service temporarily unavailable",
+                headers={"Retry-After": str(int(breaker.retry_after()) + 1)}
+            )
+
         try:
             transport = httpx.HTTPTransport(retries=3, verify=False)
             with httpx.Client(transport=transport) as client:
@@ -76,8 +95,17 @@ class GigaChatClient:
                     timeout=30
                 )
                 response.raise_for_status()
-                return response.json()["access_token"]
+                data = response.json()
+            token = data["access_token"]
+            # expires_at — миллисекунды Unix time; без него считаем токен живущим 30 минут
+            if isinstance(data.get("expires_at"), (int, float)):
+                expires = datetime.fromtimestamp(data["expires_at"] / 1000)
+            else:
+                expires = datetime.now() + timedelta(minutes=30)
+            breaker.record_success()
+            return token, expires
         except Exception as e:
+            breaker.record_failure()
             logger.error(f"GigaChat auth failed: {str(e)}")
             raise HTTPException(
                 status_code=502,
@@ -89,11 +117,56 @@ class GigaChatClient:
                                  year: Optional[str] = None) -> str:
         """Генерация краткого содержания для фильма/сериала/книги"""
         prompt = self._build_summary_prompt(title, content_type, author, year)
+        return self._chat(prompt)
+
+    def translate_batch(self, texts: List[str], target_lang: str = "ru") -> Optional[List[str]]:
+        """
+        Перевод пакета строк одним запросом. Строки передаются JSON-массивом,
+        ответ ожидается массивом той же длины; при несовпадении возвращается None.
+        """
+        prompt = (
+            f"Переведи на язык '{target_lang}' каждый элемент JSON-массива ниже. "
+            "Имена собственные транслитерируй, если у них нет устоявшегося перевода. "
+            "Ответь только JSON-массивом строк той же длины и в том же порядке, без пояснений.\n"
+            + json.dumps(texts, ensure_ascii=False)
+        )
+        content = self._chat(prompt)
 
+        start, end = content.find("["), content.rfind("]")
+        if start == -1 or end == -1:
+            logger.warning("GigaChat translation response is not a JSON array")
+            return None
         try:
-            response = self.client.chat(prompt)
-            return response.choices[0].message.content
+            translated = json.loads(content[start:end + 1])
+        except ValueError:
+            logger.warning("GigaChat translation response is not valid JSON")
+            return None
+        if len(translated) != len(texts) or not all(isinstance(t, str) for t in translated):
+            logger.warning(f"GigaChat translated {len(translated)} of {len(texts)} strings")
+            return None
+        return translated
+
+    def _chat(self, prompt: str) -> str:
+        """Запрос к модели через предохранитель"""
+        self._ensure_client()
+        breaker = get_breaker("gigachat")
+        if not breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail="GigaChat service temporarily unavailable",
+                headers={"Retry-After": str(int(breaker.retry_after()) + 1)}
+            )
+
+        try:
+            content = recorded_call(
+                "gigachat",
+                request_key("CHAT", "gigachat", body=prompt.encode("utf-8")),
+                lambda: self.client.chat(prompt).choices[0].message.content
+            )
+            breaker.record_success()
+            return content
         except Exception as e:
+            breaker.record_failure()
             logger.error(f"GigaChat API error: {str(e)}")
             raise HTTPException(
                 status_code=503,
@@ -127,6 +200,18 @@ class GigaChatClient:
         }.get(content_type, "контента")
 
 
+_client: Optional[GigaChatClient] = None
+_client_lock = threading.Lock()
+
+
 def get_gigachat_client() -> GigaChatClient:
-    """Фабрика для получения клиента GigaChat с ленивой инициализацией"""
-    return GigaChatClient()
\ No newline at end of file
+    """
+    Один клиент GigaChat на процесс с ленивой инициализацией: авторизация
+    выполняется при первом вызове и повторяется только по истечении токена
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GigaChatClient()
+    return _client
\ No newline at end of file
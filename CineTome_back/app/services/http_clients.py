@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.recording import build_transport, transport_mode, REPLAY
+
+logger = logging.getLogger(__name__)
+
+
+_upstreams: Dict[str, Dict] = {}
+_clients: Dict[str, httpx.AsyncClient] = {}
+_warm: Dict[str, bool] = {}
+
+
+def register_upstream(name: str, warmup_url: Optional[str] = None, **client_kwargs):
+    """Регистрация внешнего API, для которого держится общий пул соединений"""
+    _upstreams[name] = {"warmup_url": warmup_url, "client_kwargs": client_kwargs}
+    _warm.setdefault(name, False)
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Долгоживущий клиент с keep-alive соединениями для указанного API"""
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        config = _upstreams.get(name, {"client_kwargs": {}})
+        client_kwargs = dict(config["client_kwargs"])
+        client_kwargs.setdefault("timeout", settings.UPSTREAM_TIMEOUT)
+        client_kwargs.setdefault("limits", httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        ))
+        transport = build_transport(name, client_kwargs["limits"])
+        if transport is not None:
+            client_kwargs["transport"] = transport
+        client = httpx.AsyncClient(**client_kwargs)
+        _clients[name] = client
+    return client
+
+
+async def _warm_up(name: str):
+    warmup_url = _upstreams[name].get("warmup_url")
+    if not warmup_url:
+        return
+    if transport_mode() == REPLAY:
+        # Ответы берутся из записи, соединения открывать не нужно
+        _warm[name] = True
+        return
+    try:
+        await get_client(name).head(warmup_url, timeout=settings.UPSTREAM_WARMUP_TIMEOUT)
+        _warm[name] = True
+        logger.info(f"Upstream {name} connection warmed up")
+    except httpx.HTTPError as e:
+        logger.warning(f"Upstream {name} warm-up failed: {str(e)}")
+
+
+async def warm_up_clients():
+    """Открывает соединения (TCP + TLS) ко всем зарегистрированным API"""
+    await asyncio.gather(*(_warm_up(name) for name in _upstreams))
+
+
+async def close_clients():
+    for name, client in list(_clients.items()):
+        await client.aclose()
+        _clients.pop(name, None)
+        _warm[name] = False
+
+
+def upstream_status() -> Dict[str, bool]:
+    """Состояние прогрева соединений для readiness-проверки"""
+    return dict(_warm)
@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode, urljoin, urlparse
+
+import httpx
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.http_clients import register_upstream, get_client
+from app.services.resilience import get_breaker, CircuitOpenError
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не установлен — отдаются только оригиналы
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Редиректы не следуются автоматически: адрес назначения проверяется в _open_stream
+register_upstream("images", follow_redirects=False)
+
+
+IMAGE_REQUESTS = registry.counter(
+    "image_proxy_requests_total",
+    "Запросы к прокси изображений по источнику ответа",
+    ["source"],
+)
+IMAGE_CACHE_BYTES = registry.gauge(
+    "image_cache_bytes",
+    "Объём дискового кеша изображений (по данным этого процесса)",
+)
+IMAGE_CACHE_EVICTIONS = registry.counter(
+    "image_cache_evictions_total",
+    "Файлы, удалённые из дискового кеша изображений",
+)
+IMAGE_RESIZE_SECONDS = registry.histogram(
+    "image_resize_seconds",
+    "Время подготовки уменьшенной копии изображения",
+)
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+}
+_EXTENSIONS = {media_type: ext for ext, media_type in MEDIA_TYPES.items()}
+
+
+def cache_root() -> Path:
+    return Path(settings.UPLOADS_DIR) / "image_cache"
+
+
+def is_allowed(url: str) -> bool:
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and parsed.hostname in settings.IMAGE_PROXY_ALLOWED_HOSTS
+
+
+def proxy_image_url(url: Optional[str], width: Optional[int] = None) -> Optional[str]:
+    """Ссылка на изображение через прокси; без IMAGE_PROXY_PUBLIC_URL возвращается исходная"""
+    if not url or not settings.IMAGE_PROXY_PUBLIC_URL or not is_allowed(url):
+        return url
+    params = {"url": url}
+    if width:
+        params["w"] = width
+    return f"{settings.IMAGE_PROXY_PUBLIC_URL.rstrip('/')}/images?{urlencode(params)}"
+
+
+def snap_width(width: int) -> int:
+    """Ширина округляется вверх до разрешённой, чтобы число вариантов было ограничено"""
+    widths = sorted(settings.IMAGE_PROXY_WIDTHS)
+    for allowed in widths:
+        if allowed >= width:
+            return allowed
+    return widths[-1]
+
+
+class DiskLRU:
+    """
+    Ограниченный по объёму кеш файлов. Порядок вытеснения — по mtime, который
+    обновляется при каждом обращении, поэтому после перезапуска и между
+    воркерами он сохраняется (объём каждый воркер оценивает сам).
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        IMAGE_CACHE_BYTES.set_function(lambda: self._total)
+
+    def _load(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self.root.rglob("*"):
+            if path.is_file() and not path.name.endswith(".tmp"):
+                stat = path.stat()
+                entries.append((stat.st_mtime, str(path), stat.st_size))
+        for _, path, size in sorted(entries):
+            self._index[path] = size
+            self._total += size
+        self._loaded = True
+
+    async def ensure_loaded(self):
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+    def touch(self, path: Path):
+        key = str(path)
+        if key in self._index:
+            self._index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    async def add(self, path: Path):
+        key = str(path)
+        size = path.stat().st_size
+        self._total += size - self._index.get(key, 0)
+        self._index[key] = size
+        self._index.move_to_end(key)
+        if self._total > self.max_bytes:
+            await asyncio.to_thread(self._evict)
+
+    def _evict(self):
+        # Освобождаем с запасом, чтобы не вытеснять на каждой записи
+        target = int(self.max_bytes * 0.9)
+        while self._total > target and self._index:
+            path, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.unlink(path)
+                IMAGE_CACHE_EVICTIONS.inc()
+            except FileNotFoundError:
+                pass
+
+
+def _resize_image(source: str, target: str, width: int, quality: int):
+    """Выполняется в пуле процессов: уменьшение по ширине с сохранением пропорций"""
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with Image.open(source) as image:
+        image_format = image.format
+        if image.width <= width:
+            # Увеличивать не нужно — вариант совпадает с оригиналом
+            shutil.copyfile(source, tmp)
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            options = {}
+            if image_format == "JPEG":
+                if resized.mode not in ("RGB", "L"):
+                    resized = resized.convert("RGB")
+                options = {"quality": quality, "optimize": True, "progressive": True}
+            elif image_format == "WEBP":
+                options = {"quality": quality}
+            resized.save(tmp, format=image_format, **options)
+    os.replace(tmp, target)
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_inflight: Dict[str, asyncio.Future] = {}
+disk_cache = DiskLRU(cache_root(), settings.IMAGE_CACHE_MAX_BYTES)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_RESIZE_WORKERS)
+    return _executor
+
+
+def close_image_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _find_cached(stem: Path) -> Optional[Path]:
+    for ext in MEDIA_TYPES:
+        path = stem.with_suffix(ext)
+        if path.exists():
+            return path
+    return None
+
+
+async def _single_flight(key: str, produce):
+    """Одновременные запросы одного файла ждут одну загрузку/обработку"""
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+    future = asyncio.ensure_future(produce())
+    _inflight[key] = future
+    try:
+        return await asyncio.shield(future)
+    finally:
+        if future.done():
+            _inflight.pop(key, None)
+        else:
+            future.add_done_callback(lambda _: _inflight.pop(key, None))
+
+
+async def _open_stream(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    """Потоковый GET; каждый редирект допускается, только если его хост разрешён"""
+    for _ in range(settings.IMAGE_PROXY_MAX_REDIRECTS + 1):
+        response = await client.send(client.build_request("GET", url), stream=True)
+        if not response.is_redirect:
+            return response
+        await response.aclose()
+        url = urljoin(url, response.headers["location"])
+        if not is_allowed(url):
+            raise HTTPException(status_code=502, detail="Image redirect to a host that is not allowed")
+    raise HTTPException(status_code=502, detail="Too many image redirects")
+
+
+async def _read_limited(response: httpx.Response) -> bytes:
+    """Тело ответа не больше IMAGE_PROXY_MAX_BYTES: сначала по Content-Length, затем по факту"""
+    limit = settings.IMAGE_PROXY_MAX_BYTES
+    length = response.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise HTTPException(status_code=502, detail="Image is too large")
+    content = bytearray()
+    async for chunk in response.aiter_bytes():
+        content.extend(chunk)
+        if len(content) > limit:
+            raise HTTPException(status_code=502, detail="Image is too large")
+    return bytes(content)
+
+
+async def _download(url: str, stem: Path) -> Path:
+    breaker = get_breaker("images")
+    try:
+        breaker.check()
+        response = await _open_stream(get_client("images"), url)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail="Image host temporarily unavailable",
+                            headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except httpx.HTTPError as e:
+        breaker.record_failure()
+        raise HTTPException(status_code=502, detail=f"Image download failed: {str(e)}")
+
+    try:
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if response.status_code != 200:
+            raise HTTPException(status_code=404 if response.status_code == 404 else 502,
+                                detail=f"Image host responded {response.status_code}")
+        media_type = response.headers.get("content-type", "").split(";")[0].strip()
+        ext = _EXTENSIONS.get(media_type)
+        if ext is None:
+            raise HTTPException(status_code=502, detail=f"Unsupported image type: {media_type or 'unknown'}")
+        content = await _read_limited(response)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Image download failed: {str(e)}")
+    finally:
+        await response.aclose()
+
+    path = stem.with_suffix(ext)
+
+    def write():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    await asyncio.to_thread(write)
+    await disk_cache.add(path)
+    return path
+
+
+async def _get_original(url: str, stem: Path) -> Path:
+    path = await asyncio.to_thread(_find_cached, stem)
+    if path is not None:
+        disk_cache.touch(path)
+        return path
+    IMAGE_REQUESTS.inc(source="upstream")
+    return await _single_flight(str(stem), lambda: _download(url, stem))
+
+
+async def _make_variant(original: Path, target: Path, width: int) -> Path:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        await loop.run_in_executor(
+            _get_executor(), _resize_image, str(original), str(target), width, settings.IMAGE_JPEG_QUALITY
+        )
+    except Exception as e:
+        logger.warning(f"Image resize failed for {original.name}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Image could not be processed")
+    IMAGE_RESIZE_SECONDS.observe(loop.time() - started)
+    await disk_cache.add(target)
+    return target
+
+
+async def get_image(url: str, width: Optional[int] = None) -> Tuple[Path, str]:
+    """Путь к файлу в дисковом кеше (оригинал или вариант нужной ширины) и его MIME-тип"""
+    if not is_allowed(url):
+        raise HTTPException(status_code=400, detail="Image host is not allowed")
+    await disk_cache.ensure_loaded()
+
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    stem = cache_root() / digest[:2] / digest
+    if width is None or Image is None:
+        path = await _get_original(url, stem)
+        IMAGE_REQUESTS.inc(source="original")
+        return path, MEDIA_TYPES[path.suffix]
+
+    width = snap_width(width)
+    variant_stem = stem.with_name(f"{digest}_w{width}")
+    variant = await asyncio.to_thread(_find_cached, variant_stem)
+    if variant is not None:
+        disk_cache.touch(variant)
+        IMAGE_REQUESTS.inc(source="variant_cache")
+        return variant, MEDIA_TYPES[variant.suffix]
+
+    original = await _get_original(url, stem)
+    target = variant_stem.with_suffix(original.suffix)
+    variant = await _single_flight(str(target), lambda: _make_variant(original, target, width))
+    IMAGE_REQUESTS.inc(source="variant_resized")
+    return variant, MEDIA_TYPES[variant.suffix]
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Dict
+
+from fastapi import HTTPException
+
+from app.services.feed import build_feed, update_feed
+from app.services.gigachat_client import get_gigachat_client
+from app.services.jobs import job_handler, JobError
+from app.services.similar_books import IndexBuilder
+
+
+@job_handler("content_summary")
+async def content_summary(payload: Dict) -> Dict:
+    """AI-описание контента; синхронный клиент GigaChat выполняется в отдельном потоке"""
+    def generate():
+        return get_gigachat_client().generate_content_summary(
+            title=payload["title"],
+            content_type=payload["content_type"],
+            author=payload.get("author"),
+            year=payload.get("year"),
+        )
+
+    try:
+        summary = await asyncio.to_thread(generate)
+    except HTTPException as e:
+        # Не настроены ключи GigaChat — повторы не помогут
+        if e.status_code == 500:
+            raise JobError(e.detail)
+        raise
+    return {"summary": summary}
+
+
+@job_handler("similar_index_build")
+async def similar_index_build(payload: Dict) -> Dict:
+    """Дособрать индекс похожих книг новыми книгами из таблицы books"""
+    manifest = await IndexBuilder().build(full=payload.get("full", False))
+    return {"version": manifest["version"], "doc_count": manifest["doc_count"]}
+
+
+@job_handler("feed_build")
+async def feed_build(payload: Dict) -> Dict:
+    """Пересчитать персональную ленту пользователя целиком"""
+    return {"items": await build_feed(payload["user_id"])}
+
+
+@job_handler("feed_update")
+async def feed_update(payload: Dict) -> Dict:
+    """Добавить в ленту карточки новых сигналов пользователя"""
+    return {"items": await update_feed(payload["user_id"], payload["sources"])}
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import async_session
+from app.models.job import (
+    Job, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, ACTIVE_JOB_STATUSES,
+)
+from app.services.resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+JOBS_ENQUEUED = registry.counter(
+    "jobs_enqueued_total",
+    "Поставленные в очередь фоновые задачи",
+    ["kind"],
+)
+JOBS_DEDUPLICATED = registry.counter(
+    "jobs_deduplicated_total",
+    "Задачи, не поставленные повторно из-за активной задачи с тем же ключом",
+    ["kind"],
+)
+JOBS_FINISHED = registry.counter(
+    "jobs_finished_total",
+    "Выполненные попытки фоновых задач по результату",
+    ["kind", "outcome"],
+)
+JOB_DURATION = registry.histogram(
+    "job_duration_seconds",
+    "Время выполнения фоновой задачи",
+    ["kind"],
+)
+JOBS_RUNNING = registry.gauge(
+    "jobs_running",
+    "Задачи, выполняющиеся в этом процессе",
+)
+
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+
+_handlers: Dict[str, JobHandler] = {}
+# Будит воркер этого процесса сразу после постановки задачи, не дожидаясь опроса
+_wakeup: Optional[asyncio.Event] = None
+
+
+class JobError(Exception):
+    """Ошибка, после которой повторять задачу бессмысленно"""
+
+
+def job_handler(kind: str):
+    """Регистрация обработчика задач типа kind; результат должен сериализоваться в JSON"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _get_wakeup() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+async def enqueue(kind: str, payload: Dict, dedup_key: Optional[str] = None,
+                  max_attempts: int = settings.JOB_MAX_ATTEMPTS, delay: float = 0.0,
+                  user_id: Optional[int] = None) -> Job:
+    """
+    Поставить задачу в очередь. Если активная (queued/running) задача с тем же
+    dedup_key уже есть, возвращается она. user_id — владелец задачи, которому
+    доступен её статус; ключ дедупликации таких задач должен включать пользователя.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    async with async_session() as db:
+        # Между конфликтом вставки и поиском существующей задачи она может завершиться
+        for _ in range(3):
+            statement = insert(Job).values(
+                id=uuid4(),
+                kind=kind,
+                payload=payload,
+                status=JOB_QUEUED,
+                dedup_key=dedup_key,
+                user_id=user_id,
+                attempts=0,
+                max_attempts=max_attempts,
+                run_at=_now() + timedelta(seconds=delay),
+            )
+            if dedup_key is not None:
+                # Предикат пишется литералом: с параметрами Postgres не сопоставит его с частичным индексом
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=["dedup_key"],
+                    index_where=text("status IN ('queued', 'running')"),
+                )
+            job = (await db.execute(statement.returning(Job))).scalar_one_or_none()
+            if job is not None:
+                await db.commit()
+                JOBS_ENQUEUED.inc(kind=kind)
+                _get_wakeup().set()
+                return job
+
+            job = (await db.execute(
+                select(Job).where(Job.dedup_key == dedup_key, Job.status.in_(ACTIVE_JOB_STATUSES))
+            )).scalar_one_or_none()
+            if job is not None:
+                await db.commit()
+                JOBS_DEDUPLICATED.inc(kind=kind)
+                return job
+        raise RuntimeError(f"Could not enqueue job {kind} with dedup key {dedup_key}")
+
+
+async def get_job(job_id: UUID) -> Optional[Job]:
+    async with async_session() as db:
+        return await db.get(Job, job_id)
+
+
+async def claim_jobs(limit: int, worker_id: str) -> List[Job]:
+    """Забрать до limit готовых задач; SKIP LOCKED не даёт двум воркерам взять одну задачу"""
+    if limit <= 0 or not _handlers:
+        return []
+    async with async_session() as db:
+        ready = (
+            select(Job.id)
+            .where(Job.status == JOB_QUEUED, Job.run_at <= _now(), Job.kind.in_(list(_handlers)))
+            .order_by(Job.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(Job)
+            .where(Job.id.in_(ready))
+            .values(status=JOB_RUNNING, locked_at=_now(), locked_by=worker_id, attempts=Job.attempts + 1)
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )
+        jobs = list(result.scalars().all())
+        await db.commit()
+        return jobs
+
+
+async def _complete(job: Job, result: Any):
+    async with async_session() as db:
+        await db.execute(
+            update(Job)
+            .where(Job.id == job.id)
+            .values(status=JOB_SUCCEEDED, result=result, error=None, locked_at=None, finished_at=_now())
+        )
+        await db.commit()
+
+
+async def _fail(job: Job, error: str, retryable: bool = True):
+    """Ошибка попытки: повтор с экспоненциальной задержкой, пока не исчерпаны попытки"""
+    if retryable and job.attempts < job.max_attempts:
+        delay = backoff_delay(job.attempts, settings.JOB_RETRY_BASE_DELAY, settings.JOB_RETRY_MAX_DELAY)
+        values = {"status": JOB_QUEUED, "run_at": _now() + timedelta(seconds=delay)}
+    else:
+        values = {"status": JOB_FAILED, "finished_at": _now()}
+    async with async_session() as db:
+        await db.execute(
+            update(Job).where(Job.id == job.id).values(error=error, locked_at=None, **values)
+        )
+        await db.commit()
+
+
+async def _maintain():
+    """Возврат брошенных задач в очередь и удаление старых завершённых"""
+    now = _now()
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    async with async_session() as db:
+        abandoned = (Job.status == JOB_RUNNING) & (Job.locked_at < stale)
+        requeued = await db.execute(
+            update(Job)
+            .where(abandoned, Job.attempts < Job.max_attempts)
+            .values(status=JOB_QUEUED, locked_at=None, run_at=now, error="Worker lock expired")
+        )
+        await db.execute(
+            update(Job)
+            .where(abandoned, Job.attempts >= Job.max_attempts)
+            .values(status=JOB_FAILED, locked_at=None, finished_at=now, error="Worker lock expired")
+        )
+        await db.execute(
+            delete(Job).where(
+                Job.status.in_((JOB_SUCCEEDED, JOB_FAILED)),
+                Job.finished_at < now - timedelta(seconds=settings.JOB_RETENTION_SECONDS),
+            )
+        )
+        await db.commit()
+    if requeued.rowcount:
+        logger.warning(f"Requeued {requeued.rowcount} abandoned jobs")
+
+
+class JobWorker:
+    """
+    Исполнитель задач: не больше concurrency задач одновременно, опрос очереди
+    раз в poll_interval (или сразу после enqueue в этом же процессе).
+    """
+
+    def __init__(self, concurrency: int = settings.JOB_WORKER_CONCURRENCY,
+                 poll_interval: float = settings.JOB_POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_maintenance = 0.0
+        JOBS_RUNNING.set_function(lambda: len(self._tasks))
+
+    def start(self):
+        if self._runner is None:
+            self._stopping = False
+            self._runner = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = settings.JOB_SHUTDOWN_TIMEOUT):
+        """Прекратить забирать задачи и дождаться текущих; недождавшиеся вернутся в очередь по JOB_LOCK_TIMEOUT"""
+        self._stopping = True
+        _get_wakeup().set()
+        if self._runner is not None:
+            await self._runner
+            self._runner = None
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    async def run(self):
+        wakeup = _get_wakeup()
+        while not self._stopping:
+            claimed: List[Job] = []
+            try:
+                if time.monotonic() - self._last_maintenance >= settings.JOB_MAINTENANCE_INTERVAL:
+                    self._last_maintenance = time.monotonic()
+                    await _maintain()
+                claimed = await claim_jobs(self.concurrency - len(self._tasks), self.worker_id)
+            except Exception as e:
+                logger.error(f"Job queue poll failed: {str(e)}")
+
+            for job in claimed:
+                task = asyncio.create_task(self._execute(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._on_done)
+
+            if claimed and len(self._tasks) < self.concurrency:
+                # Очередь, вероятно, не пуста — забираем следующие без паузы
+                continue
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        # Освободился слот: можно забрать следующую задачу
+        _get_wakeup().set()
+
+    async def _execute(self, job: Job):
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(_handlers[job.kind](job.payload), timeout=settings.JOB_TIMEOUT)
+        except JobError as e:
+            JOBS_FINISHED.inc(kind=job.kind, outcome="failed")
+            await self._record(_fail(job, str(e), retryable=False))
+        except Exception as e:
+            outcome = "retry" if job.attempts < job.max_attempts else "failed"
+            JOBS_FINISHED.inc(kind=job.kind, outcome=outcome)
+            logger.warning(f"Job {job.kind} {job.id} attempt {job.attempts} failed: {str(e)}")
+            await self._record(_fail(job, str(e) or type(e).__name__))
+        else:
+            JOBS_FINISHED.inc(kind=job.kind, outcome="succeeded")
+            await self._record(_complete(job, result))
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - started, kind=job.kind)
+
+    @staticmethod
+    async def _record(update_status: Awaitable):
+        try:
+            await update_status
+        except Exception as e:
+            # Задача останется в running и вернётся в очередь после JOB_LOCK_TIMEOUT
+            logger.error(f"Failed to record job result: {str(e)}")
+
+
+job_worker = JobWorker()
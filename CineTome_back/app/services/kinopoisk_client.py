@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import httpx
 from fastapi import HTTPException
 from typing import List, Dict, Optional, Union
 from urllib.parse import urljoin
@@ -6,16 +7,33 @@ import os
 from dotenv import load_dotenv
 from enum import Enum
 import logging
+from app.core.config import settings
+from app.services.cache import TTLCache, make_key
+from app.services.http_clients import register_upstream, get_client
+from app.services.image_proxy import proxy_image_url
+from app.services.prefetch import prefetcher
+from app.services.resilience import resilient_get, CircuitOpenError
+from app.services.rate_limiter import TokenBucketLimiter, Priority, RateLimitExceeded
+from app.services.suggest import record_films
 
 load_dotenv()
 
 
-KINOPOISK_API_BASE = "https://kinopoiskapiunofficial.tech/api/v2.2/"
+KINOPOISK_API_BASE = settings.KINOPOISK_API_BASE
 KINOPOISK_API_KEY = os.getenv("KINOPOISK_API_KEY")
 
 
 logger = logging.getLogger(__name__)
 
+register_upstream(
+    "kinopoisk",
+    warmup_url=urljoin(KINOPOISK_API_BASE, "/"),
+    headers={
+        "X-API-KEY": KINOPOISK_API_KEY or "",
+        "Content-Type": "application/json",
+    },
+)
+
 class TopFilmType(str, Enum):
     TOP_250_BEST_FILMS = "TOP_250_BEST_FILMS"
     TOP_100_POPULAR_FILMS = "TOP_100_POPULAR_FILMS"
@@ -31,24 +49,73 @@ class TopFilmType(str, Enum):
     LOVE_THEME = "LOVE_THEME"
     ZOMBIE_THEME = "ZOMBIE_THEME"
 
+UPSTREAM_PAGE_SIZE = 20
+MAX_COLLECTION_PAGES = 20
+
+TOP_TYPES = (
+    TopFilmType.TOP_250_BEST_FILMS,
+    TopFilmType.TOP_100_POPULAR_FILMS,
+    TopFilmType.TOP_AWAIT_FILMS,
+    TopFilmType.LOVE_THEME,
+)
+
+# Для фиксированных топов число страниц известно заранее, поэтому
+# все страницы можно запросить одновременно, не дожидаясь первой
+KNOWN_COLLECTION_PAGES = {
+    TopFilmType.TOP_250_BEST_FILMS: 13,
+    TopFilmType.TOP_100_POPULAR_FILMS: 5,
+}
+
+THEME_FILTERS = {
+    TopFilmType.FAMILY: {"genres": "19"},
+    TopFilmType.VAMPIRE_THEME: {"keyword": "вампиры"},
+    TopFilmType.ZOMBIE_THEME: {"keyword": "зомби"},
+    TopFilmType.COMICS_THEME: {"keyword": "комиксы"},
+    TopFilmType.OSKAR_WINNERS_2021: {"keyword": "оскар 2021"},
+    TopFilmType.CLOSES_RELEASES: {"order": "YEAR", "yearFrom": 2023},
+    TopFilmType.TOP_POPULAR_ALL: {"order": "RATING"},
+    TopFilmType.TOP_POPULAR_MOVIES: {"order": "RATING", "type": "FILM"}
+}
+
+rate_limiter = TokenBucketLimiter(
+    "kinopoisk",
+    rate=settings.KP_RATE_LIMIT_PER_SECOND,
+    burst=settings.KP_RATE_LIMIT_BURST,
+    daily_quota=settings.KP_DAILY_QUOTA,
+    background_quota_share=settings.KP_BACKGROUND_QUOTA_SHARE,
+    interactive_max_wait=settings.KP_INTERACTIVE_MAX_WAIT,
+    background_max_wait=settings.KP_BACKGROUND_MAX_WAIT,
+    # Ключ API один на все воркеры
+    shared=True,
+)
+
+seasons_cache = TTLCache("kp_seasons", maxsize=2000, default_ttl=settings.KP_SEASONS_CACHE_TTL)
+
+film_cache = TTLCache("kp_films", maxsize=5000, default_ttl=settings.KP_FILM_CACHE_TTL)
+
+collection_cache = TTLCache("kp_collections", maxsize=512, default_ttl=settings.KP_COLLECTION_CACHE_TTL)
+
+search_cache = TTLCache("kp_search", maxsize=2000, default_ttl=settings.KP_SEARCH_CACHE_TTL)
+
 class KinopoiskAPI:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            "X-API-KEY": KINOPOISK_API_KEY,
-            "Content-Type": "application/json",
-        })
-
-    async def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Union[Dict, List]:
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return get_client("kinopoisk")
+
+    async def _make_request(self, endpoint: str, params: Optional[Dict] = None,
+                            priority: Priority = Priority.INTERACTIVE) -> Union[Dict, List]:
         """Базовый метод для выполнения запросов"""
         url = urljoin(KINOPOISK_API_BASE, endpoint)
         logger.info(f"Making request to {url} with params {params}")
         try:
-            response = self.session.get(url, params=params or {})
+            response = await resilient_get(
+                "kinopoisk", self.client, url, params=params or {},
+                limiter=rate_limiter, priority=priority
+            )
             response.raise_for_status()
             logger.info(f"Request to {endpoint} successful")
             return response.json()
-        except requests.exceptions.HTTPError as e:
+        except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error for {endpoint}: {str(e)}")
             status_code = e.response.status_code
             try:
@@ -59,33 +126,171 @@ class KinopoiskAPI:
                 status_code=status_code,
                 detail=f"Kinopoisk API error: {detail}"
             )
-        except requests.exceptions.RequestException as e:
+        except RateLimitExceeded as e:
+            logger.warning(f"Kinopoisk rate limit, rejecting {endpoint}: {e.reason}")
+            raise HTTPException(
+                status_code=503,
+                detail=f"Kinopoisk API quota exceeded: {e.reason}",
+                headers={"Retry-After": str(int(e.retry_after) + 1)}
+            ) from e
+        except CircuitOpenError as e:
+            logger.warning(f"Kinopoisk circuit open, rejecting {endpoint}")
+            raise HTTPException(
+                status_code=503,
+                detail="Kinopoisk API temporarily unavailable",
+                headers={"Retry-After": str(int(e.retry_after) + 1)}
+            )
+        except httpx.TimeoutException as e:
+            logger.error(f"Timeout for {endpoint}: {str(e)}")
+            raise HTTPException(
+                status_code=504,
+                detail=f"Kinopoisk API timeout: {str(e)}"
+            )
+        except httpx.RequestError as e:
             logger.error(f"Request error for {endpoint}: {str(e)}")
             raise HTTPException(
-                status_code=500,
+                status_code=502,
                 detail=f"Kinopoisk API error: {str(e)}"
             )
 
-    async def search_films(self, query: str, page: int = 1) -> List[Dict]:
-        """Поиск фильмов и сериалов"""
-        data = await self._make_request("films", {"keyword": query, "page": page})
-        return [self._process_film_item(item) for item in data.get("items", [])]
+    async def search_films(self, query: str, page: int = 1,
+                           priority: Priority = Priority.INTERACTIVE) -> List[Dict]:
+        """Поиск фильмов и сериалов (с кешированием)"""
+        key = make_key("kp", "search", query, page)
+        if priority == Priority.INTERACTIVE:
+            prefetcher.record_access("kp_search", key)
+        return await search_cache.get_or_load(
+            key, lambda: self._fetch_search(query, page, priority), background=priority == Priority.BACKGROUND
+        )
+
+    async def _fetch_search(self, query: str, page: int, priority: Priority) -> List[Dict]:
+        data = await self._make_request("films", {"keyword": query, "page": page}, priority)
+        films = [self._process_film_item(item) for item in data.get("items", [])]
+        # Названия сохраняются для подсказок /suggest
+        record_films(films)
+        return films
+
+    def prefetch_search(self, query: str, page: int):
+        """Фоновая загрузка страницы поиска в кеш"""
+        key = make_key("kp", "search", query, page)
+
+        async def load() -> bool:
+            if await search_cache.get(key) is not None:
+                return False
+            await self.search_films(query, page, Priority.BACKGROUND)
+            return True
+
+        prefetcher.schedule("kp_search", key, load, upstream_busy=rate_limiter.queue_depth > 0)
+
+    async def get_film_details(self, film_id: int, priority: Priority = Priority.INTERACTIVE) -> Dict:
+        """Получение полной информации о фильме/сериале (с кешированием)"""
+        film = await film_cache.get_or_load(
+            make_key("kp", "film", film_id),
+            lambda: self._fetch_film_details(film_id, priority),
+            background=priority == Priority.BACKGROUND
+        )
+        # Вызывающий код дополняет ответ полями, кешированная запись не должна меняться
+        return dict(film)
 
-    async def get_film_details(self, film_id: int) -> Dict:
-        """Получение полной информации о фильме/сериале"""
-        data = await self._make_request(f"films/{film_id}")
-        return self._process_film_item(data, detailed=True)
+    async def _fetch_film_details(self, film_id: int, priority: Priority) -> Dict:
+        data = await self._make_request(f"films/{film_id}", priority=priority)
+        film = self._process_film_item(data, detailed=True)
+        record_films([film])
+        return film
 
-    async def get_film_sequels_and_prequels(self, film_id: int) -> List[Dict]:
+    async def get_seasons(self, series_id: int, priority: Priority = Priority.INTERACTIVE) -> List[Dict]:
+        """Сезоны и эпизоды сериала (кешируются отдельно от карточки сериала)"""
+        return await seasons_cache.get_or_load(
+            make_key("kp", "seasons", series_id),
+            lambda: self._fetch_seasons(series_id, priority),
+            background=priority == Priority.BACKGROUND
+        )
+
+    async def _fetch_seasons(self, series_id: int, priority: Priority) -> List[Dict]:
+        data = await self._make_request(f"films/{series_id}/seasons", priority=priority)
+        seasons = []
+        for season in data.get("items", []):
+            episodes = [self._process_episode(episode) for episode in season.get("episodes", [])]
+            years = [int(e["release_date"][:4]) for e in episodes if (e["release_date"] or "")[:4].isdigit()]
+            seasons.append({
+                "number": season.get("number"),
+                "episodes": episodes,
+                "year": min(years) if years else None,
+            })
+        return seasons
+
+    async def get_seasons_summary(self, series_id: int) -> List[Dict]:
+        """Краткая информация о сезонах: номер, число эпизодов, год"""
+        return [
+            {"number": season["number"], "episodes": len(season["episodes"]), "year": season["year"]}
+            for season in await self.get_seasons(series_id)
+        ]
+
+    async def get_season_episodes(self, series_id: int, season_number: int,
+                                  offset: int = 0, limit: int = 50) -> Optional[Dict]:
+        """Страница эпизодов одного сезона; None, если такого сезона нет"""
+        for season in await self.get_seasons(series_id):
+            if season["number"] == season_number:
+                episodes = season["episodes"]
+                return {
+                    "series_id": series_id,
+                    "number": season_number,
+                    "year": season["year"],
+                    "total_episodes": len(episodes),
+                    "offset": offset,
+                    "limit": limit,
+                    "episodes": episodes[offset:offset + limit],
+                }
+        return None
+
+    async def get_films_batch(self, film_ids: List[int]) -> Dict[str, Dict]:
+        """
+        Детали нескольких фильмов: id дедуплицируются, закешированные отдаются сразу,
+        остальные запрашиваются параллельно (не больше KP_BATCH_CONCURRENCY одновременно).
+        Ошибка по одному id не прерывает обработку остальных; id, не уложившиеся
+        в бюджет ограничителя запросов, попадают в errors с кодом 429.
+        """
+        films: Dict[int, Dict] = {}
+        errors: Dict[int, Dict] = {}
+        missing: List[int] = []
+        for film_id in dict.fromkeys(film_ids):
+            film = await film_cache.get(make_key("kp", "film", film_id))
+            if film is not None:
+                films[film_id] = dict(film)
+            else:
+                missing.append(film_id)
+
+        semaphore = asyncio.Semaphore(settings.KP_BATCH_CONCURRENCY)
+
+        async def load(film_id: int):
+            async with semaphore:
+                try:
+                    films[film_id] = await self.get_film_details(film_id)
+                except HTTPException as e:
+                    if isinstance(e.__cause__, RateLimitExceeded):
+                        errors[film_id] = {"status_code": 429, "detail": e.detail,
+                                           "retry_after": e.__cause__.retry_after}
+                    else:
+                        errors[film_id] = {"status_code": e.status_code, "detail": e.detail}
+                except Exception as e:
+                    logger.error(f"Batch load of film {film_id} failed: {str(e)}")
+                    errors[film_id] = {"status_code": 500, "detail": "Ошибка получения фильма"}
+
+        await asyncio.gather(*(load(film_id) for film_id in missing))
+        return {"films": films, "errors": errors}
+
+    async def get_film_sequels_and_prequels(self, film_id: int,
+                                            priority: Priority = Priority.INTERACTIVE) -> List[Dict]:
         """Получение сиквелов и приквелов"""
-        data = await self._make_request(f"films/{film_id}/sequels_and_prequels")
+        data = await self._make_request(f"films/{film_id}/sequels_and_prequels", priority=priority)
         return [self._process_film_item(item) for item in data]
 
     async def get_collection(
             self,
             collection_type: TopFilmType,
             page: int = 1,
-            limit: int = 20
+            limit: int = 20,
+            priority: Priority = Priority.INTERACTIVE
     ) -> List[Dict]:
         """
         Универсальный метод для получения любых подборок
@@ -93,35 +298,28 @@ class KinopoiskAPI:
             collection_type: Тип подборки из TopFilmType
             page: Номер страницы (начинается с 1)
             limit: Количество элементов на странице (макс. 20)
+            priority: Приоритет в очереди ограничителя запросов
         """
-        top_types = [
-            TopFilmType.TOP_250_BEST_FILMS,
-            TopFilmType.TOP_100_POPULAR_FILMS,
-            TopFilmType.TOP_AWAIT_FILMS,
-            TopFilmType.LOVE_THEME
-        ]
+        if priority == Priority.INTERACTIVE:
+            prefetcher.record_access("kp_collection", make_key("kp", "collection", collection_type.value, page))
+        collection_page = await self._get_collection_page(collection_type, page, priority)
+        items = collection_page["items"]
+        return items[:min(limit, len(items))]
 
-        if collection_type in top_types:
-            params = {
-                "type": collection_type.value,
-                "page": page
-            }
-            endpoint = "films/collections" if collection_type == TopFilmType.LOVE_THEME else "films/top"
-            data = await self._make_request(endpoint, params)
-            items = [self._process_film_item(item) for item in data.get("items", data.get("films", []))]
-            return items[:min(limit, len(items))]
-        elif collection_type == TopFilmType.TOP_250_TV_SHOWS:
-            params = {
-                "type": "TV_SERIES",
-                "order": "RATING",
-                "page": page,
-                "limit": min(limit, 20)
-            }
-            data = await self._make_request("films", params)
-            items = [self._process_film_item(item) for item in data.get("items", [])]
-            return items
-        else:
-            return await self.get_thematic_collection(collection_type, page, limit)
+    async def prefetch_collection(self, collection_type: TopFilmType, page: int):
+        """Фоновая загрузка страницы подборки в кеш, если такая страница существует"""
+        current = await collection_cache.get(make_key("kp", "collection", collection_type.value, page - 1))
+        if current is None or page > min(current["pages"], MAX_COLLECTION_PAGES):
+            return
+        key = make_key("kp", "collection", collection_type.value, page)
+
+        async def load() -> bool:
+            if await collection_cache.get(key) is not None:
+                return False
+            await self._get_collection_page(collection_type, page, Priority.BACKGROUND)
+            return True
+
+        prefetcher.schedule("kp_collection", key, load, upstream_busy=rate_limiter.queue_depth > 0)
 
     async def get_thematic_collection(
             self,
@@ -136,31 +334,131 @@ class KinopoiskAPI:
             page: Номер страницы
             limit: Количество элементов на странице (макс. 20)
         """
-        theme_filters = {
-            TopFilmType.FAMILY: {"genres": "19"},
-            TopFilmType.VAMPIRE_THEME: {"keyword": "вампиры"},
-            TopFilmType.ZOMBIE_THEME: {"keyword": "зомби"},
-            TopFilmType.COMICS_THEME: {"keyword": "комиксы"},
-            TopFilmType.OSKAR_WINNERS_2021: {"keyword": "оскар 2021"},
-            TopFilmType.CLOSES_RELEASES: {"order": "YEAR", "yearFrom": 2023},
-            TopFilmType.TOP_POPULAR_ALL: {"order": "RATING"},
-            TopFilmType.TOP_POPULAR_MOVIES: {"order": "RATING", "type": "FILM"}
-        }
+        if collection_type not in THEME_FILTERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported collection type: {collection_type.value}"
+            )
+        return await self.get_collection(collection_type, page, limit)
+
+    async def get_collection_range(
+            self,
+            collection_type: TopFilmType,
+            offset: int = 0,
+            limit: Optional[int] = None,
+            priority: Priority = Priority.INTERACTIVE
+    ) -> Dict:
+        """
+        Произвольный срез подборки. Нужные страницы API запрашиваются параллельно
+        и склеиваются по порядку; limit=None возвращает подборку целиком.
+        """
+        full_key = make_key("kp", "collection_full", collection_type.value)
+        full = await collection_cache.get(full_key)
+        if full is None:
+            pages_count = KNOWN_COLLECTION_PAGES.get(collection_type)
+            first = None
+            if pages_count is None:
+                # Размер подборки заранее неизвестен: узнаём его по первой странице
+                first = await self._get_collection_page(collection_type, 1, priority)
+                pages_count = first["pages"]
+            max_page = max(1, min(pages_count, MAX_COLLECTION_PAGES))
+            first_page = offset // UPSTREAM_PAGE_SIZE + 1
+
+            if first_page > max_page:
+                # Смещение за концом подборки: страницы за ним не запрашиваются
+                if first is None:
+                    first = await self._get_collection_page(collection_type, 1, priority)
+                items, start = [], 0
+                total = min(first["total"], max_page * UPSTREAM_PAGE_SIZE)
+            else:
+                last_page = max_page
+                if limit is not None:
+                    last_page = min((offset + limit - 1) // UPSTREAM_PAGE_SIZE + 1, max_page)
+
+                pages = await asyncio.gather(*(
+                    self._get_collection_page(collection_type, page, priority)
+                    for page in range(first_page, last_page + 1)
+                ))
+                items = [item for collection_page in pages for item in collection_page["items"]]
+                # Дальше MAX_COLLECTION_PAGES подборка не отдаётся, total это учитывает
+                total = min(pages[0]["total"], max_page * UPSTREAM_PAGE_SIZE)
+
+                if first_page == 1 and last_page >= min(pages[-1]["pages"], MAX_COLLECTION_PAGES):
+                    total = len(items)
+                    await collection_cache.set(full_key, {"items": items, "total": total})
+                start = offset - (first_page - 1) * UPSTREAM_PAGE_SIZE
+        else:
+            items = full["items"]
+            total = full["total"]
+            start = offset
 
-        params = {
-            "page": page,
-            "limit": min(limit, 20)
+        end = start + limit if limit is not None else None
+        return {
+            "type": collection_type.value,
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "items": items[start:end],
         }
-        if collection_type in theme_filters:
-            params.update(theme_filters[collection_type])
+
+    async def _get_collection_page(self, collection_type: TopFilmType, page: int,
+                                   priority: Priority = Priority.INTERACTIVE) -> Dict:
+        """Одна страница подборки из API (с кешированием)"""
+        key = make_key("kp", "collection", collection_type.value, page)
+        return await collection_cache.get_or_load(
+            key, lambda: self._fetch_collection_page(collection_type, page, priority),
+            background=priority == Priority.BACKGROUND
+        )
+
+    async def _fetch_collection_page(self, collection_type: TopFilmType, page: int,
+                                     priority: Priority = Priority.INTERACTIVE) -> Dict:
+        if collection_type in TOP_TYPES:
+            params = {
+                "type": collection_type.value,
+                "page": page
+            }
+            endpoint = "films/collections" if collection_type == TopFilmType.LOVE_THEME else "films/top"
+        elif collection_type == TopFilmType.TOP_250_TV_SHOWS:
+            params = {
+                "type": "TV_SERIES",
+                "order": "RATING",
+                "page": page,
+                "limit": UPSTREAM_PAGE_SIZE
+            }
+            endpoint = "films"
+        elif collection_type in THEME_FILTERS:
+            params = {
+                "page": page,
+                "limit": UPSTREAM_PAGE_SIZE
+            }
+            params.update(THEME_FILTERS[collection_type])
+            endpoint = "films"
         else:
             raise HTTPException(
                 status_code=400,
                 detail=f"Unsupported collection type: {collection_type.value}"
             )
 
-        data = await self._make_request("films", params)
-        return [self._process_film_item(item) for item in data.get("items", [])]
+        data = await self._make_request(endpoint, params, priority)
+        items = [self._process_film_item(item) for item in data.get("items", data.get("films", []))]
+        record_films(items)
+        pages = data.get("pagesCount") or data.get("totalPages") or page
+        return {
+            "items": items,
+            "pages": pages,
+            "total": data.get("total"),
+        }
+
+    def _process_episode(self, item: Dict) -> Dict:
+        """Обработка данных об эпизоде"""
+        return {
+            "season_number": item.get("seasonNumber"),
+            "episode_number": item.get("episodeNumber"),
+            "title_ru": item.get("nameRu"),
+            "title_en": item.get("nameEn"),
+            "synopsis": item.get("synopsis"),
+            "release_date": item.get("releaseDate"),
+        }
 
     def _process_film_item(self, item: Dict, detailed: bool = False) -> Dict:
         """Обработка данных о фильме/сериале"""
@@ -170,8 +468,8 @@ class KinopoiskAPI:
             "title_ru": item.get("nameRu"),
             "title_en": item.get("nameEn"),
             "title_original": item.get("nameOriginal"),
-            "poster_url": item.get("posterUrl"),
-            "poster_url_preview": item.get("posterUrlPreview"),
+            "poster_url": proxy_image_url(item.get("posterUrl")),
+            "poster_url_preview": proxy_image_url(item.get("posterUrlPreview"), settings.IMAGE_PROXY_PREVIEW_WIDTH),
             "year": item.get("year"),
             "film_length": item.get("filmLength"),
             "slogan": item.get("slogan"),
@@ -201,8 +499,8 @@ class KinopoiskAPI:
             posters = item["posters"]
             result.update({
                 "posters": {
-                    "vertical": [p["url"] for p in posters if p.get("type") == "vertical"],
-                    "horizontal": [p["url"] for p in posters if p.get("type") == "horizontal"],
+                    "vertical": [proxy_image_url(p["url"]) for p in posters if p.get("type") == "vertical"],
+                    "horizontal": [proxy_image_url(p["url"]) for p in posters if p.get("type") == "horizontal"],
                 }
             })
 
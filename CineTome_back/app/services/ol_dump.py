@@ -0,0 +1,277 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+import time
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+AUTHORS = "authors"
+WORKS = "works"
+DUMP_TYPES = {AUTHORS: "/type/author", WORKS: "/type/work"}
+
+YEAR_RE = re.compile(r"\b(\d{4})\b")
+
+# Временные таблицы очищаются при каждом commit: одна пачка — одна транзакция
+STAGING_DDL = {
+    AUTHORS: """
+        CREATE TEMP TABLE IF NOT EXISTS ol_authors_staging (
+            key text, name text, revision integer
+        ) ON COMMIT DELETE ROWS
+    """,
+    WORKS: """
+        CREATE TEMP TABLE IF NOT EXISTS books_staging (
+            work_id text, title text, author_keys text[], year integer, description text,
+            subjects text, cover_id integer, revision integer, last_modified text
+        ) ON COMMIT DELETE ROWS
+    """,
+}
+STAGING_COLUMNS = {
+    AUTHORS: ("ol_authors_staging", ["key", "name", "revision"]),
+    WORKS: ("books_staging", ["work_id", "title", "author_keys", "year", "description",
+                              "subjects", "cover_id", "revision", "last_modified"]),
+}
+# Строка обновляется, только если в дампе более новая ревизия
+MERGE_SQL = {
+    AUTHORS: """
+        INSERT INTO ol_authors (key, name, revision)
+        SELECT DISTINCT ON (key) key, name, revision FROM ol_authors_staging
+        ORDER BY key, revision DESC
+        ON CONFLICT (key) DO UPDATE SET name = EXCLUDED.name, revision = EXCLUDED.revision
+        WHERE ol_authors.revision IS NULL OR ol_authors.revision < EXCLUDED.revision
+    """,
+    WORKS: """
+        INSERT INTO books (work_id, title, author, authors, year, description,
+                           subjects, cover_id, revision, last_modified)
+        SELECT s.work_id, s.title, array_to_string(n.names, ', '), to_json(COALESCE(n.names, '{}')),
+               s.year, s.description, s.subjects::json, s.cover_id, s.revision, s.last_modified
+        FROM (
+            SELECT DISTINCT ON (work_id) * FROM books_staging ORDER BY work_id, revision DESC
+        ) s
+        LEFT JOIN LATERAL (
+            SELECT array_agg(a.name ORDER BY k.position) AS names
+            FROM unnest(s.author_keys) WITH ORDINALITY AS k(key, position)
+            JOIN ol_authors a ON a.key = k.key
+        ) n ON true
+        ON CONFLICT (work_id) DO UPDATE SET
+            title = EXCLUDED.title, author = EXCLUDED.author, authors = EXCLUDED.authors,
+            year = EXCLUDED.year, description = EXCLUDED.description, subjects = EXCLUDED.subjects,
+            cover_id = EXCLUDED.cover_id, revision = EXCLUDED.revision, last_modified = EXCLUDED.last_modified
+        WHERE books.revision IS NULL OR books.revision < EXCLUDED.revision
+    """,
+}
+CHECKPOINT_SQL = """
+    INSERT INTO ingest_checkpoints (source, kind, file_size, lines_done, rows_loaded,
+                                    max_last_modified, completed, updated_at)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, now())
+    ON CONFLICT (source) DO UPDATE SET
+        file_size = EXCLUDED.file_size, lines_done = EXCLUDED.lines_done, rows_loaded = EXCLUDED.rows_loaded,
+        max_last_modified = EXCLUDED.max_last_modified, completed = EXCLUDED.completed, updated_at = now()
+"""
+
+
+def _text(value) -> Optional[str]:
+    """Текстовое поле дампа: строка или {"type": "/type/text", "value": ...}; NUL в Postgres недопустим"""
+    if isinstance(value, dict):
+        value = value.get("value")
+    if not isinstance(value, str):
+        return None
+    return value.replace("\x00", "").strip() or None
+
+
+def parse_author(key: str, revision: int, data: Dict) -> Optional[Tuple]:
+    name = _text(data.get("name")) or _text(data.get("personal_name"))
+    if name is None:
+        return None
+    return key, name, revision
+
+
+def parse_work(key: str, revision: int, last_modified: str, data: Dict) -> Optional[Tuple]:
+    title = _text(data.get("title"))
+    if title is None:
+        return None
+
+    author_keys = []
+    for entry in data.get("authors") or []:
+        author = entry.get("author") if isinstance(entry, dict) else None
+        author_key = author.get("key") if isinstance(author, dict) else author
+        if isinstance(author_key, str):
+            author_keys.append(author_key)
+
+    year = None
+    match = YEAR_RE.search(_text(data.get("first_publish_date")) or "")
+    if match:
+        year = int(match.group(1))
+
+    subjects = [s for s in (_text(s) for s in data.get("subjects") or []) if s][:50]
+    cover_id = next((c for c in data.get("covers") or [] if isinstance(c, int) and 0 < c < 2 ** 31), None)
+
+    return (
+        key.rsplit("/", 1)[-1], title, author_keys, year, _text(data.get("description")),
+        orjson.dumps(subjects).decode(), cover_id, revision, last_modified,
+    )
+
+
+def open_dump(path: str) -> IO[str]:
+    """Потоковое чтение: gzip распаковывается по мере чтения, память не зависит от размера дампа"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="\n")
+    return open(path, "r", encoding="utf-8", newline="\n")
+
+
+class DumpReader:
+    """
+    Разбор дампа OpenLibrary (TSV: type, key, revision, last_modified, JSON)
+    пачками по batch_size строк. Строки до skip_lines и (при since) не
+    изменённые после since пропускаются без разбора JSON.
+    """
+
+    def __init__(self, path: str, kind: str, batch_size: int, skip_lines: int = 0, since: Optional[str] = None):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.since = since
+        self.skip_lines = skip_lines
+        self.lines_read = 0
+        self.max_last_modified: Optional[str] = None
+        self._file = open_dump(path)
+        self._lines: Iterator[str] = iter(self._file)
+
+    def close(self):
+        self._file.close()
+
+    def next_batch(self) -> List[Tuple]:
+        """Следующая пачка записей; пустая — дамп закончился"""
+        record_type = DUMP_TYPES[self.kind]
+        batch: List[Tuple] = []
+        for line in self._lines:
+            self.lines_read += 1
+            if self.lines_read <= self.skip_lines:
+                continue
+            fields = line.rstrip("\n").split("\t", 4)
+            if len(fields) != 5 or fields[0] != record_type:
+                continue
+            _, key, revision, last_modified, payload = fields
+            if self.since is not None and last_modified <= self.since:
+                continue
+            try:
+                data = orjson.loads(payload)
+                record = (parse_author(key, int(revision), data) if self.kind == AUTHORS
+                          else parse_work(key, int(revision), last_modified, data))
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"Skipping malformed {self.kind} line {self.lines_read}: {str(e)}")
+                continue
+            if record is None:
+                continue
+            if self.max_last_modified is None or last_modified > self.max_last_modified:
+                self.max_last_modified = last_modified
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+
+class DumpIngestion:
+    """
+    Загрузка одного файла дампа в Postgres: пачка записей через COPY во
+    временную таблицу, затем upsert в целевую (для работ — с подстановкой
+    имён авторов из ol_authors, поэтому дамп авторов загружается первым).
+    Пачка и отметка прогресса фиксируются одной транзакцией, поэтому после
+    сбоя импорт продолжается с места остановки без потерь и повторов.
+    Разбор следующей пачки идёт в потоке параллельно с COPY текущей.
+    """
+
+    def __init__(self, engine: AsyncEngine, path: str, kind: str,
+                 batch_size: int = settings.OL_DUMP_BATCH_SIZE, incremental: bool = False, restart: bool = False):
+        self.engine = engine
+        self.path = path
+        self.kind = kind
+        self.batch_size = batch_size
+        self.incremental = incremental
+        self.restart = restart
+        self.source = os.path.basename(path)
+        self.file_size = os.path.getsize(path)
+        self.rows_loaded = 0
+
+    async def run(self) -> int:
+        """Возвращает число загруженных в этом запуске записей"""
+        async with self.engine.connect() as conn:
+            pg = (await conn.get_raw_connection()).driver_connection
+            await pg.execute(STAGING_DDL[self.kind])
+
+            checkpoint = await pg.fetchrow(
+                "SELECT * FROM ingest_checkpoints WHERE source = $1", self.source
+            )
+            skip_lines, rows_before, max_before = 0, 0, None
+            if checkpoint is not None and not self.restart:
+                if checkpoint["file_size"] != self.file_size:
+                    logger.warning(f"{self.source} changed since the last import, starting over")
+                elif checkpoint["completed"]:
+                    logger.info(f"{self.source} is already imported, use --restart to load it again")
+                    return 0
+                else:
+                    skip_lines, rows_before = checkpoint["lines_done"], checkpoint["rows_loaded"]
+                    max_before = checkpoint["max_last_modified"]
+                    logger.info(f"Resuming {self.source} after line {skip_lines}")
+
+            since = None
+            if self.incremental:
+                since = await pg.fetchval(
+                    "SELECT max(max_last_modified) FROM ingest_checkpoints "
+                    "WHERE kind = $1 AND completed AND source <> $2",
+                    self.kind, self.source,
+                )
+                logger.info(f"Incremental import of {self.kind} modified after {since or 'the beginning'}")
+
+            reader = DumpReader(self.path, self.kind, self.batch_size, skip_lines, since)
+            try:
+                await self._load(pg, reader, rows_before, max_before)
+            finally:
+                reader.close()
+        return self.rows_loaded
+
+    async def _load(self, pg, reader: DumpReader, rows_before: int, max_before: Optional[str]):
+        started = time.monotonic()
+        flush: Optional[asyncio.Task] = None
+        try:
+            while True:
+                batch = await asyncio.to_thread(reader.next_batch)
+                if flush is not None:
+                    await flush
+                    flush = None
+                if not batch:
+                    break
+                max_last_modified = max(filter(None, (max_before, reader.max_last_modified)), default=None)
+                flush = asyncio.create_task(self._flush(
+                    pg, batch, reader.lines_read, rows_before + self.rows_loaded + len(batch), max_last_modified
+                ))
+                self.rows_loaded += len(batch)
+                elapsed = time.monotonic() - started
+                logger.info(f"{self.kind}: {reader.lines_read} lines, {self.rows_loaded} rows, "
+                            f"{self.rows_loaded / max(elapsed, 1e-9):.0f} rows/s")
+        finally:
+            if flush is not None:
+                await flush
+
+        max_last_modified = max(filter(None, (max_before, reader.max_last_modified)), default=None)
+        await pg.execute(CHECKPOINT_SQL, self.source, self.kind, self.file_size, reader.lines_read,
+                         rows_before + self.rows_loaded, max_last_modified, True)
+        elapsed = time.monotonic() - started
+        logger.info(f"{self.source}: {self.rows_loaded} rows in {elapsed:.1f}s "
+                    f"({self.rows_loaded / max(elapsed, 1e-9):.0f} rows/s)")
+
+    async def _flush(self, pg, batch: List[Tuple], lines_done: int, rows_loaded: int,
+                     max_last_modified: Optional[str]):
+        table, columns = STAGING_COLUMNS[self.kind]
+        async with pg.transaction():
+            await pg.copy_records_to_table(table, records=batch, columns=columns)
+            await pg.execute(MERGE_SQL[self.kind])
+            await pg.execute(CHECKPOINT_SQL, self.source, self.kind, self.file_size, lines_done,
+                             rows_loaded, max_last_modified, False)
@@ -1,22 +1,39 @@
+import asyncio
+import logging
 import httpx
 from fastapi import HTTPException
-from typing import Optional, List
+from sqlalchemy import Float, func, literal, literal_column, select
+from typing import Optional, List, Dict
+from app.core.config import settings
+from app.database import async_read_session
+from app.models.book import Book
+from app.schemas.book import WORK_ID_RE
+from app.services.cache import TTLCache, make_key
+from app.services.http_clients import register_upstream, get_client
+from app.services.image_proxy import proxy_image_url
+from app.services.prefetch import prefetcher
+from app.services.resilience import resilient_get, CircuitOpenError
+from app.services.similar_books import record_books, recorded_terms, find_similar, similar_index, document_terms
+from app.services.translation import translate_books
 
+logger = logging.getLogger(__name__)
 
-async def search_books(
-        query: str,
-        limit: int = 5,
-        page: int = 1,
-        search_type: Optional[str] = None,
-        sort_by_popularity: bool = False,
-        sort_by_new: bool = False,
-        translate: bool = True
-):
-    url = "https://openlibrary.org/search.json"
+register_upstream("openlibrary", warmup_url=f"{settings.OPENLIBRARY_BASE_URL}/")
+
+book_cache = TTLCache("ol_works", maxsize=5000, default_ttl=settings.OL_BOOK_CACHE_TTL)
+search_cache = TTLCache("ol_search", maxsize=2000, default_ttl=settings.OL_SEARCH_CACHE_TTL)
+
+# Короче трёх символов у запроса нет триграмм, и индекс по books не применим
+LOCAL_SEARCH_MIN_LENGTH = 3
+
+
+def _search_params(query: str, limit: int, page: int, search_type: Optional[str],
+                   sort_by_new: bool):
+    url = f"{settings.OPENLIBRARY_BASE_URL}/search.json"
     params = {
         "limit": limit,
         "page": page,
-        "fields": "title,author_name,first_publish_year,cover_i,key,isbn,description,subjects,edition_count"
+        "fields": "title,author_name,first_publish_year,cover_i,key,isbn,first_sentence,subject,edition_count"
     }
 
     if sort_by_new:
@@ -31,67 +48,341 @@ async def search_books(
     else:
         params["q"] = query
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            books = [{
-                "title": book.get("title", "Без названия"),
-                "authors": book.get("author_name", []),
-                "year": book.get("first_publish_year"),
-                "cover_url": f"https://covers.openlibrary.org/b/id/{book['cover_i']}-L.jpg" if book.get(
-                    "cover_i") else None,
-                "work_id": book["key"].split("/")[-1] if book.get("key") and "/works/" in book["key"] else None,
-                "description": book.get("description", "Описание отсутствует") if isinstance(book.get("description"),
-                                                                                             str) else "Описание отсутствует",
-                "subjects": book.get("subjects", []),
-                "edition_count": book.get("edition_count", 0),
-                "rating": 0.0
-            } for book in data.get("docs", []) if book.get("key") and "/works/" in book["key"]]
-
-            if sort_by_popularity:
-                books.sort(key=lambda x: x["edition_count"], reverse=True)
-
-            return books
-        except httpx.HTTPStatusError as e:
-            print(f"OpenLibrary HTTP error: {e.response.status_code} - {e.response.text}")
-            raise HTTPException(status_code=e.response.status_code, detail=f"Ошибка API OpenLibrary: {str(e)}")
-        except Exception as e:
-            print(f"OpenLibrary general error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Ошибка поиска: {str(e)}")
+    return url, params
+
+
+async def search_books(
+        query: str,
+        limit: int = 5,
+        page: int = 1,
+        search_type: Optional[str] = None,
+        sort_by_popularity: bool = False,
+        sort_by_new: bool = False,
+        translate: bool = True
+):
+    books = None
+    if _local_search_applies(query, search_type, sort_by_popularity):
+        books = await _search_local(query, limit, page, search_type, sort_by_new)
+        if not books:
+            # В openlibrary.org уходят, только если локально не нашлось ничего: страницы
+            # после последней локальной остаются пустыми, чтобы источник и порядок
+            # выдачи не менялись посреди пагинации
+            found_locally = page > 1 and bool(await _search_local(query, 1, 1, search_type, sort_by_new))
+            books = [] if found_locally else None
+
+    if books is None:
+        url, params = _search_params(query, limit, page, search_type, sort_by_new)
+        key = make_key("ol", "search", sort_by_popularity, *sorted(params.items()))
+        prefetcher.record_access("ol_search", key)
+        books = await search_cache.get_or_load(key, lambda: _fetch_search(url, params, sort_by_popularity))
+        # Кешированный список не должен меняться при переводе
+        books = [dict(book) for book in books]
+
+    if translate:
+        await translate_books(books)
+
+    return books
+
+
+def prefetch_search(query: str, limit: int, page: int, search_type: Optional[str] = None,
+                    sort_by_popularity: bool = False, sort_by_new: bool = False):
+    """
+    Фоновая загрузка следующей страницы поиска в кеш. Переводится страница
+    только при запросе клиентом: упреждающий перевод тратил бы квоту GigaChat впустую.
+    """
+    if _local_search_applies(query, search_type, sort_by_popularity):
+        return
+
+    async def load() -> bool:
+        if await search_cache.get(key) is not None:
+            return False
+        await search_cache.get_or_load(key, lambda: _fetch_search(url, params, sort_by_popularity))
+        return True
+
+    url, params = _search_params(query, limit, page, search_type, sort_by_new)
+    key = make_key("ol", "search", sort_by_popularity, *sorted(params.items()))
+    prefetcher.schedule("ol_search", key, load)
+
+
+def _first_sentence(book: Dict) -> Optional[str]:
+    """Поиск не отдаёт описание, только первую фразу (строка или список строк)"""
+    sentence = book.get("first_sentence")
+    if isinstance(sentence, list):
+        sentence = next((item for item in sentence if isinstance(item, str) and item), None)
+    return sentence if isinstance(sentence, str) and sentence else None
+
+
+async def _fetch_search(url: str, params: Dict, sort_by_popularity: bool) -> List[Dict]:
+    client = get_client("openlibrary")
+
+    try:
+        response = await resilient_get("openlibrary", client, url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        books = [{
+            "title": book.get("title", "Без названия"),
+            "authors": book.get("author_name", []),
+            "year": book.get("first_publish_year"),
+            "cover_url": proxy_image_url(
+                f"https://covers.openlibrary.org/b/id/{book['cover_i']}-L.jpg", settings.IMAGE_PROXY_PREVIEW_WIDTH
+            ) if book.get("cover_i") else None,
+            "work_id": book["key"].split("/")[-1] if book.get("key") and "/works/" in book["key"] else None,
+            "description": _first_sentence(book) or "Описание отсутствует",
+            "subjects": book.get("subject", []),
+            "edition_count": book.get("edition_count", 0),
+            "rating": 0.0
+        } for book in data.get("docs", []) if book.get("key") and "/works/" in book["key"]]
+
+        # Описания и темы сохраняются для индекса похожих книг
+        record_books({
+            "work_id": book["key"].split("/")[-1],
+            "title": book.get("title"),
+            "authors": book.get("author_name"),
+            "year": book.get("first_publish_year"),
+            "description": _first_sentence(book),
+            "subjects": book.get("subject"),
+            "cover_id": book.get("cover_i"),
+        } for book in data.get("docs", []) if book.get("key") and "/works/" in book["key"])
+
+        if sort_by_popularity:
+            books.sort(key=lambda x: x["edition_count"], reverse=True)
+
+        return books
+    except httpx.HTTPStatusError as e:
+        print(f"OpenLibrary HTTP error: {e.response.status_code} - {e.response.text}")
+        raise HTTPException(status_code=e.response.status_code, detail=f"Ошибка API OpenLibrary: {str(e)}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail="OpenLibrary временно недоступна",
+                            headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+        print(f"OpenLibrary general error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка поиска: {str(e)}")
 
 
 async def get_book_details(work_id: str, translate: bool = True):
-    url = f"https://openlibrary.org/works/{work_id}.json"
+    book = await book_cache.get_or_load(make_key("ol", "work", work_id), lambda: _fetch_book_details(work_id))
+    # Вызывающий код дополняет ответ полями, кешированная запись не должна меняться
+    book = dict(book)
+    if translate:
+        await translate_books([book])
+    return book
+
 
-    async with httpx.AsyncClient() as client:
+async def get_books_batch(work_ids: List[str], translate: bool = False) -> Dict[str, Dict]:
+    """
+    Детали нескольких книг: id дедуплицируются и проверяются по формату OL...W,
+    затем запрашиваются параллельно (не больше OL_BATCH_CONCURRENCY одновременно).
+    У OpenLibrary нет пакетного запроса works с описаниями, поэтому каждая книга
+    загружается отдельно через общий пул соединений и кеш.
+    """
+    semaphore = asyncio.Semaphore(settings.OL_BATCH_CONCURRENCY)
+    books: Dict[str, Dict] = {}
+    errors: Dict[str, Dict] = {}
+
+    async def load(work_id: str):
+        if not WORK_ID_RE.match(work_id):
+            errors[work_id] = {"status_code": 422, "detail": "Некорректный work_id, ожидается формат OL...W"}
+            return
+        async with semaphore:
+            try:
+                books[work_id] = await get_book_details(work_id, translate=False)
+            except HTTPException as e:
+                errors[work_id] = {"status_code": e.status_code, "detail": e.detail}
+            except Exception as e:
+                logger.error(f"Batch load of book {work_id} failed: {str(e)}")
+                errors[work_id] = {"status_code": 500, "detail": "Ошибка получения книги"}
+
+    await asyncio.gather(*(load(work_id) for work_id in dict.fromkeys(work_ids)))
+    if translate and books:
+        # Строки всех книг пакета переводятся вместе, без повторов между книгами;
+        # при сбое перевода книги отдаются как есть
         try:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-
-            authors = [
-                author.get("name") for author in data.get("authors", [])
-                if isinstance(author.get("name"), str)
-            ]
-
-            book = {
-                "title": data.get("title", "Название не указано"),
-                "authors": authors,
-                "publish_year": data.get("first_publish_year"),
-                "description": data.get("description", "Описание отсутствует") if isinstance(data.get("description"),
-                                                                                             str) else "Описание отсутствует",
-                "cover_url": f"https://covers.openlibrary.org/b/id/{data.get('covers', [None])[0]}-L.jpg" if data.get(
-                    "covers") and data.get("covers")[0] else None,
-                "openlibrary_url": f"https://openlibrary.org/works/{work_id}"
-            }
+            await translate_books(list(books.values()))
+        except Exception as e:
+            logger.error(f"Batch translation of {len(books)} books failed: {str(e)}")
+    return {"books": books, "errors": errors}
+
+
+async def get_similar_books(work_id: str, limit: int) -> List[Dict]:
+    """
+    Похожие книги по локальному индексу TF-IDF (описания и темы). Для книги,
+    которой ещё нет в индексе, вектор строится по описанию и темам, сохранённым
+    при загрузке её деталей.
+    """
+    similar = await find_similar(work_id, limit)
+    if similar is None and similar_index.manifest is not None:
+        book = await get_book_details(work_id, translate=False)
+        terms = await recorded_terms(work_id) or document_terms(book.get("description"), [])
+        similar = await find_similar(work_id, limit, terms)
+    if similar is None:
+        raise HTTPException(status_code=503, detail="Индекс похожих книг ещё не построен")
+    return await _similar_cards(similar)
 
+
+async def get_books_by_subjects(subjects: List[str], limit: int) -> List[Dict]:
+    """Книги, ближе всего подходящие к набору тем, по тому же индексу; пустой список, если индекса нет"""
+    similar = await find_similar("", limit, document_terms(None, subjects))
+    return await _similar_cards(similar or [])
+
+
+async def _similar_cards(similar: List) -> List[Dict]:
+    if not similar:
+        return []
+
+    async with async_read_session() as db:
+        rows = (await db.execute(
+            select(Book).where(Book.work_id.in_([similar_id for similar_id, _ in similar]))
+        )).scalars().all()
+    by_work_id = {row.work_id: row for row in rows}
+    return [{
+        "work_id": similar_id,
+        "title": by_work_id[similar_id].title,
+        "authors": by_work_id[similar_id].authors or [],
+        "year": by_work_id[similar_id].year,
+        "cover_url": _cover_url(by_work_id[similar_id].cover_id),
+        "score": score,
+    } for similar_id, score in similar if similar_id in by_work_id]
+
+
+def _cover_url(cover_id) -> Optional[str]:
+    return proxy_image_url(f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg") if cover_id else None
+
+
+async def _load_local_book(work_id: str) -> Optional[Dict]:
+    """Книга из импортированного дампа OpenLibrary; None — нет в таблице или БД недоступна"""
+    try:
+        async with async_read_session() as db:
+            row = (await db.execute(
+                select(Book).where(Book.work_id == work_id, Book.revision.is_not(None))
+            )).scalar_one_or_none()
+    except Exception as e:
+        logger.warning(f"Local book lookup failed for {work_id}: {str(e)}")
+        return None
+    if row is None:
+        return None
+    return {
+        "title": row.title,
+        "authors": row.authors or [],
+        "publish_year": row.year,
+        "description": row.description or "Описание отсутствует",
+        "cover_url": _cover_url(row.cover_id),
+        "openlibrary_url": f"https://openlibrary.org/works/{work_id}"
+    }
+
+
+def _local_search_applies(query: str, search_type: Optional[str], sort_by_popularity: bool) -> bool:
+    """
+    Локально ищется по названию и автору от LOCAL_SEARCH_MIN_LENGTH символов: короче
+    триграммный индекс не работает. ISBN, темы и сортировка по числу изданий (в дампе
+    его нет) — только через openlibrary.org.
+    """
+    return (settings.OL_LOCAL_BOOKS and search_type in (None, "author") and not sort_by_popularity
+            and len(query.strip()) >= LOCAL_SEARCH_MIN_LENGTH)
+
+
+def _local_search_target(search_type: Optional[str]):
+    """
+    Выражение GiST-индекса из миграции 0012. Константы пишутся литералами:
+    с параметрами Postgres не сопоставит выражение с индексом
+    """
+    if search_type == "author":
+        return func.lower(Book.author)
+    empty, space = literal_column("''"), literal_column("' '")
+    return func.lower(func.coalesce(Book.title, empty).concat(space).concat(func.coalesce(Book.author, empty)))
+
+
+async def _search_local(query: str, limit: int, page: int, search_type: Optional[str],
+                        sort_by_new: bool) -> List[Dict]:
+    """
+    Поиск по импортированному дампу: запрос похож на слово в названии и/или авторе
+    (оператор <% pg_trgm), порядок — по расстоянию <<->, которое GiST-индекс отдаёт
+    сразу в нужном порядке без подсчёта сходства для всех совпадений.
+    """
+    text = query.strip().lower()
+    target = _local_search_target(search_type)
+    distance = literal(text).op("<<->", return_type=Float)(target)
+    order = [Book.year.desc().nulls_last(), distance] if sort_by_new else [distance]
+    try:
+        async with async_read_session() as db:
+            rows = (await db.execute(
+                select(Book)
+                .where(Book.revision.is_not(None), literal(text).op("<%", is_comparison=True)(target))
+                .order_by(*order, Book.id)
+                .offset((page - 1) * limit)
+                .limit(limit)
+            )).scalars().all()
+    except Exception as e:
+        logger.warning(f"Local book search failed for {query!r}: {str(e)}")
+        return []
+    return [{
+        "title": row.title or "Без названия",
+        "authors": row.authors or [],
+        "year": row.year,
+        "cover_url": proxy_image_url(
+            f"https://covers.openlibrary.org/b/id/{row.cover_id}-L.jpg", settings.IMAGE_PROXY_PREVIEW_WIDTH
+        ) if row.cover_id else None,
+        "work_id": row.work_id,
+        "description": row.description or "Описание отсутствует",
+        "subjects": row.subjects or [],
+        "edition_count": 0,
+        "rating": 0.0
+    } for row in rows]
+
+
+def _work_description(data: Dict) -> Optional[str]:
+    """Описание работы: строка или объект {"type": "/type/text", "value": ...}"""
+    description = data.get("description")
+    if isinstance(description, dict):
+        description = description.get("value")
+    return description if isinstance(description, str) and description else None
+
+
+async def _fetch_book_details(work_id: str):
+    if settings.OL_LOCAL_BOOKS:
+        book = await _load_local_book(work_id)
+        if book is not None:
             return book
-        except httpx.HTTPStatusError as e:
-            print(f"OpenLibrary HTTP error: {e.response.status_code} - {e.response.text}")
-            raise HTTPException(status_code=e.response.status_code, detail=f"Книга не найдена: {str(e)}")
-        except Exception as e:
-            print(f"OpenLibrary general error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Ошибка получения данных: {str(e)}")
\ No newline at end of file
+
+    url = f"{settings.OPENLIBRARY_BASE_URL}/works/{work_id}.json"
+
+    client = get_client("openlibrary")
+
+    try:
+        response = await resilient_get("openlibrary", client, url)
+        response.raise_for_status()
+        data = response.json()
+
+        authors = [
+            author.get("name") for author in data.get("authors", [])
+            if isinstance(author.get("name"), str)
+        ]
+
+        book = {
+            "title": data.get("title", "Название не указано"),
+            "authors": authors,
+            "publish_year": data.get("first_publish_year"),
+            "description": _work_description(data) or "Описание отсутствует",
+            "cover_url": _cover_url(data.get("covers", [None])[0] if data.get("covers") else None),
+            "openlibrary_url": f"https://openlibrary.org/works/{work_id}"
+        }
+
+        record_books([{
+            "work_id": work_id,
+            "title": book["title"],
+            "authors": authors,
+            "year": book["publish_year"],
+            "description": _work_description(data),
+            "subjects": [s for s in data.get("subjects", []) if isinstance(s, str)],
+            "cover_id": (data.get("covers") or [None])[0],
+        }])
+        return book
+    except httpx.HTTPStatusError as e:
+        print(f"OpenLibrary HTTP error: {e.response.status_code} - {e.response.text}")
+        raise HTTPException(status_code=e.response.status_code, detail=f"Книга не найдена: {str(e)}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail="OpenLibrary временно недоступна",
+                            headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+        print(f"OpenLibrary general error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка получения данных: {str(e)}")
\ No newline at end of file
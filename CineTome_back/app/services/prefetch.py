@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.rate_limiter import TokenBucketLimiter, Priority
+
+logger = logging.getLogger(__name__)
+
+
+PREFETCH_ISSUED = registry.counter(
+    "prefetch_issued_total",
+    "Запущенные упреждающие загрузки следующей страницы",
+    ["kind"],
+)
+PREFETCH_HITS = registry.counter(
+    "prefetch_hits_total",
+    "Страницы, запрошенные клиентом после упреждающей загрузки",
+    ["kind"],
+)
+PREFETCH_SKIPPED = registry.counter(
+    "prefetch_skipped_total",
+    "Упреждающие загрузки, пропущенные по причине",
+    ["kind", "reason"],
+)
+PREFETCH_HIT_RATIO = registry.gauge(
+    "prefetch_hit_ratio",
+    "Доля упреждающих загрузок, которые пригодились клиенту",
+)
+
+
+class Prefetcher:
+    """
+    Фоновая загрузка страницы N+1 в кеш ответов после выдачи страницы N.
+
+    Ограничения: глобальный бюджет (token bucket на процесс), не больше
+    PREFETCH_MAX_INFLIGHT одновременных загрузок, пропуск при занятом
+    ограничителе внешнего API. Загрузки, к которым клиент обратился в течение
+    PREFETCH_HIT_WINDOW секунд, считаются попаданиями.
+    """
+
+    def __init__(self):
+        self._budget = TokenBucketLimiter(
+            "prefetch",
+            rate=settings.PREFETCH_BUDGET_PER_SECOND,
+            burst=settings.PREFETCH_BUDGET_BURST,
+        )
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._prefetched: "OrderedDict[str, float]" = OrderedDict()
+        self._issued = 0
+        self._hits = 0
+        PREFETCH_HIT_RATIO.set_function(lambda: self._hits / self._issued if self._issued else 0.0)
+
+    def record_access(self, kind: str, key: str):
+        """Клиент запросил страницу: если она была загружена заранее, это попадание"""
+        prefetched_at = self._prefetched.pop(key, None)
+        if prefetched_at is not None and time.monotonic() - prefetched_at <= settings.PREFETCH_HIT_WINDOW:
+            self._hits += 1
+            PREFETCH_HITS.inc(kind=kind)
+
+    def schedule(self, kind: str, key: str, loader: Callable[[], Awaitable[bool]], upstream_busy: bool = False):
+        """
+        Запланировать загрузку. loader возвращает False, если страница уже была
+        в кеше и запрос к API не понадобился.
+        """
+        if not settings.PREFETCH_ENABLED:
+            return
+        if key in self._inflight or key in self._prefetched:
+            return
+        if upstream_busy:
+            PREFETCH_SKIPPED.inc(kind=kind, reason="upstream_busy")
+            return
+        if len(self._inflight) >= settings.PREFETCH_MAX_INFLIGHT:
+            PREFETCH_SKIPPED.inc(kind=kind, reason="inflight_limit")
+            return
+        if not self._budget.try_acquire(Priority.BACKGROUND):
+            PREFETCH_SKIPPED.inc(kind=kind, reason="budget")
+            return
+
+        self._inflight[key] = asyncio.create_task(self._run(kind, key, loader))
+
+    async def _run(self, kind: str, key: str, loader: Callable[[], Awaitable[bool]]):
+        try:
+            if await loader():
+                self._issued += 1
+                PREFETCH_ISSUED.inc(kind=kind)
+                self._prefetched[key] = time.monotonic()
+                while len(self._prefetched) > settings.PREFETCH_TRACKED_KEYS:
+                    self._prefetched.popitem(last=False)
+        except Exception as e:
+            PREFETCH_SKIPPED.inc(kind=kind, reason="error")
+            logger.info(f"Prefetch of {key} failed: {str(e)}")
+        finally:
+            self._inflight.pop(key, None)
+
+
+prefetcher = Prefetcher()
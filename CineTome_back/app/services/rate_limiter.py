@@ -0,0 +1,243 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import List, Optional, Tuple
+
+from app.core.metrics import registry
+from app.services.cache_backends import CacheBackend, get_shared_backend
+
+
+RATE_LIMITER_WAIT = registry.histogram(
+    "rate_limiter_wait_seconds",
+    "Время ожидания токена в очереди ограничителя",
+    ["limiter", "priority"],
+)
+RATE_LIMITER_REJECTED = registry.counter(
+    "rate_limiter_rejected_total",
+    "Запросы, отклонённые ограничителем",
+    ["limiter", "reason"],
+)
+RATE_LIMITER_QUEUE = registry.gauge(
+    "rate_limiter_queue_depth",
+    "Количество запросов, ожидающих токен",
+    ["limiter"],
+)
+RATE_LIMITER_RATE = registry.gauge(
+    "rate_limiter_current_rate",
+    "Текущая скорость выдачи токенов (запросов в секунду)",
+    ["limiter"],
+)
+RATE_LIMITER_DAILY_USED = registry.gauge(
+    "rate_limiter_daily_used",
+    "Израсходовано суточной квоты",
+    ["limiter"],
+)
+RATE_LIMITER_THROTTLED = registry.counter(
+    "rate_limiter_throttled_total",
+    "Ответы 429 от внешнего API",
+    ["limiter"],
+)
+
+
+class Priority(IntEnum):
+    """Меньшее значение обслуживается раньше"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, limiter: str, reason: str, retry_after: float):
+        super().__init__(f"Rate limit for {limiter} exceeded: {reason}")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """
+    Клиентский token bucket с приоритетной очередью ожидания.
+
+    - rate/burst: скорость пополнения и ёмкость корзины;
+    - daily_quota: суточный лимит запросов (0 - без лимита), фоновые запросы
+      могут израсходовать не больше background_quota_share от него;
+    - throttle(): реакция на 429 — пауза до Retry-After и двукратное снижение
+      скорости с постепенным восстановлением на успешных ответах;
+    - shared: скорость и суточная квота считаются на все воркеры в общем
+      backend (CACHE_BACKEND): счётчик на окно времени и счётчик на сутки.
+      Локальная корзина остаётся первой ступенью и сглаживает поток процесса.
+      Без общего backend (memory) или при его ошибке лимиты действуют на воркер.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, daily_quota: int = 0,
+                 background_quota_share: float = 0.8,
+                 interactive_max_wait: float = 2.0, background_max_wait: float = 30.0,
+                 shared: bool = False):
+        self.name = name
+        self.shared = shared
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.background_quota_share = background_quota_share
+        self.max_wait = {
+            Priority.INTERACTIVE: interactive_max_wait,
+            Priority.BACKGROUND: background_max_wait,
+        }
+        self._current_rate = rate
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._day = self._today()
+        self._daily_used = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        RATE_LIMITER_RATE.set(rate, limiter=name)
+        RATE_LIMITER_QUEUE.set_function(lambda: len(self._waiters), limiter=name)
+        RATE_LIMITER_DAILY_USED.set_function(lambda: self._daily_used, limiter=name)
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._current_rate)
+        self._updated = now
+
+    def _seconds_until_midnight(self) -> float:
+        now = datetime.now(timezone.utc)
+        return 86400 - (now.hour * 3600 + now.minute * 60 + now.second)
+
+    def _check_daily_quota(self, priority: Priority):
+        if not self.daily_quota:
+            return
+        if self._day != self._today():
+            self._day = self._today()
+            self._daily_used = 0
+        limit = self.daily_quota
+        if priority == Priority.BACKGROUND:
+            limit = int(self.daily_quota * self.background_quota_share)
+        if self._daily_used >= limit:
+            RATE_LIMITER_REJECTED.inc(limiter=self.name, reason="daily_quota")
+            raise RateLimitExceeded(self.name, "daily quota exhausted", self._seconds_until_midnight())
+
+    def _try_take(self) -> bool:
+        if time.monotonic() < self._paused_until:
+            return False
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self._daily_used += 1
+            return True
+        return False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def try_acquire(self, priority: Priority = Priority.BACKGROUND) -> bool:
+        """Взять токен без ожидания; False, если токенов или квоты нет"""
+        try:
+            self._check_daily_quota(priority)
+        except RateLimitExceeded:
+            return False
+        return not self._waiters and self._try_take()
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Дождаться токена; при превышении срока ожидания бросает RateLimitExceeded"""
+        self._check_daily_quota(priority)
+        started = time.monotonic()
+        if not self._waiters and self._try_take():
+            await self._acquire_shared(priority, started)
+            RATE_LIMITER_WAIT.observe(time.monotonic() - started, limiter=self.name, priority=priority.name.lower())
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait[priority])
+        except asyncio.TimeoutError:
+            RATE_LIMITER_REJECTED.inc(limiter=self.name, reason="queue_timeout")
+            raise RateLimitExceeded(self.name, "queue wait deadline exceeded", 1 / self._current_rate)
+        await self._acquire_shared(priority, started)
+        RATE_LIMITER_WAIT.observe(time.monotonic() - started, limiter=self.name, priority=priority.name.lower())
+
+    def _backend(self) -> Optional[CacheBackend]:
+        return get_shared_backend() if self.shared else None
+
+    async def _acquire_shared(self, priority: Priority, started: float):
+        """Место в общем для воркеров окне времени; окно длиной не меньше секунды"""
+        backend = self._backend()
+        if backend is None:
+            return
+        deadline = started + self.max_wait[priority]
+        while True:
+            window = max(1.0, 1 / self._current_rate)
+            now = time.time()
+            index = int(now // window)
+            count = await backend.incr(f"ratelimit:{self.name}:{window:g}:{index}", 1, window * 2)
+            # Общий счётчик недоступен — остаётся ограничение процесса
+            if count is None or count <= max(1, int(self._current_rate * window)):
+                break
+            wait = (index + 1) * window - now
+            if time.monotonic() + wait > deadline:
+                RATE_LIMITER_REJECTED.inc(limiter=self.name, reason="queue_timeout")
+                raise RateLimitExceeded(self.name, "shared rate limit exceeded", wait)
+            await asyncio.sleep(wait)
+
+        if self.daily_quota:
+            # Проверка квоты в _check_daily_quota видит общий расход на момент последнего запроса
+            used = await backend.incr(f"ratelimit:{self.name}:day:{self._today()}", 1, 2 * 86400)
+            if used is not None:
+                self._day, self._daily_used = self._today(), used
+
+    async def _dispatch(self):
+        while self._waiters:
+            # Ожидающие, отменённые по таймауту, выбрасываем из головы очереди
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            if self._try_take():
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                continue
+
+            await asyncio.sleep((1 - self._tokens) / self._current_rate)
+
+    def throttle(self, retry_after: Optional[float] = None):
+        """Внешний API ответил 429: пауза и снижение скорости"""
+        RATE_LIMITER_THROTTLED.inc(limiter=self.name)
+        pause = retry_after if retry_after is not None else 1 / self._current_rate
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        self._current_rate = max(self.rate * 0.1, self._current_rate / 2)
+        self._tokens = 0.0
+        RATE_LIMITER_RATE.set(self._current_rate, limiter=self.name)
+
+    def record_success(self):
+        if self._current_rate < self.rate:
+            self._refill()
+            self._current_rate = min(self.rate, self._current_rate + self.rate * 0.05)
+            RATE_LIMITER_RATE.set(self._current_rate, limiter=self.name)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах (формат HTTP-даты не поддерживается Кинопоиском)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
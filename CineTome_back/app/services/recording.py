@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+import orjson
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+
+REPLAYED_REQUESTS = registry.counter(
+    "upstream_replay_requests_total",
+    "Ответы внешних API из записи по результату",
+    ["upstream", "result"],
+)
+
+# Заголовки ответа, которые имеет смысл сохранять
+_KEPT_HEADERS = ("content-type", "retry-after", "location")
+_ENCODING_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def transport_mode() -> str:
+    return settings.UPSTREAM_TRANSPORT_MODE
+
+
+class RecordingStore:
+    """
+    Записи ответов: один файл на запрос, root/<upstream>/<hash[:2]>/<hash>.bin,
+    содержимое — zlib(orjson(метаданные) + "\\n" + тело ответа).
+    """
+
+    def __init__(self, root: str = settings.UPSTREAM_RECORDINGS_DIR):
+        self.root = Path(root)
+
+    def _path(self, upstream: str, key: str) -> Path:
+        return self.root / upstream / key[:2] / f"{key}.bin"
+
+    def load(self, upstream: str, key: str) -> Optional[Tuple[Dict, bytes]]:
+        try:
+            data = zlib.decompress(self._path(upstream, key).read_bytes())
+        except FileNotFoundError:
+            return None
+        meta, _, body = data.partition(b"\n")
+        return orjson.loads(meta), body
+
+    def save(self, upstream: str, key: str, meta: Dict, body: bytes):
+        path = self._path(upstream, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(zlib.compress(orjson.dumps(meta) + b"\n" + body, 6))
+        os.replace(tmp, path)
+
+
+store = RecordingStore()
+_random = random.Random(settings.UPSTREAM_REPLAY_SEED)
+
+
+def request_key(method: str, url: str, params: Optional[Dict] = None, body: bytes = b"") -> str:
+    """Ключ записи: метод, URL с упорядоченными параметрами и хеш тела (заголовки с ключами API не входят)"""
+    if params:
+        url = f"{url}?{urlencode(sorted(params.items()))}"
+    digest = hashlib.sha256(f"{method.upper()} {url}\n".encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _synthetic_latency() -> float:
+    latency = settings.UPSTREAM_REPLAY_LATENCY_MS + _random.uniform(0, settings.UPSTREAM_REPLAY_JITTER_MS)
+    return latency / 1000
+
+
+def _injected_fault() -> Optional[str]:
+    """Синтетический отказ в режиме воспроизведения: error (503) или timeout"""
+    roll = _random.random()
+    if roll < settings.UPSTREAM_REPLAY_ERROR_RATE:
+        return "error"
+    if roll < settings.UPSTREAM_REPLAY_ERROR_RATE + settings.UPSTREAM_REPLAY_TIMEOUT_RATE:
+        return "timeout"
+    return None
+
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт httpx для общих клиентов внешних API. record: запрос уходит
+    в сеть, ответ сохраняется; replay: ответ берётся из записи с синтетической
+    задержкой и внедрёнными отказами, сеть не используется.
+    """
+
+    def __init__(self, upstream: str, mode: str, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.upstream = upstream
+        self.mode = mode
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        url = request.url.copy_with(query=None)
+        key = request_key(request.method, str(url), dict(request.url.params.multi_items()), body)
+
+        if self.mode == REPLAY:
+            return await self._replay(request, key)
+
+        response = await self.inner.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        await asyncio.to_thread(store.save, self.upstream, key, {
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in _KEPT_HEADERS if h in response.headers},
+            "url": str(request.url),
+        }, content)
+        REPLAYED_REQUESTS.inc(upstream=self.upstream, result="recorded")
+        # Тело уже распаковано, заголовки кодирования к нему не относятся
+        headers = [(name, value) for name, value in response.headers.multi_items()
+                   if name.lower() not in _ENCODING_HEADERS]
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def _replay(self, request: httpx.Request, key: str) -> httpx.Response:
+        await asyncio.sleep(_synthetic_latency())
+        fault = _injected_fault()
+        if fault == "timeout":
+            REPLAYED_REQUESTS.inc(upstream=self.upstream, result="injected_timeout")
+            raise httpx.ReadTimeout("Injected replay timeout", request=request)
+        if fault == "error":
+            REPLAYED_REQUESTS.inc(upstream=self.upstream, result="injected_error")
+            return httpx.Response(503, request=request)
+
+        recorded = await asyncio.to_thread(store.load, self.upstream, key)
+        if recorded is None:
+            REPLAYED_REQUESTS.inc(upstream=self.upstream, result="miss")
+            logger.warning(f"No recording for {self.upstream} {request.method} {request.url}")
+            return httpx.Response(settings.UPSTREAM_REPLAY_MISS_STATUS, request=request,
+                                  headers={"x-replay-miss": "1"})
+        meta, content = recorded
+        REPLAYED_REQUESTS.inc(upstream=self.upstream, result="hit")
+        return httpx.Response(meta["status"], headers=meta["headers"], content=content, request=request)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+def build_transport(upstream: str, limits: httpx.Limits) -> Optional[httpx.AsyncBaseTransport]:
+    """Транспорт для общего клиента; в режиме live — None (стандартный транспорт httpx)"""
+    mode = transport_mode()
+    if mode == LIVE:
+        return None
+    inner = httpx.AsyncHTTPTransport(limits=limits) if mode == RECORD else None
+    return RecordReplayTransport(upstream, mode, inner)
+
+
+def recorded_call(upstream: str, key: str, call: Callable[[], Any]) -> Any:
+    """
+    Запись/воспроизведение синхронного вызова SDK (GigaChat), результат должен
+    сериализоваться в JSON. В режиме replay при отсутствии записи бросает LookupError.
+    """
+    mode = transport_mode()
+    if mode == LIVE:
+        return call()
+
+    if mode == REPLAY:
+        time.sleep(_synthetic_latency())
+        fault = _injected_fault()
+        if fault is not None:
+            REPLAYED_REQUESTS.inc(upstream=upstream, result=f"injected_{fault}")
+            raise ConnectionError(f"Injected replay {fault}")
+        recorded = store.load(upstream, key)
+        if recorded is None:
+            REPLAYED_REQUESTS.inc(upstream=upstream, result="miss")
+            raise LookupError(f"No recording for {upstream} call {key}")
+        REPLAYED_REQUESTS.inc(upstream=upstream, result="hit")
+        return orjson.loads(recorded[1])
+
+    result = call()
+    store.save(upstream, key, {"status": 200, "headers": {}}, orjson.dumps(result))
+    REPLAYED_REQUESTS.inc(upstream=upstream, result="recorded")
+    return result
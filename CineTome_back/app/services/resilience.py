@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.rate_limiter import TokenBucketLimiter, Priority, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+UPSTREAM_REQUESTS = registry.counter(
+    "upstream_requests_total",
+    "Запросы к внешним API по результату",
+    ["upstream", "outcome"],
+)
+UPSTREAM_RETRIES = registry.counter(
+    "upstream_retries_total",
+    "Повторные попытки запросов к внешним API",
+    ["upstream"],
+)
+UPSTREAM_HEDGED = registry.counter(
+    "upstream_hedged_requests_total",
+    "Запросы, для которых был отправлен дублирующий (hedged) запрос",
+    ["upstream"],
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_request_seconds",
+    "Время ответа внешних API",
+    ["upstream"],
+)
+CIRCUIT_BREAKER_STATE = registry.gauge(
+    "circuit_breaker_state",
+    "Состояние предохранителя: 0 - закрыт, 1 - полуоткрыт, 2 - открыт",
+    ["upstream"],
+)
+CIRCUIT_BREAKER_REJECTED = registry.counter(
+    "circuit_breaker_rejected_total",
+    "Запросы, отклонённые открытым предохранителем",
+    ["upstream"],
+)
+
+
+class CircuitOpenError(Exception):
+    """Предохранитель внешнего API разомкнут, запрос не выполнялся"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"Circuit breaker for {upstream} is open")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Предохранитель на один внешний хост. После failure_threshold ошибок подряд
+    размыкается и отклоняет запросы recovery_timeout секунд, затем пропускает
+    пробный запрос (полуоткрытое состояние).
+    """
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str,
+                 failure_threshold: int = settings.BREAKER_FAILURE_THRESHOLD,
+                 recovery_timeout: float = settings.BREAKER_RECOVERY_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._state = self.CLOSED
+        CIRCUIT_BREAKER_STATE.set(0, upstream=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._set_state(self.HALF_OPEN)
+        return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            logger.warning(f"Circuit breaker {self.name}: {self._state} -> {state}")
+        self._state = state
+        CIRCUIT_BREAKER_STATE.set(self._STATE_VALUES[state], upstream=self.name)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            now = time.monotonic()
+            # Пробный запрос мог быть отменён, не сообщив результат: через
+            # recovery_timeout разрешаем следующий
+            if self._probe_started is None or now - self._probe_started >= self.recovery_timeout:
+                self._probe_started = now
+                return True
+        CIRCUIT_BREAKER_REJECTED.inc(upstream=self.name)
+        return False
+
+    def check(self):
+        """Как allow(), но бросает CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after() or self.recovery_timeout)
+
+    def record_success(self):
+        self._failures = 0
+        self._probe_started = None
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self._probe_started = None
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+class LatencyTracker:
+    """Скользящее окно времени ответов для оценки квантиля (задержка hedged-запроса)"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, value: float):
+        self._samples.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < 20:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    breaker = _breakers.get(upstream)
+    if breaker is None:
+        breaker = _breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+
+def _get_latency_tracker(upstream: str) -> LatencyTracker:
+    tracker = _latencies.get(upstream)
+    if tracker is None:
+        tracker = _latencies[upstream] = LatencyTracker()
+    return tracker
+
+
+def backoff_delay(attempt: int,
+                  base: float = settings.UPSTREAM_RETRY_BASE_DELAY,
+                  cap: float = settings.UPSTREAM_RETRY_MAX_DELAY) -> float:
+    """Экспоненциальная задержка с полным джиттером"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _hedge_delay(upstream: str) -> Optional[float]:
+    if not settings.UPSTREAM_HEDGE_ENABLED:
+        return None
+    p95 = _get_latency_tracker(upstream).quantile(0.95)
+    if p95 is None:
+        return None
+    return max(p95, settings.UPSTREAM_HEDGE_MIN_DELAY)
+
+
+async def _send_hedged(upstream: str, client: httpx.AsyncClient, url: str,
+                       hedge_after: Optional[float], **kwargs) -> httpx.Response:
+    if hedge_after is None:
+        return await client.get(url, **kwargs)
+
+    first = asyncio.create_task(client.get(url, **kwargs))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        UPSTREAM_HEDGED.inc(upstream=upstream)
+        tasks.add(asyncio.create_task(client.get(url, **kwargs)))
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resilient_get(upstream: str, client: httpx.AsyncClient, url: str,
+                        retries: int = settings.UPSTREAM_RETRIES,
+                        limiter: Optional[TokenBucketLimiter] = None,
+                        priority: Priority = Priority.INTERACTIVE,
+                        **kwargs) -> httpx.Response:
+    """
+    Идемпотентный GET к внешнему API: предохранитель, ограниченные повторы
+    с джиттером на сетевых ошибках и 5xx, опциональный hedged-запрос после p95.
+    Если передан limiter, каждая попытка берёт у него токен, а ответ 429
+    замедляет ограничитель и повторяется после паузы (hedging при этом
+    отключён, чтобы не расходовать квоту дважды).
+    Ответ возвращается без raise_for_status — это остаётся на вызывающем коде.
+    """
+    breaker = get_breaker(upstream)
+    tracker = _get_latency_tracker(upstream)
+    attempt = 0
+
+    while True:
+        breaker.check()
+        if limiter is not None:
+            await limiter.acquire(priority)
+        hedge_after = _hedge_delay(upstream) if limiter is None else None
+        started = time.perf_counter()
+        try:
+            response = await _send_hedged(upstream, client, url, hedge_after, **kwargs)
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            UPSTREAM_REQUESTS.inc(upstream=upstream, outcome="error")
+            if attempt >= retries:
+                raise
+            logger.warning(f"{upstream} request failed ({str(e)}), retrying")
+        else:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_LATENCY.observe(elapsed, upstream=upstream)
+            if response.status_code == 429 and limiter is not None:
+                # Ограничение квоты не считается отказом хоста
+                breaker.record_success()
+                limiter.throttle(parse_retry_after(response.headers.get("Retry-After")))
+                UPSTREAM_REQUESTS.inc(upstream=upstream, outcome="throttled")
+                if attempt >= retries:
+                    return response
+                attempt += 1
+                UPSTREAM_RETRIES.inc(upstream=upstream)
+                continue
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                if limiter is not None:
+                    limiter.record_success()
+                tracker.observe(elapsed)
+                breaker.record_success()
+                UPSTREAM_REQUESTS.inc(upstream=upstream, outcome="ok")
+                return response
+            breaker.record_failure()
+            UPSTREAM_REQUESTS.inc(upstream=upstream, outcome="server_error")
+            if attempt >= retries:
+                return response
+            logger.warning(f"{upstream} responded {response.status_code}, retrying")
+
+        attempt += 1
+        UPSTREAM_RETRIES.inc(upstream=upstream)
+        await asyncio.sleep(backoff_delay(attempt))
@@ -0,0 +1,515 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import orjson
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import async_read_session, async_session
+from app.models.book import Book
+from app.services.jobs import enqueue
+
+logger = logging.getLogger(__name__)
+
+
+SIMILAR_QUERY_SECONDS = registry.histogram(
+    "similar_books_query_seconds",
+    "Поиск похожих книг по индексу TF-IDF",
+)
+SIMILAR_INDEX_DOCS = registry.gauge(
+    "similar_books_index_docs",
+    "Книги в загруженном индексе похожих книг",
+)
+BOOKS_RECORDED = registry.counter(
+    "similar_books_recorded_total",
+    "Книги из ответов OpenLibrary, сохранённые для индекса похожих книг",
+)
+
+WORD_RE = re.compile(r"[^\W\d_]{3,}")
+STOP_WORDS = frozenset("""
+    the and for with from that this into over under about after before their there these those when where which
+    while what who whom whose will would could should have has had not but are was were been being its his her
+    they them then than also more most such only other some any all each both book books novel story stories
+    edition volume part new one two first second
+    это как для что его она они или при так же уже был была было были книга роман история
+""".split())
+# Слова тем весят больше слов описания: по ним книги связаны надёжнее
+SUBJECT_WEIGHT = 2
+PLACEHOLDER_DESCRIPTION = "Описание отсутствует"
+WORK_ID_DTYPE = "S16"
+
+
+def document_terms(description: Optional[str], subjects: Optional[Iterable[str]]) -> Counter:
+    """Частоты терминов документа: слова описания и тем плюс каждая тема целиком"""
+    terms: Counter = Counter()
+    if description and description != PLACEHOLDER_DESCRIPTION:
+        terms.update(w for w in WORD_RE.findall(description.lower()) if w not in STOP_WORDS)
+    for subject in subjects or []:
+        subject = subject.lower().strip()
+        if not subject:
+            continue
+        terms[f"subject:{subject}"] += SUBJECT_WEIGHT
+        for word in WORD_RE.findall(subject):
+            if word not in STOP_WORDS:
+                terms[word] += SUBJECT_WEIGHT
+    return terms
+
+
+def idf_weights(df: np.ndarray, doc_count: int) -> np.ndarray:
+    return (np.log((1 + doc_count) / (1 + df)) + 1).astype(np.float32)
+
+
+def _normalized(term_ids: np.ndarray, tf: np.ndarray, idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Сублинейный tf * idf с L2-нормировкой: скалярное произведение равно косинусу"""
+    weights = (1 + np.log(tf)) * idf[term_ids]
+    norm = float(np.sqrt(np.dot(weights, weights)))
+    return term_ids, (weights / norm if norm else weights).astype(np.float32)
+
+
+class Segment:
+    """
+    Неизменяемая часть индекса в отдельном каталоге, файлы .npy открываются
+    через mmap: страницы общие для всех воркеров, загрузка не читает данные.
+    Строки (документы) — CSR, столбцы (термины) — постинги для подсчёта оценок.
+    """
+
+    FILES = ("indptr", "indices", "data", "t_indptr", "t_docs", "t_data", "work_ids", "id_order")
+
+    def __init__(self, path: Path):
+        self.path = path
+        for name in self.FILES:
+            setattr(self, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+        self.size = len(self.work_ids)
+        self.vocab_size = len(self.t_indptr) - 1
+
+    def find(self, work_id: bytes) -> Optional[int]:
+        position = int(np.searchsorted(self.work_ids, work_id, sorter=self.id_order))
+        if position < self.size and self.work_ids[self.id_order[position]] == work_id:
+            return int(self.id_order[position])
+        return None
+
+    def vector(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return np.asarray(self.indices[start:end]), np.asarray(self.data[start:end])
+
+    def scores(self, term_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Косинус запроса со всеми документами сегмента: сумма по постингам терминов запроса"""
+        docs, values = [], []
+        for term, weight in zip(term_ids, weights):
+            if term >= self.vocab_size:
+                continue
+            start, end = self.t_indptr[term], self.t_indptr[term + 1]
+            if start == end:
+                continue
+            docs.append(self.t_docs[start:end])
+            values.append(self.t_data[start:end] * weight)
+        if not docs:
+            return np.zeros(self.size, dtype=np.float32)
+        return np.bincount(np.concatenate(docs), weights=np.concatenate(values), minlength=self.size)
+
+    @staticmethod
+    def write(path: Path, work_ids: List[str], vectors: List[Tuple[np.ndarray, np.ndarray]], vocab_size: int):
+        path.mkdir(parents=True)
+        lengths = np.fromiter((len(ids) for ids, _ in vectors), dtype=np.int64, count=len(vectors))
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.concatenate([ids for ids, _ in vectors]).astype(np.int32) if vectors else np.zeros(0, np.int32)
+        data = np.concatenate([w for _, w in vectors]).astype(np.float32) if vectors else np.zeros(0, np.float32)
+
+        # Транспонирование CSR -> постинги по терминам
+        rows = np.repeat(np.arange(len(vectors), dtype=np.int32), lengths)
+        order = np.argsort(indices, kind="stable")
+        t_indptr = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=vocab_size), out=t_indptr[1:])
+        encoded = np.array([w.encode("ascii") for w in work_ids], dtype=WORK_ID_DTYPE)
+
+        arrays = {
+            "indptr": indptr, "indices": indices, "data": data,
+            "t_indptr": t_indptr, "t_docs": rows[order], "t_data": data[order],
+            "work_ids": encoded, "id_order": np.argsort(encoded, kind="stable"),
+        }
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+
+
+class SimilarIndex:
+    """
+    Индекс TF-IDF по описаниям и темам книг из таблицы books. Состав — в
+    manifest.json: словарь, df и список сегментов. Сборщик публикует новую
+    версию атомарной заменой манифеста, воркеры подхватывают её не чаще раза
+    в SIMILAR_RELOAD_INTERVAL секунд.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.manifest: Optional[Dict] = None
+        self.segments: List[Segment] = []
+        self.idf: Optional[np.ndarray] = None
+        self._vocab: Optional[Dict[str, int]] = None
+        self._manifest_mtime = 0.0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def doc_count(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    def _load(self):
+        path = self.root / "manifest.json"
+        mtime = path.stat().st_mtime
+        manifest = orjson.loads(path.read_bytes())
+        segments = [Segment(self.root / name) for name in manifest["segments"]]
+        df = np.load(self.root / manifest["df"], mmap_mode="r")
+        self.idf = idf_weights(df, manifest["doc_count"])
+        self.manifest, self.segments, self._vocab = manifest, segments, None
+        self._manifest_mtime = mtime
+        SIMILAR_INDEX_DOCS.set(self.doc_count)
+        logger.info(f"Similar books index v{manifest['version']} loaded: {self.doc_count} books")
+
+    async def refresh(self):
+        """Подхватить новую версию индекса, если манифест изменился"""
+        now = time.monotonic()
+        if self.manifest is not None and now - self._checked_at < settings.SIMILAR_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = (self.root / "manifest.json").stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        async with self._lock:
+            if mtime != self._manifest_mtime:
+                await asyncio.to_thread(self._load)
+
+    def vocab(self) -> Dict[str, int]:
+        # Нужен только для книг вне индекса, поэтому загружается лениво
+        if self._vocab is None:
+            self._vocab = orjson.loads((self.root / self.manifest["vocab"]).read_bytes())
+        return self._vocab
+
+    def find_vector(self, work_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        key = work_id.encode("ascii")
+        # Более новые сегменты первыми
+        for segment in reversed(self.segments):
+            row = segment.find(key)
+            if row is not None:
+                return segment.vector(row)
+        return None
+
+    def make_vector(self, terms: Counter) -> Tuple[np.ndarray, np.ndarray]:
+        vocab = self.vocab()
+        known = [(vocab[term], count) for term, count in terms.items() if term in vocab]
+        if not known:
+            return np.zeros(0, np.int32), np.zeros(0, np.float32)
+        term_ids = np.array([t for t, _ in known], dtype=np.int64)
+        tf = np.array([c for _, c in known], dtype=np.float32)
+        return _normalized(term_ids, tf, self.idf)
+
+    def top_k(self, vector: Tuple[np.ndarray, np.ndarray], k: int, exclude: str) -> List[Tuple[str, float]]:
+        term_ids, weights = vector
+        candidates: List[Tuple[float, str]] = []
+        for segment in self.segments:
+            scores = segment.scores(term_ids, weights)
+            count = min(k + 1, segment.size)
+            if count == 0:
+                continue
+            best = np.argpartition(-scores, count - 1)[:count]
+            candidates.extend(
+                (float(scores[row]), segment.work_ids[row].decode("ascii")) for row in best if scores[row] > 0
+            )
+        seen = set()
+        result = []
+        for score, work_id in sorted(candidates, reverse=True):
+            if work_id == exclude or work_id in seen:
+                continue
+            seen.add(work_id)
+            result.append((work_id, round(score, 4)))
+            if len(result) == k:
+                break
+        return result
+
+
+similar_index = SimilarIndex(Path(settings.SIMILAR_INDEX_DIR))
+
+
+async def find_similar(work_id: str, limit: int, fallback_terms: Optional[Counter] = None) -> Optional[List[Tuple[str, float]]]:
+    """
+    Похожие книги: (work_id, косинус). None — книги нет в индексе и нет
+    fallback_terms; для книги вне индекса вектор строится по fallback_terms.
+    """
+    await similar_index.refresh()
+    if similar_index.manifest is None:
+        return None
+    started = time.perf_counter()
+    vector = similar_index.find_vector(work_id)
+    if vector is None:
+        if fallback_terms is None:
+            return None
+        vector = await asyncio.to_thread(similar_index.make_vector, fallback_terms)
+    # Подсчёт по всем сегментам занимает сотни миллисекунд на индексе из дампа
+    result = await asyncio.to_thread(similar_index.top_k, vector, limit, work_id)
+    SIMILAR_QUERY_SECONDS.observe(time.perf_counter() - started)
+    return result
+
+
+# Сохранение книг из ответов OpenLibrary: пачками в фоне, чтобы не задерживать ответ
+_pending: Dict[str, Dict] = {}
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def recorded_terms(work_id: str) -> Counter:
+    """
+    Термины книги по сохранённым описанию и темам: из ещё не записанной
+    пачки или из таблицы books. Пустой Counter — книга не сохранялась.
+    """
+    row = _pending.get(work_id)
+    if row is None:
+        try:
+            async with async_read_session() as db:
+                row = (await db.execute(
+                    select(Book.description, Book.subjects).where(Book.work_id == work_id)
+                )).mappings().one_or_none()
+        except Exception as e:
+            logger.warning(f"Recorded book lookup failed for {work_id}: {str(e)}")
+            return Counter()
+    if row is None:
+        return Counter()
+    subjects = row.get("subjects") if isinstance(row.get("subjects"), list) else []
+    return document_terms(row.get("description"), [s for s in subjects if isinstance(s, str)])
+
+
+def record_books(books: Iterable[Dict]):
+    """
+    Книги (work_id, title, authors, year, description, subjects, cover_id) для
+    индекса похожих книг. Строки из дампов OpenLibrary не перезаписываются.
+    """
+    global _flush_task
+    if not settings.SIMILAR_RECORD_BOOKS:
+        return
+    for book in books:
+        if book.get("work_id") and (book.get("subjects") or book.get("description")):
+            previous = _pending.get(book["work_id"], {})
+            merged = {**previous, **{k: v for k, v in book.items() if v}}
+            # Первая фраза из поиска не заменяет полное описание из деталей
+            if len(previous.get("description") or "") > len(book.get("description") or ""):
+                merged["description"] = previous["description"]
+            _pending[book["work_id"]] = merged
+    if _pending and (_flush_task is None or _flush_task.done()):
+        _flush_task = asyncio.create_task(_flush_later())
+
+
+async def _flush_later():
+    await asyncio.sleep(settings.SIMILAR_RECORD_FLUSH_DELAY)
+    await flush_recorded_books()
+
+
+async def flush_recorded_books():
+    if not _pending:
+        return
+    rows = list(_pending.values())
+    _pending.clear()
+    values = [{
+        "work_id": row["work_id"],
+        "title": row.get("title") or "",
+        "author": ", ".join(row.get("authors") or []),
+        "authors": row.get("authors") or [],
+        "year": row.get("year"),
+        "description": row.get("description") if row.get("description") != PLACEHOLDER_DESCRIPTION else None,
+        "subjects": row.get("subjects") or [],
+        "cover_id": row["cover_id"] if isinstance(row.get("cover_id"), int) and row["cover_id"] > 0 else None,
+    } for row in rows]
+    statement = insert(Book).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=["work_id"],
+        set_={
+            # Поиск отдаёт только первую фразу: она не затирает более полное описание из деталей
+            "description": case(
+                (func.length(statement.excluded.description) > func.coalesce(func.length(Book.description), 0),
+                 statement.excluded.description),
+                else_=Book.description,
+            ),
+            "subjects": statement.excluded.subjects,
+        },
+        where=Book.revision.is_(None),
+    )
+    try:
+        async with async_session() as db:
+            await db.execute(statement)
+            await db.commit()
+        BOOKS_RECORDED.inc(len(values))
+    except Exception as e:
+        logger.warning(f"Failed to record {len(values)} books for similar index: {str(e)}")
+        return
+
+    try:
+        await enqueue("similar_index_build", {}, dedup_key="similar_index_build",
+                      delay=settings.SIMILAR_BUILD_DELAY)
+    except Exception as e:
+        logger.warning(f"Failed to schedule similar index build: {str(e)}")
+
+
+# Сборка индекса (в фоновой задаче similar_index_build или python -m app.build_similar_index)
+
+async def _iter_documents(after_id: int, up_to_id: int, batch: int = 5000):
+    """Книги с id в (after_id, up_to_id] пачками по возрастанию id"""
+    cursor = after_id
+    while True:
+        async with async_session() as db:
+            rows = (await db.execute(
+                select(Book.id, Book.work_id, Book.description, Book.subjects)
+                .where(Book.id > cursor, Book.id <= up_to_id, Book.work_id.is_not(None))
+                .order_by(Book.id)
+                .limit(batch)
+            )).all()
+        if not rows:
+            return
+        cursor = rows[-1].id
+        yield rows
+
+
+def _tokenize(rows) -> List[Tuple[str, Counter]]:
+    docs = []
+    for row in rows:
+        subjects = row.subjects if isinstance(row.subjects, list) else []
+        terms = document_terms(row.description, [s for s in subjects if isinstance(s, str)])
+        if terms:
+            docs.append((row.work_id, terms))
+    return docs
+
+
+class IndexBuilder:
+    """
+    Инкрементальная сборка: новые книги (id больше последнего
+    проиндексированного) образуют новый сегмент с idf на момент сборки.
+    При числе сегментов больше SIMILAR_MAX_SEGMENTS или с full=True индекс
+    пересобирается целиком с актуальными idf (и с обновлёнными описаниями).
+    """
+
+    def __init__(self, root: Path = Path(settings.SIMILAR_INDEX_DIR)):
+        self.root = root
+
+    def _read_manifest(self) -> Optional[Dict]:
+        try:
+            return orjson.loads((self.root / "manifest.json").read_bytes())
+        except FileNotFoundError:
+            return None
+
+    async def build(self, full: bool = False) -> Dict:
+        self.root.mkdir(parents=True, exist_ok=True)
+        manifest = await asyncio.to_thread(self._read_manifest)
+        async with async_session() as db:
+            max_id = (await db.execute(select(func.max(Book.id)))).scalar() or 0
+
+        if manifest is not None and not full and len(manifest["segments"]) < settings.SIMILAR_MAX_SEGMENTS:
+            if max_id <= manifest["max_book_id"]:
+                return manifest
+            vocab = await asyncio.to_thread(lambda: orjson.loads((self.root / manifest["vocab"]).read_bytes()))
+            df = np.array(np.load(self.root / manifest["df"]), dtype=np.int64)
+            state = {"vocab": vocab, "df": df, "doc_count": manifest["doc_count"]}
+            segments = list(manifest["segments"])
+            version = manifest["version"] + 1
+            after_id = manifest["max_book_id"]
+        else:
+            # Полная пересборка: сначала df по всем книгам, затем сегменты
+            state = {"vocab": {}, "df": np.zeros(0, dtype=np.int64), "doc_count": 0}
+            segments = []
+            version = (manifest["version"] + 1) if manifest else 1
+            after_id = 0
+            async for rows in _iter_documents(0, max_id):
+                docs = await asyncio.to_thread(_tokenize, rows)
+                await asyncio.to_thread(self._count_df, state, docs)
+            await asyncio.to_thread(self._count_df, state, [], True)
+
+        incremental = bool(segments)
+        started = time.monotonic()
+        pending: List[Tuple[str, Counter]] = []
+        added = 0
+
+        async for rows in _iter_documents(after_id, max_id):
+            docs = await asyncio.to_thread(_tokenize, rows)
+            if incremental:
+                await asyncio.to_thread(self._count_df, state, docs)
+            pending.extend(docs)
+            if len(pending) >= settings.SIMILAR_SEGMENT_DOCS:
+                segments.append(await asyncio.to_thread(self._write_segment, state, pending, version, len(segments)))
+                added += len(pending)
+                pending = []
+        if pending or not segments:
+            segments.append(await asyncio.to_thread(self._write_segment, state, pending, version, len(segments)))
+            added += len(pending)
+
+        manifest = await asyncio.to_thread(self._publish, state, segments, version, max_id)
+        logger.info(f"Similar books index v{version}: {added} books indexed "
+                    f"({'incremental' if incremental else 'full'}) in {time.monotonic() - started:.1f}s")
+        return manifest
+
+    @staticmethod
+    def _count_df(state: Dict, docs: List[Tuple[str, Counter]], finalize: bool = False):
+        vocab = state["vocab"]
+        counts = state.setdefault("df_new", Counter())
+        for _, terms in docs:
+            for term in terms:
+                if term not in vocab:
+                    vocab[term] = len(vocab)
+                counts[vocab[term]] += 1
+            state["doc_count"] += 1
+        if finalize or len(counts) > 1_000_000:
+            df = np.zeros(len(vocab), dtype=np.int64)
+            df[:len(state["df"])] = state["df"]
+            if counts:
+                ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                df[ids] += np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+            state["df"] = df
+            counts.clear()
+
+    def _write_segment(self, state: Dict, docs: List[Tuple[str, Counter]], version: int, number: int) -> str:
+        self._count_df(state, [], True)
+        vocab = state["vocab"]
+        idf = idf_weights(state["df"], state["doc_count"])
+        vectors = []
+        for _, terms in docs:
+            term_ids = np.fromiter((vocab[t] for t in terms), dtype=np.int64, count=len(terms))
+            tf = np.fromiter(terms.values(), dtype=np.float32, count=len(terms))
+            vectors.append(_normalized(term_ids, tf, idf))
+        name = f"segment-{version:06d}-{number:03d}"
+        Segment.write(self.root / name, [work_id for work_id, _ in docs], vectors, len(vocab))
+        return name
+
+    def _publish(self, state: Dict, segments: List[str], version: int, max_id: int) -> Dict:
+        previous = self._read_manifest()
+        vocab_name, df_name = f"vocab-{version:06d}.json", f"df-{version:06d}.npy"
+        (self.root / vocab_name).write_bytes(orjson.dumps(state["vocab"]))
+        np.save(self.root / df_name, state["df"])
+        manifest = {
+            "version": version,
+            "doc_count": state["doc_count"],
+            "max_book_id": max_id,
+            "vocab": vocab_name,
+            "df": df_name,
+            "segments": segments,
+            "built_at": time.time(),
+        }
+        tmp = self.root / f"manifest.json.{os.getpid()}.tmp"
+        tmp.write_bytes(orjson.dumps(manifest))
+        os.replace(tmp, self.root / "manifest.json")
+
+        # Удаляются файлы версий старше предыдущей: воркеры, ещё не перечитавшие
+        # манифест, используют предыдущую, а открытые через mmap файлы доступны и после удаления
+        keep = set(segments) | {vocab_name, df_name, "manifest.json"}
+        if previous is not None:
+            keep |= set(previous["segments"]) | {previous["vocab"], previous["df"]}
+        for path in self.root.iterdir():
+            if path.name not in keep and not path.name.endswith(".tmp"):
+                shutil.rmtree(path) if path.is_dir() else path.unlink()
+        return manifest
@@ -0,0 +1,410 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import async_read_session, async_session
+from app.models.book import Book
+from app.models.content import Movie, Series
+from app.services.image_proxy import proxy_image_url
+from app.services.taxonomy import normalize
+
+logger = logging.getLogger(__name__)
+
+
+SUGGEST_QUERY_SECONDS = registry.histogram(
+    "suggest_query_seconds",
+    "Поиск подсказок по индексу названий",
+)
+SUGGEST_INDEX_ENTRIES = registry.gauge(
+    "suggest_index_entries",
+    "Названия в индексе подсказок по части индекса",
+    ["part"],
+)
+FILMS_RECORDED = registry.counter(
+    "suggest_films_recorded_total",
+    "Фильмы из ответов Кинопоиска, сохранённые для подсказок",
+)
+
+FILM = "film"
+SERIES = "series"
+BOOK = "book"
+
+_APOSTROPHE_RE = re.compile(r"['’`]")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+# Самый большой символ Unicode: key + _MAX_CHAR больше любого ключа с префиксом key
+_MAX_CHAR = "\U0010ffff"
+
+
+def title_key(text: str) -> str:
+    """Название для поиска: регистр, ё/е, апострофы и пунктуация не различаются"""
+    return _NON_WORD_RE.sub(" ", _APOSTROPHE_RE.sub("", normalize(text))).strip()
+
+
+class Entry(NamedTuple):
+    type: str
+    id: str
+    title: str
+    subtitle: Optional[str]
+    year: Optional[int]
+    image: Optional[str]
+    rank: float
+
+
+class PrefixIndex:
+    """
+    Отсортированный массив ключей (названия с начала каждого из первых
+    SUGGEST_WORDS слов, обрезанные до SUGGEST_KEY_LENGTH) и параллельные
+    массивы номеров записей, слов и места ключа в общем ранжировании.
+    Префикс — непрерывный диапазон массива, находится двумя бинарными
+    поисками; из диапазона берутся лучшие по рангу ключи, а не первые по
+    алфавиту. Для префиксов до SUGGEST_SHORT_PREFIX символов (самые длинные
+    диапазоны) лучшие ключи выбраны заранее. Неизменяем после построения.
+    """
+
+    def __init__(self, entries: List[Entry]):
+        self.entries = entries
+        key_length = settings.SUGGEST_KEY_LENGTH
+        keys: List[str] = []
+        ids: List[int] = []
+        words: List[int] = []
+        for number, entry in enumerate(entries):
+            for title_number, title in enumerate((entry.title, entry.subtitle if entry.type != BOOK else None)):
+                if not title:
+                    continue
+                text = title_key(title)
+                starts = [0] + [m.end() for m in re.finditer(" ", text)][:settings.SUGGEST_WORDS - 1]
+                for word, start in enumerate(starts):
+                    keys.append(text[start:start + key_length])
+                    ids.append(number)
+                    # Совпадение с начала основного названия ранжируется выше
+                    words.append(word + title_number)
+        key_array = np.array(keys, dtype=f"U{key_length}")
+        order = np.argsort(key_array, kind="stable")
+        self.keys = key_array[order]
+        self.ids = np.array(ids, dtype=np.int32)[order]
+        self.words = np.array(words, dtype=np.uint8)[order]
+
+        # Место ключа в порядке выдачи: начало названия, рейтинг, длина названия
+        ranks = np.array([entry.rank for entry in entries], dtype=np.float32)[self.ids]
+        lengths = np.array([len(entry.title) for entry in entries], dtype=np.int32)[self.ids]
+        self.priority = np.empty(len(self.keys), dtype=np.int32)
+        self.priority[np.lexsort((lengths, -ranks, self.words > 0))] = np.arange(len(self.keys), dtype=np.int32)
+
+        self.short: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {
+            length: self._top_by_prefix(length) for length in range(1, settings.SUGGEST_SHORT_PREFIX + 1)
+        }
+
+    def _top_by_prefix(self, length: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Для каждого префикса длины length: SUGGEST_SCAN_LIMIT лучших по рангу
+        позиций ключей. Возвращает (префиксы, границы групп, позиции).
+        """
+        prefixes = self.keys.astype(f"U{length}")
+        unique, starts = np.unique(prefixes, return_index=True)
+        group = np.repeat(np.arange(len(unique)), np.diff(np.append(starts, len(prefixes))))
+        order = np.lexsort((self.priority, group))
+        place = np.arange(len(order)) - starts[group[order]]
+        positions = order[place < settings.SUGGEST_SCAN_LIMIT]
+        bounds = np.searchsorted(group[positions], np.arange(len(unique) + 1))
+        return unique, bounds, positions
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _positions(self, key: str, limit: int) -> np.ndarray:
+        if len(key) in self.short:
+            unique, bounds, positions = self.short[len(key)]
+            index = int(np.searchsorted(unique, key))
+            if index == len(unique) or unique[index] != key:
+                return positions[:0]
+            return positions[bounds[index]:bounds[index + 1]][:limit]
+
+        key_length = settings.SUGGEST_KEY_LENGTH
+        low = int(np.searchsorted(self.keys, key, side="left"))
+        # Строка длиннее ключей заставила бы numpy копировать весь массив под более широкий тип
+        if len(key) < key_length:
+            high = int(np.searchsorted(self.keys, key + _MAX_CHAR, side="left"))
+        else:
+            high = int(np.searchsorted(self.keys, key, side="right"))
+        if high - low <= limit:
+            return np.arange(low, high)
+        return low + np.argpartition(self.priority[low:high], limit)[:limit]
+
+    def candidates(self, query: str, limit: int) -> Iterable[Tuple[int, Entry]]:
+        """Пары (номер слова, запись) для лучших по рангу записей, у которых слово начинается с query"""
+        positions = self._positions(query[:settings.SUGGEST_KEY_LENGTH], limit)
+        for number, word in zip(self.ids[positions].tolist(), self.words[positions].tolist()):
+            entry = self.entries[number]
+            # Ключ обрезан: длинный запрос дополнительно сверяется с полным названием
+            if len(query) > settings.SUGGEST_KEY_LENGTH and not _has_word_prefix(entry, query):
+                continue
+            yield word, entry
+
+
+def _has_word_prefix(entry: Entry, query: str) -> bool:
+    for title in (entry.title, entry.subtitle if entry.type != BOOK else None):
+        if title:
+            text = title_key(title)
+            if text.startswith(query) or f" {query}" in text:
+                return True
+    return False
+
+
+# Фильмы и книги индексируются раздельно: иначе книги (ранг 0.5) при type=book
+# отсекались бы популярными фильмами ещё до фильтра по типу
+TYPE_GROUPS = {FILM: "films", SERIES: "films", BOOK: "books"}
+
+
+class GroupedIndex:
+    """PrefixIndex на каждую группу типов TYPE_GROUPS"""
+
+    def __init__(self, entries: List[Entry]):
+        self.entries = entries
+        grouped: Dict[str, List[Entry]] = {}
+        for entry in entries:
+            grouped.setdefault(TYPE_GROUPS[entry.type], []).append(entry)
+        self.groups = {group: PrefixIndex(items) for group, items in grouped.items()}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self, query: str, limit: int,
+                   types: Optional[Tuple[str, ...]] = None) -> Iterable[Tuple[int, Entry]]:
+        """Лучшие по рангу совпадения каждой группы, в которую входит хотя бы один из types"""
+        groups = None if types is None else {TYPE_GROUPS[entry_type] for entry_type in types}
+        for group, index in self.groups.items():
+            if groups is None or group in groups:
+                yield from index.candidates(query, limit)
+
+
+class SuggestSnapshot:
+    """Основной индекс и малый индекс новых записей; читается без блокировок"""
+
+    def __init__(self, base: GroupedIndex, delta: GroupedIndex):
+        self.base = base
+        self.delta = delta
+
+    def search(self, prefix: str, limit: int, types: Optional[Tuple[str, ...]] = None) -> List[Entry]:
+        query = title_key(prefix)
+        if not query:
+            return []
+        best: Dict[Tuple[str, str], Tuple] = {}
+        for index in (self.base, self.delta):
+            for word, entry in index.candidates(query, settings.SUGGEST_SCAN_LIMIT, types):
+                if types is not None and entry.type not in types:
+                    continue
+                score = (word > 0, -entry.rank, len(entry.title), entry.title)
+                key = (entry.type, entry.id)
+                if key not in best or score < best[key][0]:
+                    best[key] = (score, entry)
+        return [entry for _, entry in sorted(best.values(), key=lambda item: item[0])[:limit]]
+
+
+def _film_entry(row, kind: str) -> Entry:
+    title = row.title or row.title_en or ""
+    return Entry(
+        kind, str(row.kp_id), title, row.title_en if row.title_en != title else None,
+        row.year, row.poster, (row.kp_rating or 5.0) / 10,
+    )
+
+
+def _book_entry(row) -> Entry:
+    # Обложка хранится номером: подписанный URL строится только для выданных подсказок
+    return Entry(
+        BOOK, row.work_id, row.title, row.author or None, row.year,
+        str(row.cover_id) if row.cover_id else None, 0.5,
+    )
+
+
+class SuggestIndex:
+    """
+    Индекс подсказок в памяти воркера. Фоновая задача раз в
+    SUGGEST_REFRESH_INTERVAL секунд дочитывает из БД новые строки (по
+    возрастанию id) в малый индекс; когда в нём больше SUGGEST_DELTA_MAX
+    записей, основной индекс пересобирается целиком в потоке. Запросы
+    читают текущий снимок, который заменяется одним присваиванием.
+    """
+
+    SOURCES = ("movies", "series", "books", "dump_books")
+
+    def __init__(self):
+        self.snapshot = SuggestSnapshot(GroupedIndex([]), GroupedIndex([]))
+        self.ready = False
+        self._last_ids: Dict[str, int] = {source: 0 for source in self.SOURCES}
+        self._dump_books = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Suggest index refresh failed: {str(e)}")
+            await asyncio.sleep(settings.SUGGEST_REFRESH_INTERVAL)
+
+    async def refresh(self):
+        started = time.monotonic()
+        last_ids, dump_books = dict(self._last_ids), self._dump_books
+        try:
+            new_entries = await self._load_new()
+        except Exception:
+            # Частично прочитанные строки будут прочитаны заново при следующей попытке
+            self._last_ids, self._dump_books = last_ids, dump_books
+            raise
+        if not new_entries and self.ready:
+            return
+        current = self.snapshot
+        if not self.ready or len(current.delta) + len(new_entries) > settings.SUGGEST_DELTA_MAX:
+            entries = current.base.entries + current.delta.entries + new_entries
+            base = await asyncio.to_thread(GroupedIndex, entries)
+            self.snapshot = SuggestSnapshot(base, GroupedIndex([]))
+            logger.info(f"Suggest index rebuilt: {len(base)} titles in {time.monotonic() - started:.1f}s")
+        else:
+            delta = await asyncio.to_thread(GroupedIndex, current.delta.entries + new_entries)
+            self.snapshot = SuggestSnapshot(current.base, delta)
+        self.ready = True
+        SUGGEST_INDEX_ENTRIES.set(len(self.snapshot.base), part="base")
+        SUGGEST_INDEX_ENTRIES.set(len(self.snapshot.delta), part="delta")
+
+    async def _load_new(self) -> List[Entry]:
+        entries: List[Entry] = []
+        async with async_read_session() as db:
+            for source, model, kind in (("movies", Movie, FILM), ("series", Series, SERIES)):
+                rows = await self._keyset(db, source, select(
+                    model.id, model.kp_id, model.title, model.title_en, model.year, model.poster, model.kp_rating
+                ).where(model.kp_id.is_not(None)))
+                entries.extend(_film_entry(row, kind) for row in rows)
+
+            # Книги из ответов OpenLibrary индексируются все, из дампов — не больше SUGGEST_DUMP_BOOKS
+            columns = (Book.id, Book.work_id, Book.title, Book.author, Book.year, Book.cover_id)
+            rows = await self._keyset(db, "books", select(*columns).where(Book.revision.is_(None)))
+            entries.extend(_book_entry(row) for row in rows if row.title)
+            dump_limit = settings.SUGGEST_DUMP_BOOKS - self._dump_books
+            if dump_limit > 0:
+                rows = await self._keyset(db, "dump_books", select(*columns).where(Book.revision.is_not(None)),
+                                          dump_limit)
+                self._dump_books += len(rows)
+                entries.extend(_book_entry(row) for row in rows if row.title)
+        return entries
+
+    async def _keyset(self, db, source: str, statement, limit: Optional[int] = None) -> List:
+        """Строки с id больше последнего прочитанного, пачками по SUGGEST_LOAD_BATCH"""
+        rows: List = []
+        model_id = statement.selected_columns[0]
+        while limit is None or len(rows) < limit:
+            batch_size = settings.SUGGEST_LOAD_BATCH if limit is None \
+                else min(settings.SUGGEST_LOAD_BATCH, limit - len(rows))
+            batch = (await db.execute(
+                statement.where(model_id > self._last_ids[source]).order_by(model_id).limit(batch_size)
+            )).all()
+            if not batch:
+                break
+            rows.extend(batch)
+            self._last_ids[source] = batch[-1].id
+            if len(batch) < batch_size:
+                break
+        return rows
+
+    def search(self, prefix: str, limit: int, types: Optional[Tuple[str, ...]] = None) -> List[Entry]:
+        started = time.perf_counter()
+        result = self.snapshot.search(prefix, limit, types)
+        SUGGEST_QUERY_SECONDS.observe(time.perf_counter() - started)
+        return result
+
+
+suggest_index = SuggestIndex()
+
+
+def to_response(entry: Entry) -> Dict:
+    image_url = entry.image
+    if entry.type == BOOK and entry.image:
+        image_url = proxy_image_url(f"https://covers.openlibrary.org/b/id/{entry.image}-M.jpg")
+    return {
+        "type": entry.type,
+        "id": entry.id,
+        "title": entry.title,
+        "subtitle": entry.subtitle,
+        "year": entry.year,
+        "image_url": image_url,
+    }
+
+
+# Сохранение фильмов из ответов Кинопоиска: пачками в фоне, чтобы не задерживать ответ
+_pending: Dict[int, Dict] = {}
+_flush_task: Optional[asyncio.Task] = None
+
+
+def record_films(films: Iterable[Dict]):
+    """Фильмы и сериалы в формате KinopoiskAPI._process_film_item для индекса подсказок"""
+    global _flush_task
+    if not settings.SUGGEST_RECORD_FILMS:
+        return
+    for film in films:
+        if isinstance(film.get("kp_id"), int) and (film.get("title_ru") or film.get("title_en")):
+            previous = _pending.get(film["kp_id"], {})
+            _pending[film["kp_id"]] = {**previous, **{k: v for k, v in film.items() if v is not None}}
+    if _pending and (_flush_task is None or _flush_task.done()):
+        _flush_task = asyncio.create_task(_flush_later())
+
+
+async def _flush_later():
+    await asyncio.sleep(settings.SUGGEST_RECORD_FLUSH_DELAY)
+    await flush_recorded_films()
+
+
+async def flush_recorded_films():
+    if not _pending:
+        return
+    films = list(_pending.values())
+    _pending.clear()
+    try:
+        async with async_session() as db:
+            for model, is_series in ((Movie, False), (Series, True)):
+                values = [{
+                    "kp_id": film["kp_id"],
+                    "imdb_id": film.get("imdb_id"),
+                    "title": film.get("title_ru") or film.get("title_en"),
+                    "title_en": film.get("title_en") or film.get("title_original"),
+                    "year": film.get("year") or film.get("start_year"),
+                    "poster": film.get("poster_url_preview"),
+                    "kp_rating": film.get("rating_kinopoisk"),
+                    "imdb_rating": film.get("rating_imdb"),
+                    "genres": film.get("genres"),
+                    "content_type": SERIES if is_series else "movie",
+                } for film in films if bool(film.get("is_series")) == is_series]
+                if not values:
+                    continue
+                statement = insert(model).values(values)
+                # Краткие ответы (поиск, подборки) не затирают поля, пришедшие с деталями
+                statement = statement.on_conflict_do_update(
+                    index_elements=["kp_id"],
+                    set_={column: func.coalesce(statement.excluded[column], getattr(model, column))
+                          for column in ("imdb_id", "title", "title_en", "year", "poster", "kp_rating", "imdb_rating",
+                                         "genres")},
+                )
+                await db.execute(statement)
+            await db.commit()
+        FILMS_RECORDED.inc(len(films))
+    except Exception as e:
+        logger.warning(f"Failed to record {len(films)} films for suggestions: {str(e)}")
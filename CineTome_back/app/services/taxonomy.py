@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import async_read_session, async_session
+from app.models.taxonomy import TaxonomyTerm, TaxonomyVersion, TAXONOMY_GENRE, TAXONOMY_AUTHOR
+
+logger = logging.getLogger(__name__)
+
+
+TAXONOMY_VERSION = registry.gauge(
+    "taxonomy_version",
+    "Версия справочника жанров и авторов, загруженная воркером",
+)
+TAXONOMY_RELOADS = registry.counter(
+    "taxonomy_reloads_total",
+    "Перезагрузки справочника жанров и авторов по результату",
+    ["result"],
+)
+
+TAXONOMY_KINDS = (TAXONOMY_GENRE, TAXONOMY_AUTHOR)
+_WORD_START_RE = re.compile(r"(?:^|[\s\-])(?=\w)")
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+class PrefixTrie:
+    """
+    Префиксное дерево по нормализованным названиям. Название вставляется с
+    начала каждого слова ("лев толстой" находится и по "тол"). В каждом узле
+    хранятся номера названий в порядке выдачи, не больше cap, поэтому поиск
+    стоит O(длина префикса) независимо от размера справочника.
+    """
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self._root: Dict = {}
+
+    def insert(self, text: str, value: int):
+        """Значения должны вставляться в порядке выдачи"""
+        for match in _WORD_START_RE.finditer(text):
+            node = self._root
+            for char in text[match.end():]:
+                node = node.setdefault(char, {})
+                ids = node.setdefault("", [])
+                # Одно название может пройти через узел с разных слов
+                if len(ids) < self.cap and (not ids or ids[-1] != value):
+                    ids.append(value)
+
+    def search(self, prefix: str, limit: int) -> List[int]:
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get("", [])[:limit]
+
+
+class TaxonomySnapshot:
+    """Неизменяемый справочник одного вида: упорядоченные названия, множество для проверки и дерево префиксов"""
+
+    def __init__(self, names: List[str]):
+        self.names: Tuple[str, ...] = tuple(names)
+        self.members: FrozenSet[str] = frozenset(names)
+        self.trie = PrefixTrie(settings.TAXONOMY_PREFIX_LIMIT)
+        for position, name in enumerate(self.names):
+            self.trie.insert(normalize(name), position)
+
+    def search(self, prefix: Optional[str], limit: Optional[int] = None) -> List[str]:
+        if not prefix or not normalize(prefix):
+            return list(self.names[:limit])
+        positions = self.trie.search(normalize(prefix), limit or settings.TAXONOMY_PREFIX_LIMIT)
+        return [self.names[p] for p in positions]
+
+
+class Taxonomy:
+    """
+    Справочник жанров и авторов в памяти воркера. Раз в TAXONOMY_CHECK_INTERVAL
+    секунд читается счётчик taxonomy_version; если он изменился, справочник
+    перечитывается целиком и заменяется новым снимком.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.snapshots: Dict[str, TaxonomySnapshot] = {kind: TaxonomySnapshot([]) for kind in TAXONOMY_KINDS}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False):
+        if not force and self.version is not None \
+                and time.monotonic() - self._checked_at < settings.TAXONOMY_CHECK_INTERVAL:
+            return
+        async with self._lock:
+            if not force and self.version is not None \
+                    and time.monotonic() - self._checked_at < settings.TAXONOMY_CHECK_INTERVAL:
+                return
+            try:
+                await self._reload_if_changed()
+                self._checked_at = time.monotonic()
+            except Exception as e:
+                TAXONOMY_RELOADS.inc(result="error")
+                logger.error(f"Taxonomy reload failed: {str(e)}")
+                if self.version is None:
+                    raise
+
+    async def _reload_if_changed(self):
+        async with async_read_session() as db:
+            version = (await db.execute(select(TaxonomyVersion.version).where(TaxonomyVersion.id == 1))).scalar()
+            if version is not None and version == self.version:
+                return
+            rows = (await db.execute(
+                select(TaxonomyTerm.kind, TaxonomyTerm.name)
+                .order_by(TaxonomyTerm.kind, TaxonomyTerm.position, TaxonomyTerm.name)
+            )).all()
+
+        names: Dict[str, List[str]] = {kind: [] for kind in TAXONOMY_KINDS}
+        for kind, name in rows:
+            names.setdefault(kind, []).append(name)
+        snapshots = await asyncio.to_thread(
+            lambda: {kind: TaxonomySnapshot(names[kind]) for kind in TAXONOMY_KINDS}
+        )
+        self.snapshots, self.version = snapshots, version or 0
+        TAXONOMY_VERSION.set(self.version)
+        TAXONOMY_RELOADS.inc(result="reloaded")
+        logger.info(f"Taxonomy v{self.version} loaded: "
+                    + ", ".join(f"{len(s.names)} {kind}s" for kind, s in snapshots.items()))
+
+    async def snapshot(self, kind: str) -> TaxonomySnapshot:
+        await self.refresh()
+        return self.snapshots[kind]
+
+    async def invalid(self, kind: str, values: Iterable[str]) -> List[str]:
+        """Значения, которых нет в справочнике"""
+        members = (await self.snapshot(kind)).members
+        return [value for value in values if value not in members]
+
+    async def update(self, kind: str, add: List[str], remove: List[str]) -> int:
+        """Добавить и удалить названия; возвращает новую версию справочника"""
+        async with async_session() as db:
+            if remove:
+                await db.execute(delete(TaxonomyTerm).where(TaxonomyTerm.kind == kind, TaxonomyTerm.name.in_(remove)))
+            if add:
+                # Новые названия — в конец списка
+                last = (await db.execute(
+                    select(func.coalesce(func.max(TaxonomyTerm.position), -1)).where(TaxonomyTerm.kind == kind)
+                )).scalar()
+                await db.execute(
+                    insert(TaxonomyTerm)
+                    .values([{"kind": kind, "name": name, "position": last + 1 + i}
+                             for i, name in enumerate(dict.fromkeys(add))])
+                    .on_conflict_do_nothing(constraint="uq_taxonomy_terms_kind_name")
+                )
+            await db.commit()
+            version = (await db.execute(select(TaxonomyVersion.version).where(TaxonomyVersion.id == 1))).scalar()
+        # Этот воркер сверит версию при следующем запросе, остальные — в течение TAXONOMY_CHECK_INTERVAL
+        self._checked_at = 0.0
+        return version
+
+
+taxonomy = Taxonomy()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import logging
+import re
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database import async_session
+from app.models.translation import Translation
+from app.services.cache import TTLCache, make_key
+from app.services.gigachat_client import get_gigachat_client
+
+logger = logging.getLogger(__name__)
+
+
+TRANSLATED_STRINGS = registry.counter(
+    "translation_strings_total",
+    "Переведённые строки по источнику перевода",
+    ["source"],
+)
+
+# Заглушки, которые подставляются самим сервисом и уже на русском
+_UNTRANSLATABLE = {"Без названия", "Описание отсутствует", "Название не указано"}
+_CYRILLIC_RE = re.compile(r"[А-Яа-яЁё]")
+
+translation_cache = TTLCache("translations", maxsize=20000, default_ttl=settings.TRANSLATION_CACHE_TTL)
+
+
+def _source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _needs_translation(text: str, target_lang: str) -> bool:
+    if not text or not text.strip() or text in _UNTRANSLATABLE:
+        return False
+    # Текст уже на русском
+    return not (target_lang == "ru" and _CYRILLIC_RE.search(text))
+
+
+def _chunks(texts: List[str]) -> Iterable[List[str]]:
+    """Разбиение на пакеты по числу строк и суммарной длине"""
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and (len(chunk) >= settings.TRANSLATION_BATCH_SIZE
+                      or size + len(text) > settings.TRANSLATION_BATCH_CHARS):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text)
+    if chunk:
+        yield chunk
+
+
+async def _load_persisted(hashes: List[str], target_lang: str) -> Dict[str, str]:
+    try:
+        async with async_session() as db:
+            result = await db.execute(
+                select(Translation.source_hash, Translation.translated_text)
+                .where(Translation.target_lang == target_lang, Translation.source_hash.in_(hashes))
+            )
+            return {source_hash: text for source_hash, text in result.all()}
+    except Exception as e:
+        logger.warning(f"Translation cache lookup failed: {str(e)}")
+        return {}
+
+
+async def _persist(translations: Dict[str, str], sources: Dict[str, str], target_lang: str):
+    try:
+        async with async_session() as db:
+            await db.execute(
+                insert(Translation)
+                .values([
+                    {
+                        "source_hash": source_hash,
+                        "target_lang": target_lang,
+                        "source_text": sources[source_hash],
+                        "translated_text": text,
+                    }
+                    for source_hash, text in translations.items()
+                ])
+                .on_conflict_do_nothing(index_elements=["source_hash", "target_lang"])
+            )
+            await db.commit()
+    except Exception as e:
+        logger.warning(f"Translation cache store failed: {str(e)}")
+
+
+async def _translate_with_llm(texts: List[str], target_lang: str) -> Dict[str, str]:
+    """Перевод пакетами через GigaChat; синхронный клиент выполняется в отдельном потоке"""
+    semaphore = asyncio.Semaphore(settings.TRANSLATION_CONCURRENCY)
+
+    def call(chunk: List[str]):
+        return get_gigachat_client().translate_batch(chunk, target_lang)
+
+    async def run(chunk: List[str]) -> Dict[str, str]:
+        async with semaphore:
+            try:
+                translated = await asyncio.to_thread(call, chunk)
+            except Exception as e:
+                logger.error(f"Batch translation failed: {str(e)}")
+                return {}
+        if translated is None:
+            return {}
+        return dict(zip(chunk, translated))
+
+    results: Dict[str, str] = {}
+    for part in await asyncio.gather(*(run(chunk) for chunk in _chunks(texts))):
+        results.update(part)
+    return results
+
+
+async def translate_texts(texts: List[str], target_lang: str = "ru") -> List[str]:
+    """
+    Перевод списка строк с сохранением порядка. Каждая уникальная строка
+    ищется в кеше процесса, затем в таблице translations (ключ - хеш текста и язык),
+    и только оставшиеся переводятся запросами к GigaChat: по пакету на каждые
+    TRANSLATION_BATCH_SIZE строк или TRANSLATION_BATCH_CHARS символов.
+    Непереведённые строки возвращаются как есть.
+    """
+    unique = [text for text in dict.fromkeys(texts) if _needs_translation(text, target_lang)]
+    if not unique:
+        return list(texts)
+
+    sources = {_source_hash(text): text for text in unique}
+    found: Dict[str, str] = {}
+
+    for source_hash, text in sources.items():
+        cached = await translation_cache.get(make_key(target_lang, source_hash))
+        if cached is not None:
+            found[text] = cached
+    if found:
+        TRANSLATED_STRINGS.inc(len(found), source="memory")
+
+    missing = {h: t for h, t in sources.items() if t not in found}
+    if missing:
+        persisted = await _load_persisted(list(missing), target_lang)
+        for source_hash, translated in persisted.items():
+            found[missing[source_hash]] = translated
+            await translation_cache.set(make_key(target_lang, source_hash), translated)
+        if persisted:
+            TRANSLATED_STRINGS.inc(len(persisted), source="db")
+
+    to_translate = [t for t in unique if t not in found]
+    if to_translate:
+        translated = await _translate_with_llm(to_translate, target_lang)
+        if translated:
+            TRANSLATED_STRINGS.inc(len(translated), source="llm")
+            by_hash = {_source_hash(text): value for text, value in translated.items()}
+            for source_hash, value in by_hash.items():
+                await translation_cache.set(make_key(target_lang, source_hash), value)
+            await _persist(by_hash, sources, target_lang)
+            found.update(translated)
+
+    return [found.get(text, text) for text in texts]
+
+
+async def translate_books(books: List[Dict], target_lang: str = "ru") -> List[Dict]:
+    """Перевод title, description и subjects у списка книг одним вызовом translate_texts"""
+    texts: List[str] = []
+    for book in books:
+        for field in ("title", "description"):
+            if isinstance(book.get(field), str):
+                texts.append(book[field])
+        texts.extend(s for s in book.get("subjects") or [] if isinstance(s, str))
+
+    mapping = dict(zip(texts, await translate_texts(texts, target_lang)))
+
+    for book in books:
+        for field in ("title", "description"):
+            if isinstance(book.get(field), str):
+                book[field] = mapping.get(book[field], book[field])
+        if book.get("subjects"):
+            book["subjects"] = [mapping.get(s, s) if isinstance(s, str) else s for s in book["subjects"]]
+    return books
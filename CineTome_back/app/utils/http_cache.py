@@ -0,0 +1,77 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+import orjson
+
+from app.core.config import settings
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def _cache_control(max_age: int, stale_while_revalidate: int) -> str:
+    return f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+
+
+def _dumps(payload: Any) -> bytes:
+    return orjson.dumps(jsonable_encoder(payload), option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_etag(payload: Any, weak: bool = False) -> str:
+    """
+    ETag по содержимому payload. Слабый ETag — для ответов, в которые после
+    подсчёта добавляются недетерминированные поля (AI-описание).
+    """
+    etag = f'"{hashlib.sha256(_dumps(payload)).hexdigest()[:32]}"'
+    return f"W/{etag}" if weak else etag
+
+
+def not_modified_response(
+        request: Request,
+        etag: str,
+        max_age: int = settings.HTTP_CACHE_MAX_AGE,
+        stale_while_revalidate: int = settings.HTTP_CACHE_STALE_WHILE_REVALIDATE,
+) -> Optional[Response]:
+    """304, если If-None-Match совпадает с etag; иначе None"""
+    if not _etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    return Response(status_code=304, headers={"ETag": etag,
+                                              "Cache-Control": _cache_control(max_age, stale_while_revalidate)})
+
+
+def conditional_json_response(
+        request: Request,
+        payload: Any,
+        max_age: int = settings.HTTP_CACHE_MAX_AGE,
+        stale_while_revalidate: int = settings.HTTP_CACHE_STALE_WHILE_REVALIDATE,
+        etag: Optional[str] = None,
+) -> Response:
+    """
+    JSON-ответ со строгим ETag (хеш содержимого) и заголовками Cache-Control.
+    Если клиент прислал совпадающий If-None-Match, возвращается 304 без тела.
+    Готовый etag (например, по версии данных) позволяет ответить 304, не сериализуя payload.
+    """
+    if etag is not None:
+        not_modified = not_modified_response(request, etag, max_age, stale_while_revalidate)
+        if not_modified is not None:
+            return not_modified
+
+    body = _dumps(payload)
+    if etag is None:
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": _cache_control(max_age, stale_while_revalidate),
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,7 +1,44 @@
 import asyncio
 import asyncpg
 import os
+import random
 import sys
+import time
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+
+
+async def wait_with_backoff(
+        check: Callable[[], Awaitable[None]],
+        timeout: float = settings.DB_WAIT_TIMEOUT,
+        initial_delay: float = settings.DB_WAIT_INITIAL_DELAY,
+        max_delay: float = settings.DB_WAIT_MAX_DELAY,
+) -> bool:
+    """
+    Повторяет check() с экспоненциально растущей задержкой (с джиттером),
+    пока проверка не пройдёт или не истечёт timeout.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempt = 1
+
+    while True:
+        try:
+            await check()
+            print("Database is ready!")
+            return True
+        except Exception as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Database is not ready after {attempt} attempts: {str(e)}")
+                return False
+            sleep_for = min(delay, remaining) * random.uniform(0.5, 1.0)
+            print(f"Attempt {attempt}: Waiting for database {sleep_for:.2f}s... ({str(e)})")
+            await asyncio.sleep(sleep_for)
+            delay = min(delay * 2, max_delay)
+            attempt += 1
+
 
 async def wait_for_db():
     # Получаем параметры из переменных окружения
@@ -11,28 +48,19 @@ async def wait_for_db():
     password = os.getenv("DB_PASS", "postgres")
     database = os.getenv("DB_NAME", "cinetome")
 
-    max_attempts = 30
-    attempt = 1
-
-    while attempt <= max_attempts:
-        try:
-            conn = await asyncpg.connect(
-                host=host,
-                port=int(port),
-                user=user,
-                password=password,
-                database=database
-            )
-            await conn.close()
-            print("Database is ready!")
-            return
-        except Exception as e:
-            print(f"Attempt {attempt}/{max_attempts}: Waiting for database... ({str(e)})")
-            await asyncio.sleep(1)
-            attempt += 1
+    async def check():
+        conn = await asyncpg.connect(
+            host=host,
+            port=int(port),
+            user=user,
+            password=password,
+            database=database
+        )
+        await conn.close()
 
-    print("Could not connect to the database after several attempts. Exiting.")
-    sys.exit(1)
+    if not await wait_with_backoff(check):
+        print("Could not connect to the database after several attempts. Exiting.")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(wait_for_db())
\ No newline at end of file
+    asyncio.run(wait_for_db())
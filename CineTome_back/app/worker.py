@@ -0,0 +1,38 @@
+"""
+Отдельный процесс-исполнитель фоновых задач (без HTTP):
+    python -m app.worker
+
+Можно запускать сколько угодно экземпляров рядом с web (в том числе с
+JOB_WORKER_EMBEDDED=False у web): задачи распределяются через SKIP LOCKED.
+"""
+import asyncio
+import logging
+import signal
+
+from app.database import engine, ping
+from app.services import job_handlers  # noqa: F401 (регистрация обработчиков фоновых задач)
+from app.services.http_clients import close_clients
+from app.services.jobs import JobWorker
+from app.wait_for_db import wait_with_backoff
+
+
+async def main():
+    if not await wait_with_backoff(lambda: ping(engine)):
+        raise SystemExit(1)
+
+    worker = JobWorker()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    worker.start()
+    await stop.wait()
+    await worker.stop()
+    await close_clients()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Бенчмарк общего кеша: сериализация записей и get/set через TTLCache
+с выбранным backend. Кеш процесса отключается (CACHE_LOCAL_TTL=0), чтобы
+каждое чтение шло в общий кеш, как у соседнего воркера.
+
+Запуск из корня проекта (Postgres — после alembic upgrade head):
+    python -m benchmarks.bench_cache --backend memory
+    CACHE_REDIS_URL=redis://localhost:6379/0 python -m benchmarks.bench_cache --backend redis
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.bench_cache --backend postgres
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("CACHE_LOCAL_TTL", "0")
+
+import orjson  # noqa: E402
+
+from app.services.cache import TTLCache  # noqa: E402
+from app.services.cache_backends import MemoryBackend, create_backend, dumps, loads  # noqa: E402
+from app.services.kinopoisk_client import KinopoiskAPI  # noqa: E402
+from benchmarks.bench_serialization import make_upstream_item  # noqa: E402
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+async def run(cache: TTLCache, payload, keys: int, ops: int, concurrency: int):
+    for i in range(keys):
+        await cache.set(f"film:{i}", payload)
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def op(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            # 9 чтений на одну запись
+            if i % 10:
+                await cache.get(f"film:{i % keys}")
+            else:
+                await cache.set(f"film:{i % keys}", payload)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(op(i) for i in range(ops)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{'ops/s':<16}{ops / elapsed:>12.0f}")
+    print(f"{'p50, ms':<16}{percentile(latencies, 0.5):>12.3f}")
+    print(f"{'p99, ms':<16}{percentile(latencies, 0.99):>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["memory", "postgres", "redis"], default="memory")
+    parser.add_argument("--keys", type=int, default=500)
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    api = KinopoiskAPI()
+    payload = api._process_film_item(make_upstream_item(1), detailed=True)
+    page = [api._process_film_item(make_upstream_item(i)) for i in range(20)]
+
+    print(f"{'payload':<16}{'json bytes':>12}{'cached bytes':>14}")
+    for name, value in (("film", payload), ("page of 20", page)):
+        print(f"{name:<16}{len(orjson.dumps(value)):>12}{len(dumps(value)):>14}")
+    assert loads(dumps(page)) == page
+
+    backend = MemoryBackend() if args.backend == "memory" else create_backend(args.backend)
+    cache = TTLCache("bench", maxsize=args.keys, default_ttl=600, backend=backend)
+    print(f"\nbackend: {args.backend}, keys: {args.keys}, ops: {args.ops}, concurrency: {args.concurrency}")
+
+    async def bench():
+        try:
+            await run(cache, payload, args.keys, args.ops, args.concurrency)
+        finally:
+            await backend.close()
+
+    asyncio.run(bench())
+
+
+if __name__ == "__main__":
+    main()
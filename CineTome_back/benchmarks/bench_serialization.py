@@ -0,0 +1,90 @@
+"""
+Микробенчмарк сериализации и сжатия списка из 250 фильмов.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_serialization [--repeat 200]
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app.services.kinopoisk_client import KinopoiskAPI
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+WORDS = ["Побег", "из", "Шоушенка", "Зелёная", "миля", "Форрест", "Гамп", "Список", "Шиндлера",
+         "Интерстеллар", "Властелин", "колец", "возвращение", "короля", "Тайна", "Коко"]
+
+
+def make_upstream_item(i: int) -> dict:
+    rnd = random.Random(i)
+    title_ru = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 4)))
+    return {
+        "filmId": 300 + i,
+        "nameRu": title_ru,
+        "nameEn": f"Film number {i}",
+        "year": str(1950 + i % 70),
+        "filmLength": f"{rnd.randint(1, 3)}:{rnd.randint(0, 59):02d}",
+        "countries": [{"country": "США"}],
+        "genres": [{"genre": "драма"}, {"genre": "криминал"}],
+        "rating": f"{rnd.uniform(7, 9.5):.1f}",
+        "ratingVoteCount": rnd.randint(1000, 900000),
+        "posterUrl": f"https://kinopoiskapiunofficial.tech/images/posters/kp/{300 + i}.jpg",
+        "posterUrlPreview": f"https://kinopoiskapiunofficial.tech/images/posters/kp_small/{300 + i}.jpg",
+        "shortDescription": "Бухгалтер Энди Дюфрейн обвинён в убийстве собственной жены и её любовника.",
+    }
+
+
+def starlette_json(payload) -> bytes:
+    """То, что делает FastAPI по умолчанию: jsonable_encoder + json.dumps"""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def orjson_direct(payload) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def timeit(func, payload, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(payload)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    api = KinopoiskAPI()
+    payload = [api._process_film_item(make_upstream_item(i)) for i in range(250)]
+
+    print(f"Payload: {len(payload)} films\n")
+    print(f"{'serializer':<28}{'ms/op':>10}")
+    for name, func in (("jsonable_encoder + json", starlette_json), ("orjson", orjson_direct)):
+        print(f"{name:<28}{timeit(func, payload, args.repeat):>10.3f}")
+
+    body = orjson_direct(payload)
+    print(f"\n{'encoding':<28}{'bytes':>10}{'ms/op':>10}")
+    print(f"{'identity':<28}{len(body):>10}{0:>10.3f}")
+    encoders = [("gzip (level 9)", lambda b: gzip.compress(b, compresslevel=9))]
+    if brotli is not None:
+        encoders.append(("brotli (quality 4)", lambda b: brotli.compress(b, quality=4)))
+    for name, encode in encoders:
+        encoded = encode(body)
+        print(f"{name:<28}{len(encoded):>10}{timeit(encode, body, args.repeat):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Сравнение двух git-ревизий под одинаковой нагрузкой benchmarks.load_test.
+Каждая ревизия выкладывается во временный git worktree; заглушки и генератор
+нагрузки берутся из текущего дерева, поэтому различается только код приложения.
+Ревизии запускаются поочерёдно (base, head, base, head...), для каждой метрики
+берётся медиана по раундам. Код выхода 1 — регрессия p95 или p99 больше порога.
+Обе ревизии должны поддерживать KINOPOISK_API_BASE и OPENLIBRARY_BASE_URL,
+иначе приложение пойдёт в настоящие API.
+
+Запуск из корня проекта (миграции применяются один раз, из head):
+    python -m benchmarks.compare_revisions origin/main HEAD --rounds 2 -- --duration 60 --concurrency 32
+    python -m benchmarks.compare_revisions HEAD~1 .        # "." — текущее рабочее дерево с правками
+"""
+import argparse
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import orjson
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def git(*args: str, cwd: Path = PROJECT_ROOT) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+def checkout(revision: str, workdir: Path) -> Path:
+    """Каталог приложения для ревизии; "." — текущее рабочее дерево"""
+    if revision == ".":
+        return PROJECT_ROOT
+    commit = git("rev-parse", "--verify", f"{revision}^{{commit}}")
+    target = workdir / commit[:12]
+    if not target.exists():
+        git("worktree", "add", "--detach", str(target), commit)
+    # Проект может лежать в подкаталоге репозитория
+    return target / git("rev-parse", "--show-prefix")
+
+
+def run_round(app_dir: Path, output: Path, load_args: List[str]):
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.load_test", "--app-dir", str(app_dir),
+         "--skip-migrations", "--output", str(output), *load_args],
+        cwd=PROJECT_ROOT, check=True,
+    )
+
+
+def merge_rounds(reports: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Медиана каждой метрики по раундам для каждого маршрута"""
+    routes = set().union(*(report["routes"] for report in reports)) | {"TOTAL"}
+    merged = {}
+    for route in routes:
+        stats = [report["total"] if route == "TOTAL" else report["routes"].get(route) for report in reports]
+        stats = [s for s in stats if s]
+        merged[route] = {metric: statistics.median(s[metric] for s in stats) for metric in METRICS}
+        merged[route]["errors"] = sum(s["errors"] for s in stats)
+    return merged
+
+
+def change(base: float, head: float) -> float:
+    return (head - base) / base * 100 if base else 0.0
+
+
+def compare(base: Dict, head: Dict, threshold: float) -> List[str]:
+    header = f"{'route':<38}" + "".join(f"{metric:>20}" for metric in METRICS) + f"{'errors':>12}"
+    print(header)
+    print("-" * len(header))
+    regressions = []
+    for route in sorted(set(base) & set(head), key=lambda r: (r == "TOTAL", r)):
+        cells = []
+        for metric in METRICS:
+            delta = change(base[route][metric], head[route][metric])
+            # Для rps рост — улучшение, для задержек — ухудшение
+            worse = -delta if metric == "rps" else delta
+            mark = "!" if worse > threshold else " "
+            if metric in ("p95_ms", "p99_ms") and worse > threshold:
+                regressions.append(f"{route} {metric} {base[route][metric]:.1f} -> {head[route][metric]:.1f} ms")
+            cells.append(f"{head[route][metric]:>10.1f} {delta:>+7.1f}%{mark}")
+        errors = f"{base[route]['errors']}->{head[route]['errors']}"
+        print(f"{route:<38}" + "".join(cells) + f"{errors:>12}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="Базовая ревизия")
+    parser.add_argument("head", nargs="?", default="HEAD", help="Проверяемая ревизия ('.' — рабочее дерево)")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--threshold", type=float, default=10.0, help="Допустимое ухудшение метрики, %%")
+    parser.add_argument("--output-dir", type=Path, help="Куда сохранить JSON каждого раунда")
+    parser.add_argument("load_args", nargs=argparse.REMAINDER, help="Аргументы load_test после --")
+    args = parser.parse_args()
+    load_args = [a for a in args.load_args if a != "--"]
+
+    workdir = Path(tempfile.mkdtemp(prefix="cinetome-revs-"))
+    output_dir = args.output_dir or workdir / "results"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        dirs = {"base": checkout(args.base, workdir), "head": checkout(args.head, workdir)}
+        # Схема из head; миграции аддитивные, база head подходит и для base
+        subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=dirs["head"], check=True)
+
+        reports: Dict[str, List[Dict]] = {"base": [], "head": []}
+        for round_number in range(1, args.rounds + 1):
+            for name in ("base", "head"):
+                print(f"== round {round_number}: {name} ({getattr(args, name)})", file=sys.stderr)
+                output = output_dir / f"{name}-{round_number}.json"
+                run_round(dirs[name], output, load_args)
+                reports[name].append(orjson.loads(output.read_bytes()))
+    finally:
+        for path in workdir.iterdir():
+            if path.is_dir() and path.name != "results":
+                subprocess.run(["git", "worktree", "remove", "--force", str(path)], cwd=PROJECT_ROOT)
+        if args.output_dir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{args.base} -> {args.head}, медиана по {args.rounds} раунд(ам); значения head и изменение к base\n")
+    regressions = compare(merge_rounds(reports["base"]), merge_rounds(reports["head"]), args.threshold)
+    if regressions:
+        print(f"\nРегрессии больше {args.threshold:.0f}%:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
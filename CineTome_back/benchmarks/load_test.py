@@ -0,0 +1,419 @@
+"""
+Сквозной нагрузочный тест: приложение с локальным Postgres и заглушками
+Кинопоиска, OpenLibrary и GigaChat (benchmarks.stub_upstreams), смешанная
+нагрузка — вход, поиск, карточки с AI-описанием, обновление предпочтений и
+оценки. Выводит пропускную способность и p50/p95/p99 по маршрутам.
+
+Запуск из корня проекта (Postgres из DB_* в окружении, миграции применяются):
+    python -m benchmarks.load_test --duration 60 --concurrency 32 --output result.json
+
+Код приложения можно взять из другого каталога (так работает compare_revisions),
+заглушки и генератор нагрузки всегда из текущего:
+    python -m benchmarks.load_test --app-dir /tmp/cinetome-base
+
+Против уже запущенного приложения (ничего не стартует, заглушки не используются):
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+import orjson
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+FILM_QUERIES = ["Пираты", "Матрица", "Интерстеллар", "Властелин колец", "Гарри Поттер", "Шерлок",
+                "Друзья", "Бригада", "Зелёная миля", "Брат", "Тайна Коко", "Дюна"]
+BOOK_QUERIES = ["Harry Potter", "Tolkien", "Dune", "War and Peace", "Foundation", "Sherlock Holmes",
+                "Dostoevsky", "Orwell", "Pride and Prejudice", "The Hobbit"]
+COLLECTIONS = ["TOP_250_BEST_FILMS", "TOP_100_POPULAR_FILMS", "TOP_AWAIT_FILMS"]
+GENRES = ["драма", "комедия", "фантастика", "триллер", "детектив", "фэнтези"]
+AUTHORS = ["Толстой", "Достоевский", "Tolkien", "Rowling", "Herbert", "Asimov"]
+
+# Переменные приложения, задаваемые бенчмарком; --env переопределяет их
+APP_ENV = {
+    "KINOPOISK_API_KEY": "bench",
+    "GIGACHAT_AUTH_KEY": "bench",
+    "GIGACHAT_CLIENT_ID": "bench",
+    "GIGACHAT_SCOPE": "GIGACHAT_API_PERS",
+    "UPSTREAM_TRANSPORT_MODE": "live",
+    # Заглушки не ограничивают частоту: иначе тест измерял бы ожидание лимитера
+    "KP_RATE_LIMIT_PER_SECOND": "100000",
+    "KP_RATE_LIMIT_BURST": "100000",
+    "IMAGE_PROXY_PUBLIC_URL": "",
+    "JOB_WORKER_EMBEDDED": "False",
+}
+
+
+@dataclass
+class BenchUser:
+    email: str
+    password: str
+    token: Optional[str] = None
+
+
+class Recorder:
+    """Задержки и статусы по маршрутам; учитываются только запросы после прогрева"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.recording = False
+        self.started = 0.0
+        self.finished = 0.0
+
+    def start(self):
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        self.finished = time.perf_counter()
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        if self.recording:
+            self.latencies[route].append(time.perf_counter() - started)
+            self.statuses[route][status] += 1
+        return response
+
+    def report(self) -> Dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        routes = {}
+        for route in sorted(self.latencies):
+            routes[route] = summarize(self.latencies[route], self.statuses[route], elapsed)
+        all_latencies = [value for values in self.latencies.values() for value in values]
+        all_statuses = sum(self.statuses.values(), Counter())
+        return {"duration": elapsed, "routes": routes, "total": summarize(all_latencies, all_statuses, elapsed)}
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def summarize(latencies: List[float], statuses: Counter, elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+    # Ошибки — 5xx и сбои соединения; 4xx (например, несуществующий фильм) — нормальные ответы
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+    return {
+        "requests": len(ordered),
+        "rps": len(ordered) / elapsed,
+        "errors": errors,
+        "p50_ms": percentile(ordered, 0.50),
+        "p95_ms": percentile(ordered, 0.95),
+        "p99_ms": percentile(ordered, 0.99),
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+        "statuses": dict(statuses),
+    }
+
+
+def film_id(rnd: random.Random) -> int:
+    # Популярные фильмы запрашиваются чаще: 80% запросов приходится на 50 id
+    if rnd.random() < 0.8:
+        return 300 + rnd.randrange(50)
+    return 300 + rnd.randrange(20000)
+
+
+def work_id(rnd: random.Random) -> str:
+    if rnd.random() < 0.8:
+        return f"OL{1000 + rnd.randrange(50)}W"
+    return f"OL{1000 + rnd.randrange(20000)}W"
+
+
+def auth(user: BenchUser) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {user.token}"}
+
+
+async def login(rec: Recorder, client: httpx.AsyncClient, user: BenchUser, rnd: random.Random):
+    response = await rec.request(client, "POST /auth/login", "POST", "/auth/login",
+                                 json={"email": user.email, "password": user.password})
+    if response is not None and response.status_code == 200:
+        user.token = response.json()["access_token"]
+
+
+async def movie_search(rec, client, user, rnd):
+    await rec.request(client, "GET /api/kp/search", "GET", "/api/kp/search",
+                      params={"query": rnd.choice(FILM_QUERIES), "page": rnd.choice((1, 1, 1, 2))})
+
+
+async def book_search(rec, client, user, rnd):
+    await rec.request(client, "GET /books/search/", "GET", "/books/search/",
+                      params={"query": rnd.choice(BOOK_QUERIES), "limit": 10, "page": rnd.choice((1, 1, 2))})
+
+
+async def collection(rec, client, user, rnd):
+    await rec.request(client, "GET /api/kp/collections", "GET", "/api/kp/collections",
+                      params={"type": rnd.choice(COLLECTIONS), "page": rnd.choice((1, 1, 2, 3))})
+
+
+async def film_details(rec, client, user, rnd):
+    await rec.request(client, "GET /api/kp/films/{id}", "GET", f"/api/kp/films/{film_id(rnd)}")
+
+
+async def film_details_summary(rec, client, user, rnd):
+    await rec.request(client, "GET /api/kp/films/{id}?with_summary", "GET", f"/api/kp/films/{film_id(rnd)}",
+                      params={"with_summary": "true"}, headers=auth(user))
+
+
+async def book_details(rec, client, user, rnd):
+    await rec.request(client, "GET /books/{work_id}", "GET", f"/books/{work_id(rnd)}")
+
+
+async def book_details_summary(rec, client, user, rnd):
+    await rec.request(client, "GET /books/{work_id}?with_summary", "GET", f"/books/{work_id(rnd)}",
+                      params={"with_summary": "true"}, headers=auth(user))
+
+
+async def profile(rec, client, user, rnd):
+    await rec.request(client, "GET /users/me", "GET", "/users/me", headers=auth(user))
+
+
+async def home_feed(rec, client, user, rnd):
+    await rec.request(client, "GET /feed/me", "GET", "/feed/me", headers=auth(user))
+
+
+async def update_preferences(rec, client, user, rnd):
+    await rec.request(client, "POST /preferences/update", "POST", "/preferences/update", headers=auth(user), json={
+        "favorite_genres": rnd.sample(GENRES, 2),
+        "favorite_authors": rnd.sample(AUTHORS, 2),
+        "reading_goals": f"{rnd.randint(5, 50)} книг в год",
+    })
+
+
+async def add_rating(rec, client, user, rnd):
+    is_movie = rnd.random() < 0.5
+    await rec.request(client, "POST /preferences/add-rating", "POST", "/preferences/add-rating",
+                      headers=auth(user), json={
+                          "item_id": str(film_id(rnd)) if is_movie else work_id(rnd),
+                          "item_type": "movie" if is_movie else "book",
+                          "rating": rnd.randint(1, 5),
+                          "timestamp": datetime.now(timezone.utc).isoformat(),
+                      })
+
+
+# Сценарий и его вес в смеси
+WORKLOAD = [
+    (login, 4),
+    (movie_search, 18),
+    (book_search, 14),
+    (collection, 8),
+    (film_details, 18),
+    (film_details_summary, 4),
+    (book_details, 12),
+    (book_details_summary, 4),
+    (profile, 6),
+    (home_feed, 6),
+    (update_preferences, 4),
+    (add_rating, 8),
+]
+
+
+async def register_users(client: httpx.AsyncClient, count: int) -> List[BenchUser]:
+    run_id = uuid4().hex[:8]
+    users = [BenchUser(f"bench-{run_id}-{i}@example.com", f"bench-password-{i}") for i in range(count)]
+    rec = Recorder()
+    for user in users:
+        response = await client.post("/auth/register", json={
+            "username": user.email.split("@")[0], "email": user.email, "password": user.password,
+        })
+        if response.status_code >= 400:
+            raise RuntimeError(f"Registration failed: {response.status_code} {response.text}")
+        await login(rec, client, user, random.Random())
+        if user.token is None:
+            raise RuntimeError(f"Login failed for {user.email}")
+    return users
+
+
+async def run_workload(base_url: str, concurrency: int, duration: float, warmup: float,
+                       users: int, seed: int) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        bench_users = await register_users(client, users)
+        scenarios = [scenario for scenario, _ in WORKLOAD]
+        weights = [weight for _, weight in WORKLOAD]
+        rec = Recorder()
+        deadline = time.perf_counter() + warmup + duration
+
+        async def worker(index: int):
+            rnd = random.Random(seed * 1000 + index)
+            user = bench_users[index % len(bench_users)]
+            while time.perf_counter() < deadline:
+                await rnd.choices(scenarios, weights)[0](rec, client, user, rnd)
+
+        async def measure():
+            await asyncio.sleep(warmup)
+            rec.start()
+            await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+
+        await asyncio.gather(measure(), *(worker(i) for i in range(concurrency)))
+        rec.stop()
+        return rec.report()
+
+
+def print_report(report: Dict):
+    header = f"{'route':<38}{'req':>8}{'rps':>9}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["routes"].items()) + [("TOTAL", report["total"])]
+    for route, stats in rows:
+        print(f"{route:<38}{stats['requests']:>8}{stats['rps']:>9.1f}{stats['errors']:>6}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def git_revision(path: Path) -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_process(args: List[str], cwd: Path, env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_process(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def wait_ready(url: str, process: subprocess.Popen, log_path: Path, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with {process.returncode}, see {log_path}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout}s, see {log_path}")
+
+
+def parse_env(pairs: List[str]) -> Dict[str, str]:
+    result = {}
+    for pair in pairs:
+        name, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--env expects KEY=VALUE, got {pair}")
+        result[name] = value
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Уже запущенное приложение; иначе приложение и заглушки стартуют здесь")
+    parser.add_argument("--app-dir", type=Path, default=PROJECT_ROOT, help="Каталог с кодом приложения")
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--workers", type=int, default=1, help="Число воркеров uvicorn приложения")
+    parser.add_argument("--concurrency", type=int, default=32, help="Одновременные виртуальные пользователи")
+    parser.add_argument("--users", type=int, default=16, help="Зарегистрированные пользователи")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность измерения, с")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев без учёта в результатах, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stub-latency-ms", type=float, default=30)
+    parser.add_argument("--stub-llm-latency-ms", type=float, default=250)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE для приложения, можно несколько")
+    parser.add_argument("--skip-migrations", action="store_true")
+    parser.add_argument("--log-dir", type=Path, help="Логи приложения и заглушек (по умолчанию во временном каталоге)")
+    parser.add_argument("--output", type=Path, help="Результат в JSON")
+    args = parser.parse_args()
+
+    meta = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "workers": args.workers,
+        "seed": args.seed,
+        "stub_latency_ms": args.stub_latency_ms,
+        "stub_llm_latency_ms": args.stub_llm_latency_ms,
+    }
+    if args.base_url:
+        report = asyncio.run(run_workload(args.base_url, args.concurrency, args.duration,
+                                          args.warmup, args.users, args.seed))
+        meta["base_url"] = args.base_url
+        finish(report, meta, args.output)
+        return
+
+    app_dir = args.app_dir.resolve()
+    log_dir = args.log_dir or Path(tempfile.mkdtemp(prefix="cinetome-load-"))
+    log_dir.mkdir(parents=True, exist_ok=True)
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+
+    stub_env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT),
+                    STUB_LATENCY_MS=str(args.stub_latency_ms), STUB_LLM_LATENCY_MS=str(args.stub_llm_latency_ms))
+    app_env = dict(os.environ, PYTHONPATH=str(app_dir), **APP_ENV)
+    app_env.update({
+        "KINOPOISK_API_BASE": f"{stub_url}/kinopoisk/api/v2.2/",
+        "OPENLIBRARY_BASE_URL": f"{stub_url}/openlibrary",
+        "GIGACHAT_BASE_URL": f"{stub_url}/gigachat/api/v1",
+        "GIGACHAT_AUTH_URL": f"{stub_url}/gigachat/oauth",
+    })
+    app_env.update(parse_env(args.env))
+
+    stubs = app = None
+    try:
+        stubs = start_process(
+            [sys.executable, "-m", "uvicorn", "benchmarks.stub_upstreams:app", "--port", str(args.stub_port),
+             "--no-access-log", "--log-level", "warning"],
+            PROJECT_ROOT, stub_env, log_dir / "stubs.log",
+        )
+        wait_ready(f"{stub_url}/docs", stubs, log_dir / "stubs.log")
+
+        if not args.skip_migrations:
+            subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=app_dir, env=app_env, check=True)
+
+        app = start_process(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port),
+             "--workers", str(args.workers), "--no-access-log", "--log-level", "warning"],
+            app_dir, app_env, log_dir / "app.log",
+        )
+        wait_ready(f"{app_url}/docs", app, log_dir / "app.log")
+        print(f"App {app_dir} ready, logs in {log_dir}", file=sys.stderr)
+
+        report = asyncio.run(run_workload(app_url, args.concurrency, args.duration,
+                                          args.warmup, args.users, args.seed))
+    finally:
+        stop_process(app)
+        stop_process(stubs)
+
+    meta.update({"app_dir": str(app_dir), "revision": git_revision(app_dir)})
+    finish(report, meta, args.output)
+
+
+def finish(report: Dict, meta: Dict, output: Optional[Path]):
+    report["meta"] = meta
+    print_report(report)
+    if output:
+        output.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Локальные заглушки Кинопоиска, OpenLibrary и GigaChat для нагрузочного теста.
+Ответы детерминированы по id/запросу и повторяют поля настоящих API, которые
+читает приложение; задержка задаётся переменными окружения.
+
+Запуск отдельно (обычно стартует benchmarks.load_test):
+    STUB_LATENCY_MS=40 STUB_LLM_LATENCY_MS=300 \\
+        uvicorn benchmarks.stub_upstreams:app --port 8900
+
+Адреса для приложения:
+    KINOPOISK_API_BASE=http://127.0.0.1:8900/kinopoisk/api/v2.2/
+    OPENLIBRARY_BASE_URL=http://127.0.0.1:8900/openlibrary
+    GIGACHAT_BASE_URL=http://127.0.0.1:8900/gigachat/api/v1
+    GIGACHAT_AUTH_URL=http://127.0.0.1:8900/gigachat/oauth
+"""
+import asyncio
+import os
+import random
+import time
+import zlib
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "30"))
+LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "250"))
+# Разброс задержки: равномерно в пределах ±JITTER от базовой
+JITTER = float(os.getenv("STUB_LATENCY_JITTER", "0.3"))
+PAGE_SIZE = 20
+TOTAL_PAGES = 13
+
+WORDS = ["Побег", "из", "Шоушенка", "Зелёная", "миля", "Форрест", "Гамп", "Список", "Шиндлера",
+         "Интерстеллар", "Властелин", "колец", "возвращение", "короля", "Тайна", "Коко"]
+BOOK_WORDS = ["Harry", "Potter", "Ring", "Lord", "Dune", "Foundation", "War", "Peace", "Night",
+              "Garden", "Silent", "Stone", "River", "Empire", "Shadow", "Glass"]
+GENRES = ["драма", "криминал", "комедия", "фантастика", "триллер", "мелодрама", "приключения"]
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+
+async def delay(base_ms: float):
+    if base_ms > 0:
+        await asyncio.sleep(base_ms * random.uniform(1 - JITTER, 1 + JITTER) / 1000)
+
+
+def seeded(*parts) -> random.Random:
+    return random.Random(zlib.crc32("|".join(map(str, parts)).encode("utf-8")))
+
+
+def film_item(film_id: int) -> dict:
+    rnd = seeded("film", film_id)
+    serial = film_id % 5 == 0
+    return {
+        "filmId": film_id,
+        "kinopoiskId": film_id,
+        "imdbId": f"tt{film_id:07d}",
+        "nameRu": " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 4))),
+        "nameEn": f"Film number {film_id}",
+        "nameOriginal": f"Film number {film_id}",
+        "posterUrl": f"https://kinopoiskapiunofficial.tech/images/posters/kp/{film_id}.jpg",
+        "posterUrlPreview": f"https://kinopoiskapiunofficial.tech/images/posters/kp_small/{film_id}.jpg",
+        "year": 1950 + film_id % 75,
+        "filmLength": rnd.randint(80, 190),
+        "countries": [{"country": "США"}],
+        "genres": [{"genre": g} for g in rnd.sample(GENRES, 2)],
+        "ratingKinopoisk": round(rnd.uniform(5, 9.5), 1),
+        "ratingImdb": round(rnd.uniform(5, 9.5), 1),
+        "rating": f"{rnd.uniform(5, 9.5):.1f}",
+        "ratingVoteCount": rnd.randint(1000, 900000),
+        "type": "TV_SERIES" if serial else "FILM",
+        "serial": serial,
+        "shortDescription": "Бухгалтер Энди Дюфрейн обвинён в убийстве собственной жены и её любовника.",
+    }
+
+
+def film_details(film_id: int) -> dict:
+    rnd = seeded("details", film_id)
+    item = film_item(film_id)
+    item.update({
+        "slogan": "Страх — это кандалы. Надежда — это свобода",
+        "description": " ".join(rnd.choice(WORDS) for _ in range(80)),
+        "ratingAgeLimits": "age16",
+        "facts": [],
+    })
+    if item["serial"]:
+        item.update({"startYear": item["year"], "endYear": item["year"] + rnd.randint(1, 8)})
+    return item
+
+
+def page_of_films(seed, page: int) -> dict:
+    rnd = seeded(seed, page)
+    items = [film_item(rnd.randint(300, 5_000_000)) for _ in range(PAGE_SIZE)]
+    return {"total": PAGE_SIZE * TOTAL_PAGES, "totalPages": TOTAL_PAGES, "pagesCount": TOTAL_PAGES,
+            "items": items, "films": items}
+
+
+@app.get("/kinopoisk/api/v2.2/films")
+async def kp_films(keyword: str = "", type: str = "ALL", order: str = "RATING", page: int = 1):
+    await delay(LATENCY_MS)
+    return page_of_films(f"films:{keyword}:{type}:{order}", page)
+
+
+@app.get("/kinopoisk/api/v2.2/films/top")
+@app.get("/kinopoisk/api/v2.2/films/collections")
+async def kp_top(type: str = "TOP_250_BEST_FILMS", page: int = 1):
+    await delay(LATENCY_MS)
+    return page_of_films(f"top:{type}", page)
+
+
+@app.get("/kinopoisk/api/v2.2/films/{film_id}")
+async def kp_film(film_id: int):
+    await delay(LATENCY_MS)
+    if film_id % 97 == 0:
+        # Доля несуществующих фильмов, как у реального API
+        raise HTTPException(status_code=404, detail="Film not found")
+    return film_details(film_id)
+
+
+@app.get("/kinopoisk/api/v2.2/films/{film_id}/seasons")
+async def kp_seasons(film_id: int):
+    await delay(LATENCY_MS)
+    rnd = seeded("seasons", film_id)
+    seasons = []
+    for number in range(1, rnd.randint(1, 6) + 1):
+        seasons.append({
+            "number": number,
+            "episodes": [{
+                "seasonNumber": number,
+                "episodeNumber": episode,
+                "nameRu": f"Серия {episode}",
+                "nameEn": f"Episode {episode}",
+                "synopsis": None,
+                "releaseDate": "2020-01-01",
+            } for episode in range(1, rnd.randint(6, 12) + 1)],
+        })
+    return {"total": len(seasons), "items": seasons}
+
+
+@app.get("/kinopoisk/api/v2.2/films/{film_id}/sequels_and_prequels")
+async def kp_sequels(film_id: int):
+    await delay(LATENCY_MS)
+    return [film_item(film_id + offset) for offset in (1, 2)]
+
+
+def book_doc(work_number: int) -> dict:
+    rnd = seeded("book", work_number)
+    return {
+        "key": f"/works/OL{work_number}W",
+        "title": " ".join(rnd.choice(BOOK_WORDS) for _ in range(rnd.randint(1, 4))),
+        "author_name": [f"Author {rnd.randint(1, 500)}"],
+        "first_publish_year": rnd.randint(1850, 2023),
+        "cover_i": rnd.randint(1, 14_000_000),
+        "subjects": rnd.sample(["Fiction", "Fantasy", "History", "Science", "Drama"], 2),
+        "edition_count": rnd.randint(1, 300),
+    }
+
+
+@app.get("/openlibrary/search.json")
+async def ol_search(q: str = "", author: str = "", limit: int = 10, page: int = 1, sort: str = ""):
+    await delay(LATENCY_MS)
+    rnd = seeded("search", q, author, sort, page)
+    docs = [book_doc(rnd.randint(1, 30_000_000)) for _ in range(limit)]
+    return {"numFound": limit * TOTAL_PAGES, "start": (page - 1) * limit, "docs": docs}
+
+
+@app.get("/openlibrary/works/{work_id}.json")
+async def ol_work(work_id: str):
+    await delay(LATENCY_MS)
+    doc = book_doc(int(work_id.strip("OLW") or 0))
+    return {
+        "key": doc["key"],
+        "title": doc["title"],
+        "authors": [{"name": name} for name in doc["author_name"]],
+        "first_publish_year": doc["first_publish_year"],
+        "description": "A long description of the book. " * 10,
+        "covers": [doc["cover_i"]],
+    }
+
+
+@app.post("/gigachat/oauth")
+async def gigachat_oauth():
+    await delay(LATENCY_MS)
+    return {"access_token": "stub-token", "expires_at": int((time.time() + 1800) * 1000)}
+
+
+@app.post("/gigachat/api/v1/chat/completions")
+async def gigachat_chat(body: dict):
+    await delay(LLM_LATENCY_MS)
+    prompt = body.get("messages", [{}])[-1].get("content", "")
+    if prompt.rstrip().endswith("]"):
+        # Пакетный перевод: массив строк идёт последней строкой промпта, возвращается без изменений
+        content = prompt.rsplit("\n", 1)[-1]
+    else:
+        content = "Краткое содержание: " + " ".join(seeded("llm", prompt).choice(WORDS) for _ in range(60))
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}, "index": 0, "finish_reason": "stop"}],
+        "created": int(time.time()),
+        "model": body.get("model", "GigaChat"),
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": (len(prompt) + len(content)) // 4},
+        "object": "chat.completion",
+    }
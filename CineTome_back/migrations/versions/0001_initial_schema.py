@@ -0,0 +1,88 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    # Таблицы могли быть созданы раньше через Base.metadata.create_all,
+    # поэтому создаём только отсутствующие
+    existing = _existing_tables()
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(length=50)),
+            sa.Column("email", sa.String()),
+            sa.Column("hashed_password", sa.String()),
+            sa.Column("profile_picture", sa.LargeBinary(), nullable=True),
+            sa.Column("preferences", sa.JSON()),
+            sa.Column("ratings_history", sa.JSON()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "books" not in existing:
+        op.create_table(
+            "books",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("work_id", sa.String()),
+            sa.Column("title", sa.String()),
+            sa.Column("author", sa.String()),
+            sa.Column("year", sa.Integer(), nullable=True),
+            sa.Column("description", sa.String(), nullable=True),
+        )
+        op.create_index("ix_books_id", "books", ["id"])
+        op.create_index("ix_books_work_id", "books", ["work_id"], unique=True)
+        op.create_index("ix_books_title", "books", ["title"])
+
+    for table, extra in (
+        ("movies", []),
+        ("series", [
+            sa.Column("episode_count", sa.Integer(), nullable=True),
+            sa.Column("season_count", sa.Integer(), nullable=True),
+            sa.Column("seasons", sa.JSON(), nullable=True),
+        ]),
+    ):
+        if table in existing:
+            continue
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("kp_id", sa.Integer()),
+            sa.Column("imdb_id", sa.String(), nullable=True),
+            sa.Column("title", sa.String()),
+            sa.Column("year", sa.Integer()),
+            sa.Column("poster", sa.String(), nullable=True),
+            sa.Column("genres", sa.JSON()),
+            sa.Column("countries", sa.JSON()),
+            sa.Column("kp_rating", sa.Float(), nullable=True),
+            sa.Column("imdb_rating", sa.Float(), nullable=True),
+            sa.Column("duration", sa.Integer(), nullable=True),
+            sa.Column("content_type", sa.String()),
+            *extra,
+        )
+        op.create_index(f"ix_{table}_id", table, ["id"])
+        op.create_index(f"ix_{table}_kp_id", table, ["kp_id"], unique=True)
+        op.create_index(f"ix_{table}_title", table, ["title"])
+
+
+def downgrade():
+    for table in ("series", "movies", "books", "users"):
+        op.drop_table(table)
@@ -0,0 +1,31 @@
+"""translations cache
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "translations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("source_hash", sa.String(length=64), nullable=False),
+        sa.Column("target_lang", sa.String(length=8), nullable=False),
+        sa.Column("source_text", sa.Text(), nullable=False),
+        sa.Column("translated_text", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("source_hash", "target_lang", name="uq_translations_source_hash_target_lang"),
+    )
+
+
+def downgrade():
+    op.drop_table("translations")
@@ -0,0 +1,30 @@
+"""shared cache table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cache_entries",
+        sa.Column("key", sa.String(length=512), primary_key=True),
+        sa.Column("value", sa.LargeBinary(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_index("ix_cache_entries_expires_at", "cache_entries", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_cache_entries_expires_at", table_name="cache_entries")
+    op.drop_table("cache_entries")
@@ -0,0 +1,47 @@
+"""openlibrary dump ingestion
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("books", sa.Column("authors", sa.JSON(), nullable=True))
+    op.add_column("books", sa.Column("subjects", sa.JSON(), nullable=True))
+    op.add_column("books", sa.Column("cover_id", sa.Integer(), nullable=True))
+    op.add_column("books", sa.Column("revision", sa.Integer(), nullable=True))
+    op.add_column("books", sa.Column("last_modified", sa.String(length=32), nullable=True))
+
+    op.create_table(
+        "ol_authors",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("revision", sa.Integer(), nullable=True),
+    )
+    op.create_table(
+        "ingest_checkpoints",
+        sa.Column("source", sa.String(), primary_key=True),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("file_size", sa.BigInteger(), nullable=False),
+        sa.Column("lines_done", sa.BigInteger(), nullable=False),
+        sa.Column("rows_loaded", sa.BigInteger(), nullable=False),
+        sa.Column("max_last_modified", sa.String(length=32), nullable=True),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("ingest_checkpoints")
+    op.drop_table("ol_authors")
+    for column in ("last_modified", "revision", "cover_id", "subjects", "authors"):
+        op.drop_column("books", column)
@@ -0,0 +1,99 @@
+"""genre and author taxonomy
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Списки, которые до этой миграции были зашиты в app/core/constants.py
+GENRES = [
+    "Фантастика",
+    "Фэнтези",
+    "Детектив",
+    "Роман",
+    "Триллер",
+    "Ужасы",
+    "Научная литература",
+    "Биография",
+    "Исторический",
+    "Поэзия",
+    "Драма",
+    "Комедия",
+    "Приключения",
+    "Детская литература",
+    "Классика",
+    "Психология",
+    "Философия",
+    "Бизнес",
+    "Саморазвитие",
+]
+AUTHORS = [
+    "Фёдор Достоевский",
+    "Лев Толстой",
+    "Антон Чехов",
+    "Александр Пушкин",
+    "Михаил Булгаков",
+    "Джоан Роулинг",
+    "Джордж Оруэлл",
+    "Рэй Брэдбери",
+    "Стивен Кинг",
+    "Агата Кристи",
+    "Артур Конан Дойл",
+    "Эрнест Хемингуэй",
+    "Фрэнсис Скотт Фицджеральд",
+    "Джон Толкин",
+    "Айзек Азимов",
+]
+
+
+def upgrade():
+    terms = op.create_table(
+        "taxonomy_terms",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("kind", "name", name="uq_taxonomy_terms_kind_name"),
+    )
+    op.create_table(
+        "taxonomy_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+    )
+    op.execute("INSERT INTO taxonomy_version (id, version) VALUES (1, 1)")
+    # Версия меняется при любом изменении, в том числе ручным SQL: воркеры перечитывают справочник по ней
+    op.execute("""
+        CREATE FUNCTION bump_taxonomy_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE taxonomy_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER taxonomy_terms_bump_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON taxonomy_terms
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_taxonomy_version()
+    """)
+
+    op.bulk_insert(terms, [
+        {"kind": kind, "name": name, "position": position}
+        for kind, names in (("genre", GENRES), ("author", AUTHORS))
+        for position, name in enumerate(names)
+    ])
+
+
+def downgrade():
+    op.execute("DROP TRIGGER taxonomy_terms_bump_version ON taxonomy_terms")
+    op.execute("DROP FUNCTION bump_taxonomy_version()")
+    op.drop_table("taxonomy_version")
+    op.drop_table("taxonomy_terms")
@@ -0,0 +1,24 @@
+"""english titles for locally known films
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("movies", "series"):
+        op.add_column(table, sa.Column("title_en", sa.String(), nullable=True))
+
+
+def downgrade():
+    for table in ("movies", "series"):
+        op.drop_column(table, "title_en")
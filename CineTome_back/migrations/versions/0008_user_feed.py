@@ -0,0 +1,37 @@
+"""materialized per-user feed
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_feeds",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("built_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        "user_feed_items",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("item_key", sa.String(length=64), primary_key=True),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("source", sa.String(length=255), nullable=False),
+        sa.Column("card", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_user_feed_items_page", "user_feed_items", ["user_id", "score", "item_key"])
+
+
+def downgrade():
+    op.drop_table("user_feed_items")
+    op.drop_table("user_feeds")
@@ -0,0 +1,25 @@
+"""trigram search over books
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Поиск подстроки (LIKE '%...%') по импортированному дампу OpenLibrary
+    op.execute("CREATE INDEX ix_books_title_trgm ON books USING gin (lower(title) gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_books_author_trgm ON books USING gin (lower(author) gin_trgm_ops)")
+
+
+def downgrade():
+    op.drop_index("ix_books_author_trgm", table_name="books")
+    op.drop_index("ix_books_title_trgm", table_name="books")
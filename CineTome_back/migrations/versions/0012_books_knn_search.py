@@ -0,0 +1,32 @@
+"""KNN trigram search over books
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # GIN не умеет отдавать строки в порядке сходства: GiST с <<-> выдаёт
+    # первые LIMIT строк без подсчёта сходства для всех совпадений
+    op.drop_index("ix_books_author_trgm", table_name="books")
+    op.drop_index("ix_books_title_trgm", table_name="books")
+    op.execute(
+        "CREATE INDEX ix_books_title_author_trgm ON books "
+        "USING gist (lower(coalesce(title, '') || ' ' || coalesce(author, '')) gist_trgm_ops)"
+    )
+    op.execute("CREATE INDEX ix_books_author_trgm ON books USING gist (lower(author) gist_trgm_ops)")
+
+
+def downgrade():
+    op.drop_index("ix_books_author_trgm", table_name="books")
+    op.drop_index("ix_books_title_author_trgm", table_name="books")
+    op.execute("CREATE INDEX ix_books_title_trgm ON books USING gin (lower(title) gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_books_author_trgm ON books USING gin (lower(author) gin_trgm_ops)")